@@ -2,63 +2,168 @@ from flask import Flask, render_template, jsonify, request
 import sqlite3
 import os
 import rating
-import time
+import maia_service
+import metrics
+import query_profiler
+import puzzle_cache
+import wire_format
+import prefetch
+import user_store
+import solved_sets
+import review_queue
+import user_sync
+import catalog_stats
+import rating_sampler
+import stats_cache
+import warmup
 import random
 import string
+import json
+import base64
+import threading
+import atexit
 
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+metrics.init_app(app)  # Per-route/per-statement latency at /metrics
+query_profiler.init_app(app)  # Slow statements + query plans at /debug/slow_queries
+wire_format.init_app(app)  # gzip/brotli per Accept-Encoding
 
 # --- ARCHITECTURAL CONFIGURATION ---
 # Absolute path to your filtered SQLite database
 DB_PATH = r"A:\applications\torok\lichess_mobile_puzzles.sqlite"
 DLC_PATH = r"A:\applications\torok\lichess_mobile_puzzles_extra.sqlite"
 
+# User data (progress, favorites, ratings) lives in per-user stores under
+# USER_DATA_DIR, hash-sharded by user_store.py; the puzzle DB is only read.
+# Store connections attach the puzzle DB read-only as `puzzle_db`, so queries stay
+# unqualified: user tables resolve to main, puzzles to puzzle_db.
+USER_DATA_DIR = None  # Default: neurochess_users/ next to DB_PATH
+PUZZLE_DB_IMMUTABLE = False  # immutable=1: no locking or change checks (prefork.py, DB never rewritten)
+MMAP_SIZE = 0  # Bytes of the puzzle DB to memory-map (PRAGMA mmap_size), 0 = off
+
+def puzzle_db_uri():
+    params = {"mode": "ro", "immutable": 1} if PUZZLE_DB_IMMUTABLE else {"mode": "ro"}
+    return user_store.sqlite_uri(DB_PATH, **params)
+
+def attach_puzzles(conn):
+    """Runs on every new user store connection."""
+    conn.execute("ATTACH DATABASE ? AS puzzle_db", (puzzle_db_uri(),))
+    if MMAP_SIZE:
+        conn.execute(f"PRAGMA puzzle_db.mmap_size = {int(MMAP_SIZE)}")
+    catalog_stats.install(conn)  # Per-user solved counts (they read bands from puzzle_db)
+
+_user_store = None
+_user_store_lock = threading.Lock()
+
+def get_user_store():
+    global _user_store
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                data_dir = USER_DATA_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "neurochess_users")
+                _user_store = user_store.UserStore(data_dir, on_connect=attach_puzzles)
+    return _user_store
+
+# Ratings served from memory and written back in batches (stats_cache.py)
+player_stats = stats_cache.PlayerStatsCache(get_user_store)
+atexit.register(player_stats.flush)
+
+def reset_user_store():
+    """Closes every store connection (before fork, or after changing USER_DATA_DIR)."""
+    global _user_store
+    player_stats.flush()  # Pending rows belong to the store being closed
+    with _user_store_lock:
+        if _user_store is not None:
+            _user_store.close_all()
+        _user_store = None
+
 def init_user_db():
-    # Now creates tables in the Main DB
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.executescript('''
-                CREATE TABLE IF NOT EXISTS user_progress (
-                    puzzle_id TEXT PRIMARY KEY,
-                    status TEXT, -- 'win' or 'loss'
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                CREATE TABLE IF NOT EXISTS user_favorites (
-                    puzzle_id TEXT PRIMARY KEY,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                );
-
-                CREATE TABLE IF NOT EXISTS player_stats (
-                    mode TEXT PRIMARY KEY, -- 'standard', 'blindfold'
-                    rating REAL DEFAULT 1200,
-                    rd REAL DEFAULT 350,
-                    vol REAL DEFAULT 0.06,
-                    last_active DATETIME DEFAULT CURRENT_TIMESTAMP
-                );''')
-    conn.commit()
-    conn.close()
+    # User tables used to live in the puzzle DB with no user column; those rows
+    # are moved to DEFAULT_USER's store the first time the server starts.
+    store = get_user_store()
+    if not os.path.exists(DB_PATH):
+        return  # Store connections attach the puzzle DB, so nothing can be opened yet
+    copied = store.migrate_legacy(DB_PATH, DEFAULT_USER)
+    if copied:
+        print(f"Migrated {copied:,} legacy user rows to {store.store_path(DEFAULT_USER)}")
+    # Anything else startup could prepare is left to the background warmup (startup.start())
+
+def refresh_puzzle_caches(conn, schema="main"):
+    """Drops everything derived from the puzzle DB if it changed on disk."""
+    if puzzle_cache.cache.validate(conn, DB_PATH, schema):
+        prefetcher.clear()  # Queued fragments came from the old DB
+        solved_sets.cache.clear()  # Ordinals may have been renumbered
+        catalog_stats.cache.clear()
+        rating_sampler.sampler.clear()
 
 def get_db_connection():
     """
-    Establishes a connection to the SQLite database.
+    Establishes a read-only connection to the puzzle database.
     Uses row_factory to allow dictionary-like access to columns.
+    User tables are not here: use get_user_store().session(user).
     """
     if not os.path.exists(DB_PATH):
         print(f"CRITICAL ERROR: Database not found at {DB_PATH}")
         return None
         
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = query_profiler.connect(puzzle_db_uri(), uri=True)
+        if MMAP_SIZE:
+            conn.execute(f"PRAGMA mmap_size = {int(MMAP_SIZE)}")
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
         print(f"DATABASE CONNECTION ERROR: {e}")
         return None
 
+# --- Background warmup (warmup.py), reported by /ready ---
+WARMUP = os.environ.get("NEUROCHESS_WARMUP", "1") != "0"
+WARM_DB_MB = int(os.environ.get("NEUROCHESS_WARM_DB_MB", "1024"))  # Puzzle DB bytes pulled into the page cache
+WARM_FRAGMENTS = 20_000  # Most-played puzzles serialized ahead of the first requests
+
+def with_puzzle_db(fn):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError(f"Database not found at {DB_PATH}")
+    try:
+        return fn(conn)
+    finally:
+        conn.close()
+
+def most_played(conn, limit):
+    """Rows to serialize ahead of requests: most played first, PuzzleId order on DBs without NbPlays (mobile)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(puzzles)")}
+    order = "NbPlays DESC" if "NbPlays" in columns else "PuzzleId"
+    return conn.execute(f"SELECT * FROM puzzles ORDER BY {order} LIMIT ?", (limit,))
+
+def warm_puzzle_pages():
+    return f"{warmup.prefetch_file(DB_PATH, WARM_DB_MB * 1024 * 1024) / 1e6:.0f} MB"
+
+def warm_fragments(conn):
+    refresh_puzzle_caches(conn)  # The first check clears the cache: run it before filling
+    preloaded = puzzle_cache.cache.stats()["preloaded"]
+    if preloaded:
+        return f"{preloaded} preloaded"  # prefork.preload already serialized the most played puzzles
+    rows = most_played(conn, WARM_FRAGMENTS).fetchall()
+    return len(puzzle_cache.cache.fragments_for_rows(rows))
+
+def warm_ordinals(conn):
+    if not solved_sets.cache.has_ordinals(conn):
+        return "none (solved puzzles excluded by user_progress)"
+    return solved_sets.cache.catalog_id(conn)
+
+startup = warmup.Warmup([
+    ("puzzle_pages", warm_puzzle_pages),
+    ("ordinals", lambda: with_puzzle_db(warm_ordinals)),
+    ("rating_sampler", lambda: with_puzzle_db(rating_sampler.sampler.warm)),
+    ("catalog_stats", lambda: len(with_puzzle_db(catalog_stats.cache.catalog_json))),
+    ("puzzle_fragments", lambda: with_puzzle_db(warm_fragments)),
+    ("player_stats", lambda: player_stats.warm()),
+])
+
 # --- ROUTES ---
 
 @app.route('/')
@@ -74,34 +179,158 @@ def get_puzzle_by_id(puzzle_id):
         return jsonify({"error": "Database connection failed."}), 500
     
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM puzzles WHERE PuzzleId = ?", (puzzle_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            return jsonify({"error": f"Puzzle '{puzzle_id}' not found."}), 404
-        
-        data = dict(row)
-        puzzle = {
-            "PuzzleId": data.get('PuzzleId'),
-            "FEN": data.get('FEN'),
-            "Moves": data.get('Moves', "").split(),
-            "Rating": data.get('Rating', 0),
-            "Band": data.get('rating_band', 'Uncategorized'),
-            "Themes": data.get('Themes', '')
-        }
-        return jsonify(puzzle)
+        refresh_puzzle_caches(conn)
+        fragment = puzzle_cache.cache.get(puzzle_id)
+        if fragment is None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM puzzles WHERE PuzzleId = ?", (puzzle_id,))
+            row = cursor.fetchone()
+            
+            if not row:
+                return jsonify({"error": f"Puzzle '{puzzle_id}' not found."}), 404
+            fragment = puzzle_cache.cache.fragment_for_row(row)
+
+        metrics.inc("neurochess_puzzles_returned_total", route="/get_puzzle/<puzzle_id>")
+        return puzzle_cache.puzzle_response(fragment)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
+# Validate theme to prevent SQL injection (whitelist approach)
+VALID_THEMES = {
+    "opening", "middlegame", "endgame", 
+    "attraction", "defensiveMove", "deflection", 
+    "discoveredAttack", "hangingPiece", "intermezzo", 
+    "quietMove", "sacrifice", "skewer"
+}
+
+# Favorites and attempt history are listed newest first, paged with a
+# (timestamp, puzzle_id) keyset cursor (see stream_listing_rows)
+FAVORITES_QUERY = '''
+    SELECT uf.timestamp AS listed_at, p.*
+    FROM user_favorites uf INDEXED BY idx_favorites_recent
+    JOIN puzzles p ON p.PuzzleId = uf.puzzle_id
+    WHERE uf.user_id = ?
+'''
+
+HISTORY_QUERY = '''
+    SELECT up.timestamp AS listed_at, up.status AS status, p.*
+    FROM user_progress up INDEXED BY idx_progress_recent
+    JOIN puzzles p ON p.PuzzleId = up.puzzle_id
+    WHERE up.user_id = ?
+'''
+
+def get_user_rating(cursor, user, mode, client_rating=None):
+    """Client-supplied rating if given, else the user's rating for the mode (stats cache)."""
+    if client_rating is not None:
+        return client_rating
+    return player_stats.get(cursor.connection, user, mode)[0]
+
+def get_user_rd(cursor, user, mode, client_rd=None):
+    """Client-supplied RD if given, else the user's RD for the mode (stats cache)."""
+    if client_rd is not None:
+        return client_rd
+    return player_stats.get(cursor.connection, user, mode)[1]
+
+def uses_sampler(conn, band, theme):
+    """Adaptive requests (no band, no theme) are drawn by rating_sampler, if the puzzle DB has ordinals."""
+    return (rating_sampler.ENABLED and band in (None, 'All') and theme not in VALID_THEMES
+            and solved_sets.cache.has_ordinals(conn) and rating_sampler.sampler.available(conn))
+
+def solved_set_for(conn, user):
+    """The user's solved bitmap, or None on puzzle DBs without ordinals (see build_puzzle_filter)."""
+    return solved_sets.cache.get(conn, user) if solved_sets.cache.has_ordinals(conn) else None
+
+# Solved-puzzle exclusion for puzzle DBs without ordinals: the user's solved and
+# scheduled puzzles, as in the solved-set bitmap, by anti-join on their history
+SOLVED_BY_HISTORY = f'''
+        AND NOT EXISTS (SELECT 1 FROM user_progress up WHERE up.user_id = ? AND up.puzzle_id = p.PuzzleId
+                        AND up.status IN {solved_sets.SOLVED_STATUSES})
+        AND NOT EXISTS (SELECT 1 FROM review_queue rq WHERE rq.user_id = ? AND rq.puzzle_id = p.PuzzleId)
+'''
+
+def build_puzzle_filter(user_rating, band=None, theme=None, history_user=None):
+    """
+    Unsolved-puzzle SELECT with the band / adaptive rating / theme filters applied.
+    Returns (query, params); callers append the PuzzleId seek and ORDER BY/LIMIT,
+    and bind the user's solved set to the connection (solved_sets.bind) first.
+    With history_user (solved_set_for gave None) solved puzzles are excluded by
+    that user's user_progress/review_queue rows instead of is_solved().
+    """
+    puzzle_query = '''
+        SELECT p.* 
+        FROM puzzles p INDEXED BY idx_puzzles_id
+        WHERE 1 = 1
+    '''
+    params = []
+
+    # Filter by rating range (User +/- 150)
+    # Use band only if specified explicitly, otherwise adaptive
+    if band and band != "All":
+        puzzle_query += ' AND p.rating_band = ?'
+        params.append(band)
+    else:
+        # Adaptive Logic
+        puzzle_query += ' AND p.Rating BETWEEN ? AND ?'
+        params.extend([user_rating - 150, user_rating + 150])
+
+    # Theme Logic
+    if theme and theme != "all" and theme in VALID_THEMES:
+        puzzle_query += f' AND p.has_{theme} = 1'
+
+    # Solved test last, so it only runs for rows that passed the other filters
+    if history_user is not None:
+        puzzle_query += SOLVED_BY_HISTORY
+        params.extend([history_user, history_user])
+    else:
+        puzzle_query += ' AND NOT is_solved(p.ordinal)'
+    return puzzle_query, params
+
+def random_puzzle_id():
+    # Lichess IDs are 5 chars
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=5))
+
+DEFAULT_USER = 'local'
+
+def current_user():
+    """User id from ?user= or a JSON body's "user" (single-user installs use DEFAULT_USER)."""
+    body = request.get_json(silent=True) if request.is_json else None
+    return request.args.get('user') or (body or {}).get('user') or DEFAULT_USER
+
+def prefetch_fill(key, user_rating, n, exclude):
+    """Selects up to n puzzles for a prefetch queue (runs on the prefetch thread)."""
+    user, mode, band, theme = key
+    items = []
+    with get_user_store().session(user) as conn:
+        solved = solved_set_for(conn, user)
+        if uses_sampler(conn, band, theme):
+            user_rd = get_user_rd(conn.cursor(), user, mode)
+            rows = rating_sampler.sampler.sample(conn, user_rating, user_rd, n + len(exclude), solved)
+        else:
+            if solved is not None:
+                solved_sets.bind(conn, solved)
+            base_query, base_params = build_puzzle_filter(user_rating, band, theme,
+                                                          history_user=None if solved is not None else user)
+            fetch = lambda query, params: conn.execute(query, params).fetchall()
+            rows = stream_puzzle_rows(fetch, base_query, base_params, random_puzzle_id(), n + len(exclude))
+        for row in rows:
+            if row['PuzzleId'] not in exclude:
+                items.append((row['PuzzleId'], row['Rating'], puzzle_cache.cache.fragment_for_row(row)))
+                if len(items) >= n:
+                    break
+    return items
+
+prefetcher = prefetch.PrefetchManager(prefetch_fill)
+
 @app.route('/get_puzzles')
 def get_puzzles():
-    start_time = time.time()
     """
     Fetches a batch of random puzzles, optionally filtered by rating band.
-    Returns a list of puzzles for client-side caching.
+    Returns a list of puzzles for client-side caching. Without band or theme,
+    puzzles are drawn around the user's rating and RD (?rating=, ?rd= or the
+    stored ones; rating_sampler.py). band=Favorites lists favorites newest
+    first instead; X-Next-Cursor is the ?cursor= of the next batch.
     """
     # 1. Parse Request Parameters
     count = request.args.get('count', default=10, type=int)
@@ -109,143 +338,287 @@ def get_puzzles():
     theme = request.args.get('theme', default=None, type=str)
     # ACCEPT CLIENT RATING: If provided, use this instead of looking up in DB
     client_rating = request.args.get('rating', default=None, type=int)
-    
-    conn = get_db_connection()
-    if conn is None:
-        return jsonify({"error": "Database connection failed."}), 500
-
+    client_rd = request.args.get('rd', default=None, type=float)
+    user = current_user()
+    try:
+        after = decode_cursor(request.args.get('cursor'))  # Favorites paging
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
 
     try:
-        with conn:
+        with get_user_store().session(user) as conn:
             cursor = conn.cursor()
             
             # --- RATING LOGIC ---
             mode = request.args.get('mode', default='standard', type=str)
-            
-            # Fetch user stats IF client_rating not provided
-            user_rating = rating.START_RATING
-            
-            if client_rating is not None:
-                user_rating = client_rating
-                print(f"Using client provided rating: {user_rating}", flush=True)
-            else:
-                cursor.execute("SELECT rating FROM player_stats WHERE mode = ?", (mode,))
-                row = cursor.fetchone()
-                if row:
-                    user_rating = row[0]
-                print(f"Using DB rating: {user_rating}", flush=True)
-
-            # Optimized Query using LEFT JOIN on Single DB + Random Seek
-            # 1. Generate a random ID (Lichess IDs are 5 chars)
-            rand_id = ''.join(random.choices(string.ascii_letters + string.digits, k=5))
-            
-            puzzle_query = '''
-                SELECT p.* 
-                FROM puzzles p INDEXED BY idx_puzzles_id
-                LEFT JOIN user_progress up 
-                ON p.PuzzleId = up.puzzle_id AND up.status = 'win'
-                WHERE up.puzzle_id IS NULL
-            '''
-            params = []
-
-            # Filter by rating range (User +/- 150)
-            # Use band only if specified explicitly, otherwise adaptive
+            user_rating = get_user_rating(cursor, user, mode, client_rating)
+            refresh_puzzle_caches(conn, "puzzle_db")
+
+            # Due reviews take a share of the adaptive feed (explicit band/theme requests get none)
+            reviews = []
+            if band in (None, 'All') and theme not in VALID_THEMES:
+                ratio = request.args.get('reviews', default=review_queue.INTERLEAVE_RATIO, type=float)
+                reviews = review_queue.pop_due(conn, user, review_queue.review_share(count, ratio))
+                count -= len(reviews)
+
+            # Steady state: pop pre-selected puzzles from this user's ready queue
+            if prefetch.ENABLED and band != 'Favorites' and not wire_format.wants_columnar():
+                key = (user, mode, band or 'All', theme if theme in VALID_THEMES else 'all')
+                fragments = prefetcher.take(key, count, user_rating, adaptive=key[2] == 'All',
+                                            sampled=uses_sampler(conn, band, theme))
+                if fragments is not None:
+                    fragments = review_queue.interleave(
+                        fragments, puzzle_cache.cache.fragments_for_rows(reviews))
+                    metrics.inc("neurochess_puzzles_returned_total", len(fragments), route="/get_puzzles")
+                    return wire_format.fragments_response(user_rating, fragments)
+
+            next_cursor = None
             if band == 'Favorites':
-                 # Override query for Favorites - bypass random seek logic
-                 puzzle_query = '''
-                    SELECT p.* 
-                    FROM puzzles p
-                    JOIN user_favorites uf ON p.PuzzleId = uf.puzzle_id
-                    ORDER BY p.PuzzleId LIMIT ?
-                 '''
-                 params = [count]
+                 # Override query for Favorites - bypass random seek logic; page with ?cursor=
+                 fetch = lambda query, params: cursor.execute(query, params).fetchall()
+                 rows = list(stream_listing_rows(fetch, FAVORITES_QUERY, [user], 'uf', after, count + 1))
+                 if len(rows) > count:
+                     rows = rows[:count]
+                     next_cursor = encode_cursor(rows[-1])
+            elif uses_sampler(conn, band, theme):
+                 # Drawn around the user's level; no window to run dry, so no fallback
+                 user_rd = get_user_rd(cursor, user, mode, client_rd)
+                 rows = rating_sampler.sampler.sample(conn, user_rating, user_rd, count,
+                                                      solved_sets.cache.get(conn, user))
             else:
-                 if band and band != "All":
-                      puzzle_query += ' AND p.rating_band = ?'
-                      params.append(band)
-                 else:
-                      # Adaptive Logic
-                      min_r = user_rating - 150
-                      max_r = user_rating + 150
-                      puzzle_query += ' AND p.Rating BETWEEN ? AND ?'
-                      params.extend([min_r, max_r])
-                 
-                 # Theme Logic
-                 if theme and theme != "all":
-                     # Validate theme to prevent SQL injection (whitelist approach)
-                     valid_themes = {
-                         "opening", "middlegame", "endgame", 
-                         "attraction", "defensiveMove", "deflection", 
-                         "discoveredAttack", "hangingPiece", "intermezzo", 
-                         "quietMove", "sacrifice", "skewer"
-                     }
-                     if theme in valid_themes:
-                         puzzle_query += f' AND p.has_{theme} = 1'
-                 
-                 # Random Seek Logic (Only for non-favorites)
-                 puzzle_query += ' AND p.PuzzleId >= ? ORDER BY p.PuzzleId LIMIT ?'
-                 params.append(rand_id)
-                 params.append(count)
-
-            print(f"[PERF] Params: {params}", flush=True)
-            query_start = time.time()
-            rows = cursor.execute(puzzle_query, params).fetchall()
-            print(f"[PERF] Query took: {time.time() - query_start:.4f}s", flush=True)
-            
-            # Fallback: If "seek" hits end of table or constraints too tight
-            if not rows:
-                 # Try wrapping around (>= '' is basically start of table)
-                 # Or widen search. Let's try widen + random seek from start.
-                 print("Seek failed (end of table?), retrying with fallback...", flush=True)
-                 
-                 fallback_query = '''
-                    SELECT p.* 
-                    FROM puzzles p INDEXED BY idx_puzzles_id
-                    LEFT JOIN user_progress up 
-                    ON p.PuzzleId = up.puzzle_id AND up.status = 'solved'
-                    WHERE up.puzzle_id IS NULL
-                 '''
-                 
-                 fallback_params = []
-                 if band and band != "All":
-                     fallback_query += ' AND p.rating_band = ?'
-                     fallback_params.append(band)
-                 else:
-                     fallback_query += ' AND p.Rating BETWEEN ? AND ?'
-                     fallback_params.extend([min_r, max_r])
-                 
-                 fallback_query += ' ORDER BY RANDOM() LIMIT ?'
-                 fallback_params.append(count)
-
-                 # Note: Keeping ORDER BY RANDOM() only for fallback as it's safer for "finding anything"
-                 # if the seek resulted in 0 rows. But ideally we'd seek from '00000'.
-                 
-                 rows = cursor.execute(fallback_query, fallback_params).fetchall()
-
-            if not rows:
-                # Return empty array with 200 - let frontend handle "No puzzles" display
-                return jsonify({"user_rating": round(user_rating), "puzzles": []})
-
-            # 3. Transform Row Objects to Serialized JSON
-            puzzles = []
+                 # Random seek, wrapping around the table, skipping solved puzzles
+                 solved = solved_set_for(conn, user)
+                 history_user = None if solved is not None else user
+                 if solved is not None:
+                     solved_sets.bind(conn, solved)
+                 fetch = lambda query, params: cursor.execute(query, params).fetchall()
+                 puzzle_query, params = build_puzzle_filter(user_rating, band, theme, history_user)
+                 rows = list(stream_puzzle_rows(fetch, puzzle_query, params, random_puzzle_id(), count))
+
+                 # Fallback: constraints too tight (everything in the theme solved) - drop the theme
+                 if not rows and theme in VALID_THEMES:
+                     metrics.inc("neurochess_puzzle_fallback_total")
+                     puzzle_query, params = build_puzzle_filter(user_rating, band, history_user=history_user)
+                     rows = list(stream_puzzle_rows(fetch, puzzle_query, params, random_puzzle_id(), count))
+
+            # 3. Serialize: cached JSON fragments, or columnar if the client asked for it
+            # (an empty list is still 200 - let frontend handle "No puzzles" display)
+            rows = review_queue.interleave(rows, reviews)
+            metrics.inc("neurochess_puzzles_returned_total", len(rows), route="/get_puzzles")
+            response = wire_format.puzzles_response(user_rating, rows)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return response
+    except Exception as e:
+        print(f"APPLICATION ERROR: {e}", flush=True)
+        return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
+
+@app.route('/get_reviews')
+def get_reviews():
+    """
+    Pops up to `count` of the user's due review puzzles (most overdue first), in
+    the /get_puzzles format. X-Reviews-Due is the number still due afterwards and
+    X-Next-Review-At the Unix time of the next scheduled review.
+    """
+    count = request.args.get('count', default=10, type=int)
+    client_rating = request.args.get('rating', default=None, type=int)
+    mode = request.args.get('mode', default='standard', type=str)
+    user = current_user()
+
+    try:
+        with get_user_store().session(user) as conn:
+            user_rating = get_user_rating(conn.cursor(), user, mode, client_rating)
+            rows = review_queue.pop_due(conn, user, count)
+            due, next_due = review_queue.due_summary(conn, user)
+    except Exception as e:
+        print(f"APPLICATION ERROR: {e}", flush=True)
+        return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
+
+    metrics.inc("neurochess_puzzles_returned_total", len(rows), route="/get_reviews")
+    response = wire_format.puzzles_response(user_rating, rows)
+    response.headers["X-Reviews-Due"] = str(due)
+    if next_due is not None:
+        response.headers["X-Next-Review-At"] = str(round(next_due))
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+STREAM_MAX_COUNT = 5000
+STREAM_PAGE_SIZE = 50  # Rows per keyset page; no SQLite read lock is held between pages
+
+def stream_puzzle_rows(fetch, base_query, base_params, start_id, count):
+    """
+    Yields up to `count` rows of base_query in PuzzleId order from start_id,
+    wrapping around to the start of the table. Pages are fetched with a keyset
+    seek (fetch(query, params) -> rows) so a slow client never keeps a statement
+    open against writers.
+    """
+    sent = 0
+    ranges = [(start_id, None), ("", start_id)] if start_id else [("", None)]
+    for lower, upper in ranges:
+        last_id, op = lower, '>='
+        while sent < count:
+            query = base_query + f' AND p.PuzzleId {op} ?'
+            params = base_params + [last_id]
+            if upper is not None:
+                query += ' AND p.PuzzleId < ?'
+                params.append(upper)
+            page = min(STREAM_PAGE_SIZE, count - sent)
+            rows = fetch(query + ' ORDER BY p.PuzzleId LIMIT ?', params + [page])
             for row in rows:
-                data = dict(row)
-                puzzles.append({
-                    "PuzzleId": data.get('PuzzleId', 'Unknown'),
-                    "FEN": data.get('FEN'),
-                    "Moves": data.get('Moves', "").split(), # Convert 'e2e4 e7e5' to list
-                    "Rating": data.get('Rating', 0),
-                    "Band": data.get('rating_band', 'Uncategorized'),
-                    "Themes": data.get('Themes', '')
-                })
-
-            return jsonify({"user_rating": round(user_rating), "puzzles": puzzles})
+                yield row
+            sent += len(rows)
+            if len(rows) < page:
+                break
+            last_id, op = rows[-1]['PuzzleId'], '>'
+
+def encode_cursor(row):
+    """Opaque keyset cursor for the position after a listing row."""
+    raw = json.dumps([row['listed_at'], row['PuzzleId']], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """(timestamp, puzzle_id) from encode_cursor, None for no cursor; ValueError if malformed."""
+    if not cursor:
+        return None
+    try:
+        timestamp, puzzle_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(puzzle_id, str):
+        raise ValueError("invalid cursor")
+    return timestamp, puzzle_id
+
+def stream_listing_rows(fetch, base_query, base_params, alias, after, count):
+    """
+    Yields up to `count` rows of a favorites/history listing, newest first,
+    starting after the (timestamp, puzzle_id) position `after`. Every page is a
+    seek on the (user_id, timestamp, puzzle_id) index, so deep pages cost the
+    same as the first.
+    """
+    sent = 0
+    while sent < count:
+        query, params = base_query, list(base_params)
+        if after is not None:
+            query += f' AND ({alias}.timestamp, {alias}.puzzle_id) < (?, ?)'
+            params.extend(after)
+        page = min(STREAM_PAGE_SIZE, count - sent)
+        rows = fetch(query + f' ORDER BY {alias}.timestamp DESC, {alias}.puzzle_id DESC LIMIT ?', params + [page])
+        for row in rows:
+            yield row
+        sent += len(rows)
+        if len(rows) < page:
+            break
+        after = (rows[-1]['listed_at'], rows[-1]['PuzzleId'])
+
+LISTING_MAX_COUNT = 500
+
+def listing_response(base_query, alias, route, with_status=False):
+    """
+    Streams one page of a listing as {"items": [...], "next_cursor": ...}; items
+    are {"timestamp", ["status",] "puzzle"}. next_cursor is null on the last page.
+    """
+    count = max(1, min(request.args.get('count', default=50, type=int), LISTING_MAX_COUNT))
+    user = current_user()
+    try:
+        after = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    store = get_user_store()
+
+    def fetch(query, params):
+        # A session per page, as in /stream_puzzles
+        with store.session(user) as conn:
+            return conn.execute(query, params).fetchall()
+
+    def generate():
+        sent, next_cursor = 0, None
+        yield b'{"items":['
+        try:
+            # One row past the page tells whether there is a next one
+            for row in stream_listing_rows(fetch, base_query, [user], alias, after, count + 1):
+                if sent == count:
+                    next_cursor = encode_cursor(last)
+                    break
+                head = {"timestamp": row['listed_at']}
+                if with_status:
+                    head["status"] = row['status']
+                item = puzzle_cache.dumps(head)[:-1] + b',"puzzle":' + puzzle_cache.cache.fragment_for_row(row) + b'}'
+                yield item if sent == 0 else b"," + item
+                sent += 1
+                last = row
+        except Exception as e:
+            print(f"STREAM ERROR: {e}", flush=True)
+        finally:
+            metrics.inc("neurochess_puzzles_returned_total", sent, route=route)
+        yield b'],"next_cursor":' + puzzle_cache.dumps(next_cursor) + b'}'
+
+    return app.response_class(generate(), mimetype='application/json', headers={"Cache-Control": "no-store"})
+
+@app.route('/favorites')
+def list_favorites():
+    """The user's favorites, newest first; pass next_cursor back as ?cursor= for the next page."""
+    return listing_response(FAVORITES_QUERY, 'uf', '/favorites')
+
+@app.route('/history')
+def list_history():
+    """The user's attempted puzzles with their last status, most recent first (cursor paged)."""
+    return listing_response(HISTORY_QUERY, 'up', '/history', with_status=True)
+
+@app.route('/stream_puzzles')
+def stream_puzzles():
+    """
+    Streams puzzles as NDJSON (one /get_puzzles puzzle object per line) for
+    prefetching clients. Same band/theme/adaptive filters as /get_puzzles;
+    the user's rating is sent in the X-User-Rating header.
+    Stops after `count` puzzles or when the client disconnects.
+    """
+    count = min(request.args.get('count', default=100, type=int), STREAM_MAX_COUNT)
+    band = request.args.get('band', default=None, type=str)
+    theme = request.args.get('theme', default=None, type=str)
+    client_rating = request.args.get('rating', default=None, type=int)
+    mode = request.args.get('mode', default='standard', type=str)
+    user = current_user()
+    store = get_user_store()
+
+    try:
+        with store.session(user) as conn:
+            user_rating = get_user_rating(conn.cursor(), user, mode, client_rating)
+            refresh_puzzle_caches(conn, "puzzle_db")
+            solved = solved_set_for(conn, user) if band != 'Favorites' else None
     except Exception as e:
         print(f"APPLICATION ERROR: {e}", flush=True)
         return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
-    finally:
-        if conn: conn.close()
-        print(f"[PERF] Total Request time: {time.time() - start_time:.4f}s", flush=True)
+
+    if band == 'Favorites':
+        rows_for = lambda fetch: stream_listing_rows(fetch, FAVORITES_QUERY, [user], 'uf', None, count)
+    else:
+        base_query, base_params = build_puzzle_filter(user_rating, band, theme,
+                                                      history_user=None if solved is not None else user)
+        start_id = random_puzzle_id()
+        rows_for = lambda fetch: stream_puzzle_rows(fetch, base_query, base_params, start_id, count)
+
+    def fetch(query, params):
+        # A session per page: the connection is back in its pool while the client reads
+        with store.session(user) as conn:
+            if solved is not None:
+                solved_sets.bind(conn, solved)
+            return conn.execute(query, params).fetchall()
+
+    def generate():
+        sent = 0
+        try:
+            for row in rows_for(fetch):
+                yield puzzle_cache.cache.fragment_for_row(row) + b"\n"
+                sent += 1
+        except Exception as e:
+            print(f"STREAM ERROR: {e}", flush=True)
+        finally:
+            # Also runs on client disconnect (the server closes the generator)
+            metrics.inc("neurochess_puzzles_returned_total", sent, route="/stream_puzzles")
+
+    return app.response_class(generate(), mimetype='application/x-ndjson',
+                              headers={"X-User-Rating": str(round(user_rating)),
+                                       "Cache-Control": "no-store"})
 
 @app.route('/record_attempt', methods=['POST'])
 def record_attempt():
@@ -254,6 +627,7 @@ def record_attempt():
     success = data.get('success')
     puzzle_rating_val = data.get('puzzleRating', 1500) # Ensure frontend sends this
     mode = data.get('mode', 'standard')
+    user = current_user()
     
     if not puzzle_id:
         return jsonify({"error": "Missing PuzzleId"}), 400
@@ -261,74 +635,55 @@ def record_attempt():
     status = 'solved' if success else 'failed'
     score = 1.0 if success else 0.0
     
-    status = 'solved' if success else 'failed'
-    score = 1.0 if success else 0.0
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
-        # 1. Update Progress
-        cursor.execute('''
-            INSERT INTO user_progress (puzzle_id, status) VALUES (?, ?)
-            ON CONFLICT(puzzle_id) DO UPDATE SET 
-            status = CASE WHEN status = 'solved' THEN 'solved' ELSE excluded.status END,
-            timestamp = CURRENT_TIMESTAMP
-        ''', (puzzle_id, status))
-        
-        # 2. Update Rating
-        # a. Get current stats
-        cursor.execute("SELECT rating, rd, vol FROM player_stats WHERE mode = ?", (mode,))
-        row = cursor.fetchone()
-        
-        if row:
-            curr_rating, curr_rd, curr_vol = row
-        else:
-            curr_rating = rating.START_RATING
-            curr_rd = rating.START_RD
-            curr_vol = rating.START_VOL
+        with get_user_store().session(user) as conn:
+            cursor = conn.cursor()
+            # 1. Update Progress
+            cursor.execute('''
+                INSERT INTO user_progress (user_id, puzzle_id, status) VALUES (?, ?, ?)
+                ON CONFLICT(user_id, puzzle_id) DO UPDATE SET 
+                status = CASE WHEN status IN ('solved', 'win') THEN status ELSE excluded.status END,
+                timestamp = CURRENT_TIMESTAMP
+            ''', (user, puzzle_id, status))
+            if success:
+                solved_sets.cache.mark(conn, user, puzzle_id)
+            if review_queue.record(conn, user, puzzle_id, success) and not success:
+                solved_sets.cache.mark(conn, user, puzzle_id)  # Served by the review queue from now on
             
-        # b. Calculate new stats
-        # Puzzle RD is effectively 0 (static), but Glicko prefers a small non-zero usually.
-        # User suggested 30.
-        new_rating, new_rd, new_vol = rating.update_rating(
-            curr_rating, curr_rd, curr_vol, 
-            float(puzzle_rating_val), 30.0, score
-        )
-        
-        # c. Save new stats
-        cursor.execute('''
-            INSERT INTO player_stats (mode, rating, rd, vol, last_active) 
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(mode) DO UPDATE SET
-            rating = excluded.rating,
-            rd = excluded.rd,
-            vol = excluded.vol,
-            last_active = excluded.last_active
-        ''', (mode, new_rating, new_rd, new_vol))
-
-        conn.commit()
+            # 2. Update Rating: read-modify-write on the cached stats, written back
+            # asynchronously (stats_cache.py)
+            # Puzzle RD is effectively 0 (static), but Glicko prefers a small non-zero usually.
+            # User suggested 30.
+            new_rating, new_rd, new_vol = player_stats.update(
+                conn, user, mode,
+                lambda curr_rating, curr_rd, curr_vol: rating.update_rating(
+                    curr_rating, curr_rd, curr_vol, float(puzzle_rating_val), 30.0, score))
     except Exception as e:
         print(f"DB WRITE ERROR: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+    prefetcher.discard(puzzle_id, user)  # Solved, or scheduled for review
+    # A rating move is picked up by the queues on the next /get_puzzles
         
     return jsonify({"message": "Recorded", "new_rating": round(new_rating)})
 
 @app.route('/reset_progress', methods=['POST'])
 def reset_progress():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """Deletes the requesting user's progress, reviews, ratings and favorites."""
+    user = current_user()
     try:
-        cursor.execute("DELETE FROM user_progress")
-        cursor.execute("DELETE FROM player_stats")
-        cursor.execute("DELETE FROM user_favorites")
-        conn.commit()
+        with get_user_store().session(user) as conn:
+            cursor = conn.cursor()
+            player_stats.forget(user)  # Pending write-backs too
+            cursor.execute("DELETE FROM user_progress WHERE user_id = ?", (user,))
+            cursor.execute("DELETE FROM player_stats WHERE user_id = ?", (user,))
+            cursor.execute("DELETE FROM user_favorites WHERE user_id = ?", (user,))
+            review_queue.forget(conn, user)
+            solved_sets.cache.forget(conn, user)
     except Exception as e:
         print(f"DB RESET ERROR: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+    prefetcher.clear(user)
     return jsonify({"message": "Reset Successful"})
 
 @app.route('/record_result', methods=['POST'])
@@ -338,22 +693,26 @@ def record_result():
         data = request.json
         puzzle_id = data.get('puzzle_id')
         status = data.get('status') # 'win' or 'loss'
+        user = current_user()
         
         if not puzzle_id or not status:
             return jsonify({"error": "Missing puzzle_id or status"}), 400
 
-        conn = get_db_connection()
-        if conn:
-            with conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT OR REPLACE INTO user_progress (puzzle_id, status) VALUES (?, ?)",
-                    (puzzle_id, status)
-                )
-            conn.close()
-            return jsonify({"success": True})
-        else:
-             return jsonify({"error": "DB Connection failed"}), 500
+        with get_user_store().session(user) as conn:
+            # Upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the
+            # solved-count triggers (catalog_stats.py)
+            conn.execute('''
+                INSERT INTO user_progress (user_id, puzzle_id, status) VALUES (?, ?, ?)
+                ON CONFLICT(user_id, puzzle_id) DO UPDATE SET
+                status = excluded.status, timestamp = CURRENT_TIMESTAMP
+            ''', (user, puzzle_id, status))
+            solved = status in solved_sets.SOLVED_STATUSES
+            # A loss schedules a review, which keeps the puzzle out of random selection
+            scheduled = review_queue.record(conn, user, puzzle_id, solved)
+            solved_sets.cache.mark(conn, user, puzzle_id, solved=solved or scheduled)
+        if solved or scheduled:
+            prefetcher.discard(puzzle_id, user)
+        return jsonify({"success": True})
 
     except Exception as e:
         print(f"Error recording result: {e}")
@@ -367,25 +726,21 @@ def toggle_favorite():
         puzzle_id = data.get('puzzle_id')
         if not puzzle_id:
              return jsonify({"error": "Missing puzzle_id"}), 400
+        user = current_user()
              
-        conn = get_db_connection()
-        is_fav = False
-        if conn:
-            with conn:
-                cursor = conn.cursor()
-                # Check if exists
-                cursor.execute("SELECT 1 FROM user_favorites WHERE puzzle_id = ?", (puzzle_id,))
-                exists = cursor.fetchone()
-                
-                if exists:
-                    cursor.execute("DELETE FROM user_favorites WHERE puzzle_id = ?", (puzzle_id,))
-                    is_fav = False
-                else:
-                    cursor.execute("INSERT INTO user_favorites (puzzle_id) VALUES (?)", (puzzle_id,))
-                    is_fav = True
-            conn.close()
-            return jsonify({"is_favorite": is_fav})
-        return jsonify({"error": "DB failed"}), 500
+        with get_user_store().session(user) as conn:
+            cursor = conn.cursor()
+            # Check if exists
+            cursor.execute("SELECT 1 FROM user_favorites WHERE user_id = ? AND puzzle_id = ?", (user, puzzle_id))
+            exists = cursor.fetchone()
+            
+            if exists:
+                cursor.execute("DELETE FROM user_favorites WHERE user_id = ? AND puzzle_id = ?", (user, puzzle_id))
+                is_fav = False
+            else:
+                cursor.execute("INSERT INTO user_favorites (user_id, puzzle_id) VALUES (?, ?)", (user, puzzle_id))
+                is_fav = True
+        return jsonify({"is_favorite": is_fav})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -395,17 +750,13 @@ def check_favorite():
         puzzle_id = request.args.get('puzzle_id')
         if not puzzle_id:
              return jsonify({"error": "Missing puzzle_id"}), 400
+        user = current_user()
              
-        conn = get_db_connection()
-        is_fav = False
-        if conn:
+        with get_user_store().session(user) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM user_favorites WHERE puzzle_id = ?", (puzzle_id,))
-            if cursor.fetchone():
-                is_fav = True
-            conn.close()
-            return jsonify({"is_favorite": is_fav})
-        return jsonify({"error": "DB failed"}), 500
+            cursor.execute("SELECT 1 FROM user_favorites WHERE user_id = ? AND puzzle_id = ?", (user, puzzle_id))
+            is_fav = cursor.fetchone() is not None
+        return jsonify({"is_favorite": is_fav})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -413,14 +764,10 @@ def check_favorite():
 def get_stats():
     try:
         mode = request.args.get('mode', 'standard')
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT rating, rd, vol FROM player_stats WHERE mode = ?", (mode,))
-            row = cursor.fetchone()
-            conn.close()
-            if row:
-                return jsonify(dict(row))
+        user = current_user()
+        with get_user_store().session(user) as conn:
+            values = player_stats.get(conn, user, mode)
+        return jsonify(dict(zip(("rating", "rd", "vol"), values)))
     except Exception as e:
         print(f"Error fetching stats: {e}")
     
@@ -435,26 +782,94 @@ def update_stats():
         rating = data.get('rating')
         rd = data.get('rd')
         vol = data.get('vol')
+        user = current_user()
         
-        conn = get_db_connection()
-        if conn:
-            with conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO player_stats (mode, rating, rd, vol, last_active) 
-                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(mode) DO UPDATE SET
-                    rating = excluded.rating,
-                    rd = excluded.rd,
-                    vol = excluded.vol,
-                    last_active = excluded.last_active
-                ''', (mode, rating, rd, vol))
-            conn.close()
-            return jsonify({"success": True})
-        return jsonify({"error": "DB failed"}), 500
+        with get_user_store().session(user) as conn:
+            player_stats.set(conn, user, mode, (rating, rd, vol))
+        return jsonify({"success": True})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness: 200 once the server answers, with background warmup progress
+    ({"warm", "progress", "steps": [...]}). ?warm=1 answers 503 until warmup
+    has finished, for deployments that only route traffic to warm instances.
+    """
+    state = startup.progress()
+    return jsonify(state), (503 if request.args.get('warm') and not state["warm"] else 200)
+
+@app.route('/catalog_stats')
+def get_catalog_stats():
+    """
+    {"catalog": {"total", "bands", "themes", "cells": [[band, theme, move_count, n]]},
+     "user": {"solved", "bands"}} from materialized counts (catalog_stats.py).
+    """
+    user = current_user()
+    try:
+        with get_user_store().session(user) as conn:
+            refresh_puzzle_caches(conn, "puzzle_db")
+            catalog = catalog_stats.cache.catalog_json(conn)
+            counts = catalog_stats.user_counts(conn, user)
+    except Exception as e:
+        print(f"APPLICATION ERROR: {e}", flush=True)
+        return jsonify({"error": "Internal Server Error", "details": str(e)}), 500
+    body = b'{"catalog":' + catalog + b',"user":' + puzzle_cache.dumps(counts) + b'}'
+    return app.response_class(body, mimetype='application/json', headers={"Cache-Control": "no-store"})
+
+@app.route('/sync', methods=['POST'])
+def sync():
+    """
+    Bidirectional delta sync of progress, favorites and ratings (protocol in
+    user_sync.py). Repeat with the returned cursor, epoch and skip while "more" is true.
+    """
+    data = request.json or {}
+    user = current_user()
+    try:
+        with get_user_store().session(user) as conn:
+            player_stats.flush_user(conn, user)  # The pull must see the latest ratings
+            try:
+                response, excluded = user_sync.sync(conn, user, data)
+            finally:
+                player_stats.forget(user)  # Pushed stats rows bypass the cache
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"SYNC ERROR: {e}", flush=True)
+        return jsonify({"error": str(e)}), 500
+    for puzzle_id in excluded:
+        prefetcher.discard(puzzle_id, user)
+    return jsonify(response)
+
+@app.route('/get_human_moves')
+def get_human_moves():
+    """
+    Maia-2 human move probabilities for a position.
+    Requests from concurrent clients are micro-batched and cached by maia_service.
+    """
+    fen = request.args.get('fen')
+    elo_self = request.args.get('elo_self', default=1500, type=int)
+    elo_oppo = request.args.get('elo_oppo', default=elo_self, type=int)
+    top = request.args.get('top', default=5, type=int)
+
+    if not fen:
+        return jsonify({"error": "Missing fen"}), 400
+
+    try:
+        move_probs, win_prob = maia_service.get_service().predict(fen, elo_self, elo_oppo, timeout=30)
+    except maia_service.MaiaUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        print(f"Maia Error: {e}")
         return jsonify({"error": str(e)}), 500
 
+    moves = dict(list(move_probs.items())[:top]) if top > 0 else move_probs
+    return jsonify({"fen": fen, "elo_self": elo_self, "elo_oppo": elo_oppo,
+                    "moves": moves, "win_prob": win_prob})
+
 @app.route('/api/dlc/puzzles_v1')
 def download_dlc_puzzles():
     """
@@ -489,7 +904,9 @@ def download_dlc_puzzles():
 if __name__ == '__main__':
     # Initial verification of environment
     # Initial verification of environment
-    init_user_db() # Ensure user DB exists
+    init_user_db() # Ensure the user stores exist (and legacy tables are migrated)
+    if WARMUP:
+        startup.start()  # Caches and indexes fill in the background; /ready reports progress
     if not os.path.exists(DB_PATH):
         print("!" * 50)
         print(f"WARNING: DB not found at {DB_PATH}")
@@ -498,7 +915,7 @@ if __name__ == '__main__':
     
     # Run server on localhost:5000 with debug enabled for development
     print("Starting NeuroChess Server...")
-    print(f"Using DB: {DB_PATH}")
+    print(f"Using DB: {DB_PATH} | User stores: {get_user_store().data_dir}")
     if os.path.exists(DLC_PATH):
         print(f"DLC Pack available: {DLC_PATH}")
         print(f"DLC Endpoint: /api/dlc/puzzles_v1")
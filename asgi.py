@@ -0,0 +1,289 @@
+import io
+import os
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import app as flask_module
+import metrics
+
+# ASGI serving mode for the NeuroChess API:
+#
+#   uvicorn asgi:app --port 5000          (or: python asgi.py)
+#
+# Every Flask route is served unchanged by running the WSGI app on a bounded
+# thread pool (DB_WORKERS threads, at most MAX_QUEUED requests waiting, then
+# 503), so sqlite3 calls never block the event loop and a flood of clients
+# queues instead of spawning a thread each. Response bodies are produced on the
+# pool in batches and sent by the event loop through a bounded per-response
+# queue, so streaming routes (/stream_puzzles, /favorites, /history) hold a
+# worker only while producing, never while a slow client reads.
+# The DLC download is served natively on the event loop: zero-copy via the
+# http.response.zerocopysend extension when the server offers it, otherwise
+# chunked reads off the loop, so slow downloads cost a socket, not a thread.
+
+DB_WORKERS = int(os.environ.get("NEUROCHESS_ASGI_DB_WORKERS", "8"))
+MAX_QUEUED = int(os.environ.get("NEUROCHESS_ASGI_MAX_QUEUED", "1000"))
+DLC_ROUTE = '/api/dlc/puzzles_v1'
+DLC_DOWNLOAD_NAME = 'puzzles_expansion_v1.sqlite'
+DLC_CHUNK = 256 * 1024
+STREAM_BATCH_BYTES = 64 * 1024  # Response bytes produced per pool-thread hop
+STREAM_BUFFER = int(os.environ.get("NEUROCHESS_ASGI_STREAM_BUFFER", "64"))  # Chunks buffered per response
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        value = raw_value.decode("latin1")
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            key = name
+        else:
+            key = "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+class WsgiResponse:
+    """
+    One WSGI call, iterated in batches of about STREAM_BATCH_BYTES on pool
+    threads (one at a time, so the iterable never runs on two threads at once).
+    """
+
+    def __init__(self, wsgi_app, environ):
+        self.wsgi_app = wsgi_app
+        self.environ = environ
+        self.start = None
+        self.result = None
+        self.iterator = None
+        self.written = []  # write() output, sent ahead of the iterable's chunks
+        self.closed = False
+
+    def start_response(self, status, headers, exc_info=None):
+        self.start = {
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in headers],
+        }
+        return self.write
+
+    def write(self, data):
+        if data:
+            self.written.append(data)
+
+    def begin(self):
+        """Calls the app and returns its first batch: (chunks, done)."""
+        self.result = self.wsgi_app(self.environ, self.start_response)
+        self.iterator = iter(self.result)
+        return self.next_batch()
+
+    def next_batch(self):
+        chunks, size = self.written, sum(len(c) for c in self.written)
+        self.written = []
+        try:
+            while size < STREAM_BATCH_BYTES:
+                chunk = next(self.iterator)
+                if chunk:
+                    chunks.append(chunk)
+                    size += len(chunk)
+        except StopIteration:
+            self.close()
+            return chunks + self.written, True
+        except BaseException:
+            self.close()
+            raise
+        return chunks, False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if hasattr(self.result, "close"):
+                self.result.close()
+
+class AsgiServer:
+    def __init__(self, wsgi_app, dlc_path_fn, db_workers=DB_WORKERS, max_queued=MAX_QUEUED):
+        self.wsgi_app = wsgi_app
+        self.dlc_path_fn = dlc_path_fn  # Read per request so app.DLC_PATH overrides apply
+        self.executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="asgi-db")
+        self.max_queued = max_queued
+        self.in_flight = 0  # Only touched on the event loop
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == DLC_ROUTE and scope["method"] in ("GET", "HEAD"):
+                await self.send_dlc(scope, receive, send)
+            else:
+                await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await loop.run_in_executor(self.executor, flask_module.init_user_db)
+                    if flask_module.WARMUP:
+                        flask_module.startup.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def watch_disconnect(receive, disconnected):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    async def call_wsgi(self, scope, receive, send):
+        if self.in_flight >= self.max_queued:
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")]})
+            await send({"type": "http.response.body", "body": b'{"error": "Server busy"}'})
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+        watcher = asyncio.ensure_future(self.watch_disconnect(receive, disconnected))
+        response = WsgiResponse(self.wsgi_app, build_environ(scope, bytes(body)))
+        chunks = asyncio.Queue(maxsize=STREAM_BUFFER)
+        stop = False
+
+        async def produce():
+            # Pool threads only run the app; the loop waits on the queue, so a
+            # slow reader holds a few buffered chunks, never a DB worker
+            try:
+                batch, done = await loop.run_in_executor(self.executor, response.begin)
+                while True:
+                    for chunk in batch:
+                        if stop:
+                            break
+                        await chunks.put(chunk)
+                    if done or stop:
+                        break
+                    batch, done = await loop.run_in_executor(self.executor, response.next_batch)
+            except BaseException as e:
+                await chunks.put(e)
+            finally:
+                if not response.closed:
+                    # Closes streaming generators (and their connections) on disconnect too
+                    await loop.run_in_executor(self.executor, response.close)
+                await chunks.put(None)
+
+        self.in_flight += 1
+        producer = asyncio.ensure_future(produce())
+        try:
+            started = False
+            while (chunk := await chunks.get()) is not None:
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                if disconnected.is_set():
+                    return
+                if not started:
+                    await send(response.start)
+                    started = True
+                # send() applies the server's flow control: a slow reader waits here, on the loop
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not disconnected.is_set():
+                if not started:
+                    await send(response.start)
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            stop = True
+            if not producer.done():
+                while not chunks.empty():
+                    chunks.get_nowait()  # Unblocks a producer waiting on a full queue
+                await producer
+            self.in_flight -= 1
+            watcher.cancel()
+
+    async def send_dlc(self, scope, receive, send):
+        dlc_path = self.dlc_path_fn()
+        if not os.path.exists(dlc_path):
+            await send({"type": "http.response.start", "status": 404,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"error": "DLC file not found"}'})
+            metrics.inc("neurochess_http_requests_total", route=DLC_ROUTE, method=scope["method"], status="404")
+            return
+
+        loop = asyncio.get_running_loop()
+        f = open(dlc_path, "rb")
+        try:
+            size = os.fstat(f.fileno()).st_size
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/x-sqlite3"),
+                (b"content-length", str(size).encode()),
+                (b"content-disposition", f"attachment; filename={DLC_DOWNLOAD_NAME}".encode()),
+            ]})
+            metrics.inc("neurochess_http_requests_total", route=DLC_ROUTE, method=scope["method"], status="200")
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f, "count": size})
+                return
+
+            disconnected = threading.Event()
+            watcher = asyncio.ensure_future(self.watch_disconnect(receive, disconnected))
+            try:
+                sent = 0
+                while sent < size and not disconnected.is_set():
+                    # Default executor: file reads never take a DB worker
+                    chunk = await loop.run_in_executor(None, f.read, DLC_CHUNK)
+                    if not chunk:
+                        break
+                    sent += len(chunk)
+                    # send() applies the server's flow control, so slow readers just wait here
+                    await send({"type": "http.response.body", "body": chunk, "more_body": sent < size})
+            finally:
+                watcher.cancel()
+        finally:
+            f.close()
+
+app = AsgiServer(flask_module.app, lambda: flask_module.DLC_PATH)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("ASGI mode needs an ASGI server: pip install uvicorn")
+        sys.exit(1)
+    print("Starting NeuroChess Server (ASGI)...")
+    print(f"Using DB: {flask_module.DB_PATH} | DB workers: {DB_WORKERS}")
+    uvicorn.run(app, host="127.0.0.1", port=5000, log_level="warning")
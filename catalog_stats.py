@@ -0,0 +1,129 @@
+import sqlite3
+import threading
+
+import puzzle_cache
+import solved_sets
+
+# /catalog_stats: puzzle counts per (rating_band, theme, move_count) and the
+# user's solved counts per band, without scanning puzzles or history.
+#
+# Catalog counts come from the puzzle DB's catalog_stats table, materialized at
+# build time and kept current by triggers (create_short_db.build_catalog_stats);
+# they are serialized once per puzzle DB and served from memory.
+#
+# Per-user counts live in the user store (solved_counts). TEMP triggers on
+# user_progress, installed on every store connection (install), apply +/-1 when
+# a row's solved state changes. They are TEMP because they read the puzzle's
+# band from the attached puzzle DB, which a trigger stored in the user store's
+# schema may not reference. A user's counts are built from their history on
+# first use and rebuilt when the puzzle DB's catalog (ordinals_id) changes.
+
+_SOLVED = "(" + ", ".join(f"'{s}'" for s in solved_sets.SOLVED_STATUSES) + ")"
+
+def _apply(row, delta):
+    # Total ('' band) and the puzzle's band; only once the user's counts are built
+    return f'''
+        INSERT INTO solved_counts (user_id, rating_band, catalog, solved)
+        SELECT t.user_id, b.band, t.catalog, {delta}
+        FROM solved_counts t, (
+            SELECT '' AS band
+            UNION ALL SELECT COALESCE(rating_band, 'Unknown') FROM puzzles WHERE PuzzleId = {row}.puzzle_id
+        ) b
+        WHERE t.user_id = {row}.user_id AND t.rating_band = ''
+        ON CONFLICT (user_id, rating_band) DO UPDATE SET solved = solved + excluded.solved;
+    '''
+
+TRIGGERS = f'''
+    CREATE TEMP TRIGGER IF NOT EXISTS solved_counts_insert AFTER INSERT ON main.user_progress
+    WHEN NEW.status IN {_SOLVED}
+    BEGIN {_apply("NEW", 1)} END;
+
+    CREATE TEMP TRIGGER IF NOT EXISTS solved_counts_update AFTER UPDATE OF status ON main.user_progress
+    WHEN (COALESCE(NEW.status, '') IN {_SOLVED}) != (COALESCE(OLD.status, '') IN {_SOLVED})
+    BEGIN {_apply("NEW", f"CASE WHEN NEW.status IN {_SOLVED} THEN 1 ELSE -1 END")} END;
+
+    CREATE TEMP TRIGGER IF NOT EXISTS solved_counts_delete AFTER DELETE ON main.user_progress
+    WHEN OLD.status IN {_SOLVED}
+    BEGIN {_apply("OLD", -1)} END;
+'''
+
+def install(conn):
+    """Adds the solved-count triggers to a store connection (puzzle DB attached)."""
+    conn.executescript(TRIGGERS)
+
+def _catalog_tag(conn):
+    try:
+        return solved_sets.cache.catalog_id(conn)
+    except solved_sets.MissingOrdinals:
+        return ""
+
+def user_counts(conn, user):
+    """{"solved": N, "bands": {band: N}} for the user, building the counts if needed."""
+    catalog = _catalog_tag(conn)
+    rows = conn.execute("SELECT rating_band, catalog, solved FROM solved_counts WHERE user_id = ?", (user,)).fetchall()
+    if not any(r[0] == "" for r in rows) or any(r[1] != catalog for r in rows):
+        conn.execute("DELETE FROM solved_counts WHERE user_id = ?", (user,))
+        conn.execute(f'''
+            INSERT INTO solved_counts (user_id, rating_band, catalog, solved)
+            SELECT ?, '', ?, COUNT(*) FROM user_progress WHERE user_id = ? AND status IN {_SOLVED}
+        ''', (user, catalog, user))
+        conn.execute(f'''
+            INSERT INTO solved_counts (user_id, rating_band, catalog, solved)
+            SELECT ?, COALESCE(p.rating_band, 'Unknown'), ?, COUNT(*)
+            FROM user_progress up JOIN puzzles p ON p.PuzzleId = up.puzzle_id
+            WHERE up.user_id = ? AND up.status IN {_SOLVED}
+            GROUP BY 2
+        ''', (user, catalog, user))
+        rows = conn.execute("SELECT rating_band, catalog, solved FROM solved_counts WHERE user_id = ?", (user,)).fetchall()
+    bands = {r[0]: r[2] for r in rows if r[0] and r[2]}
+    total = next(r[2] for r in rows if r[0] == "")
+    return {"solved": total, "bands": bands}
+
+def summarize(cells):
+    """Catalog JSON object from (rating_band, theme, move_count, puzzles) rows."""
+    bands, themes, total = {}, {}, 0
+    for band, theme, _, count in cells:
+        if theme == "all":
+            bands[band] = bands.get(band, 0) + count
+            total += count
+        else:
+            themes[theme] = themes.get(theme, 0) + count
+    return {"total": total, "bands": bands, "themes": themes,
+            "cells": [list(cell) for cell in cells if cell[3]]}
+
+class CatalogStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._body = None
+
+    def catalog_json(self, conn):
+        """Serialized catalog counts, read from the puzzle DB once."""
+        body = self._body
+        if body is None:
+            with self._lock:
+                if self._body is None:
+                    self._body = puzzle_cache.dumps(summarize(self._cells(conn)))
+                body = self._body
+        return body
+
+    @staticmethod
+    def _cells(conn):
+        try:
+            return conn.execute('''
+                SELECT rating_band, theme, move_count, puzzles FROM catalog_stats
+                ORDER BY rating_band, theme, move_count
+            ''').fetchall()
+        except sqlite3.OperationalError:
+            # Puzzle DB built before catalog_stats: one scan, then cached like the table
+            print("WARNING: puzzle DB has no catalog_stats: run python_scripts/optimize_db.py --db <puzzle DB>")
+            return conn.execute('''
+                SELECT COALESCE(rating_band, 'Unknown'), 'all', COALESCE(move_count, 0), COUNT(*)
+                FROM puzzles GROUP BY 1, 3 ORDER BY 1, 3
+            ''').fetchall()
+
+    def clear(self):
+        """The puzzle DB was replaced."""
+        with self._lock:
+            self._body = None
+
+cache = CatalogStats()
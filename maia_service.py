@@ -0,0 +1,201 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Long-lived Maia-2 inference for human-move probabilities.
+# Requests from any thread are queued and run together in micro-batches on CPU;
+# results are cached by (FEN, elo_self, elo_oppo).
+# torch / maia2 are optional dependencies, imported when the model is first loaded.
+
+MODEL_TYPE = "rapid"
+MAX_BATCH = 64          # Positions per forward pass
+MAX_WAIT_MS = 5         # How long the batcher waits to fill a batch after the first request
+CACHE_SIZE = 200_000    # Cached (FEN, elo_self, elo_oppo) results
+
+class MaiaUnavailable(RuntimeError):
+    """Raised when torch/maia2 are not installed or the model cannot be loaded."""
+
+class MaiaService:
+    def __init__(self, model_type=MODEL_TYPE, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS,
+                 cache_size=CACHE_SIZE, num_threads=None):
+        self.model_type = model_type
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache_size = cache_size
+        self.num_threads = num_threads or os.cpu_count() or 1
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = {}  # key -> Future, so concurrent requests for one position share a slot
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_positions = 0
+
+    # --- Model ---
+
+    def _load(self):
+        try:
+            import torch
+            from maia2 import model, inference
+        except ImportError as e:
+            raise MaiaUnavailable(f"Maia-2 is not installed: {e}")
+
+        # One intra-op pool sized to the machine; inter-op parallelism only adds contention here
+        torch.set_num_threads(self.num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already set (can only be changed before the first parallel op)
+
+        self._torch = torch
+        self._inference = inference
+        self._model = model.from_pretrained(type=self.model_type, device="cpu")
+        self._model.eval()
+        self._prepared = inference.prepare()
+
+    def start(self):
+        """Loads the model and starts the batching thread (idempotent)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._load()
+                self._thread = threading.Thread(target=self._run, name="maia-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run_batch(self, keys):
+        """Runs one forward pass over `keys` and returns [(move_probs, win_prob), ...]."""
+        all_moves_dict, elo_dict, all_moves_dict_reversed = self._prepared
+        boards, elos_self, elos_oppo, legal = [], [], [], []
+        for fen, elo_self, elo_oppo in keys:
+            board_input, e_self, e_oppo, legal_moves = self._inference.preprocessing(
+                fen, elo_self, elo_oppo, elo_dict, all_moves_dict
+            )
+            boards.append(board_input)
+            elos_self.append(e_self)
+            elos_oppo.append(e_oppo)
+            legal.append(legal_moves)
+
+        torch = self._torch
+        batch = (
+            [k[0] for k in keys],
+            torch.stack(boards),
+            torch.tensor(elos_self),
+            torch.tensor(elos_oppo),
+            torch.stack(legal),
+        )
+        # get_preds takes any iterable of collated batches, so reuse Maia's own post-processing
+        with torch.inference_mode():
+            move_probs, win_probs = self._inference.get_preds(self._model, [batch], all_moves_dict_reversed)
+        return list(zip(move_probs, win_probs))
+
+    # --- Batching ---
+
+    def _run(self):
+        while True:
+            keys = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(keys) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    keys.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self._run_batch(keys)
+            except Exception as e:
+                if len(keys) == 1:
+                    results = [e]
+                else:
+                    # A bad FEN fails the whole batch; retry one by one so only that request errors
+                    results = []
+                    for key in keys:
+                        try:
+                            results.append(self._run_batch([key])[0])
+                        except Exception as single_error:
+                            results.append(single_error)
+
+            self.batches += 1
+            self.batched_positions += len(keys)
+            for key, result in zip(keys, results):
+                with self._cache_lock:
+                    future = self._pending.pop(key)
+                    if not isinstance(result, Exception):
+                        self._cache_put(key, result)
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _cache_put(self, key, value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def submit(self, fen, elo_self, elo_oppo):
+        """Returns a Future resolving to (move_probs, win_prob)."""
+        if self._thread is None:
+            self.start()
+        key = (fen, int(elo_self), int(elo_oppo))
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(cached)
+                return future
+            self.misses += 1
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._pending[key] = future
+        self._queue.put(key)
+        return future
+
+    # --- Public API ---
+
+    def predict(self, fen, elo_self, elo_oppo, timeout=None):
+        """Returns ({uci: probability}, win_probability) in the same format as inference.inference_each."""
+        return self.submit(fen, elo_self, elo_oppo).result(timeout)
+
+    def predict_many(self, requests, timeout=None):
+        """Submits all (fen, elo_self, elo_oppo) requests at once so they share batches."""
+        futures = [self.submit(*r) for r in requests]
+        return [f.result(timeout) for f in futures]
+
+    def stats(self):
+        with self._cache_lock:
+            cache_entries = len(self._cache)
+        return {
+            "loaded": self._thread is not None,
+            "cache_entries": cache_entries,
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_positions / self.batches, 2) if self.batches else 0,
+            "num_threads": self.num_threads,
+        }
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    """Process-wide shared service (the model is loaded once)."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MaiaService()
+        return _service
@@ -0,0 +1,233 @@
+import os
+import re
+import time
+import bisect
+import sqlite3
+import threading
+
+from flask import g, request, Response
+
+# In-process latency histograms and counters, rendered at /metrics in the
+# Prometheus text format. Set NEUROCHESS_METRICS=0 to disable: no request hooks
+# are installed and connect() returns plain sqlite3 connections.
+
+ENABLED = os.environ.get("NEUROCHESS_METRICS", "1") != "0"
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Log-spaced bucket bounds from 10us to ~100s (each ~19% wider than the last).
+# Quantiles are read from the buckets, so memory per series is fixed.
+_BOUNDS = [1e-5 * (2 ** (i / 4)) for i in range(94)]
+
+_lock = threading.Lock()
+_counters = {}      # (name, labels) -> float
+_histograms = {}    # (name, labels) -> _Histogram
+_families = {}      # name -> (type, help)
+
+def describe(name, metric_type, help_text):
+    _families[name] = (metric_type, help_text)
+
+describe("neurochess_http_request_duration_seconds", "summary", "Flask request latency by route.")
+describe("neurochess_http_requests_total", "counter", "Flask requests by route, method and status.")
+describe("neurochess_sql_duration_seconds", "summary", "SQLite statement latency by statement and phase (execute/fetch).")
+describe("neurochess_sql_statements_total", "counter", "SQLite statements executed.")
+describe("neurochess_sql_rows_fetched_total", "counter", "Rows fetched from SQLite cursors.")
+describe("neurochess_db_errors_total", "counter", "SQLite errors (connect and execute).")
+describe("neurochess_puzzle_fallback_total", "counter", "/get_puzzles requests that found nothing unsolved for the theme and retried without it.")
+describe("neurochess_puzzles_returned_total", "counter", "Puzzles returned to clients.")
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(_BOUNDS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return float("nan")
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return _BOUNDS[i] if i < len(_BOUNDS) else _BOUNDS[-1]
+        return _BOUNDS[-1]
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def inc(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = _Histogram()
+        hist.observe(seconds)
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def render():
+    """Prometheus text exposition (version 0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, (list(h.counts), h.total, h.count)) for k, h in _histograms.items())
+
+    lines = []
+    emitted = set()
+
+    def header(name):
+        if name not in emitted:
+            emitted.add(name)
+            metric_type, help_text = _families.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+    for (name, labels), value in counters:
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), (counts, total, count) in histograms:
+        header(name)
+        hist = _Histogram()
+        hist.counts, hist.total, hist.count = counts, total, count
+        for q in QUANTILES:
+            lines.append(f"{name}{_format_labels(labels, [('quantile', q)])} {hist.quantile(q):.6f}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+# --- SQLite instrumentation ---
+
+_STATEMENT_RE = re.compile(r"^\s*(\w+).*?\b(?:FROM|INTO|UPDATE|TABLE)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([\w.]+)",
+                           re.IGNORECASE | re.DOTALL)
+
+def statement_label(sql):
+    """Low-cardinality label such as 'SELECT puzzles' or 'INSERT user_progress'."""
+    match = _STATEMENT_RE.match(sql)
+    if match:
+        return f"{match.group(1).upper()} {match.group(2)}"
+    return sql.split(None, 1)[0].upper() if sql.strip() else "EMPTY"
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _label = "UNKNOWN"
+
+    def _timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except sqlite3.Error:
+            inc("neurochess_db_errors_total", statement=self._label)
+            raise
+        finally:
+            observe("neurochess_sql_duration_seconds", time.perf_counter() - start,
+                    statement=self._label, phase=phase)
+
+    def execute(self, sql, parameters=()):
+        self._label = statement_label(sql)
+        inc("neurochess_sql_statements_total", statement=self._label)
+        return self._timed("execute", super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._label = statement_label(sql)
+        inc("neurochess_sql_statements_total", statement=self._label)
+        return self._timed("execute", super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self._label = "SCRIPT"
+        inc("neurochess_sql_statements_total", statement=self._label)
+        return self._timed("execute", super().executescript, sql_script)
+
+    def fetchone(self):
+        row = self._timed("fetch", super().fetchone)
+        if row is not None:
+            inc("neurochess_sql_rows_fetched_total", statement=self._label)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed("fetch", super().fetchmany, self.arraysize if size is None else size)
+        inc("neurochess_sql_rows_fetched_total", len(rows), statement=self._label)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed("fetch", super().fetchall)
+        inc("neurochess_sql_rows_fetched_total", len(rows), statement=self._label)
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    # The C Connection.execute*() shortcuts build a plain sqlite3.Cursor without calling
+    # cursor(): route them through it so conn.execute() is counted like cursor().execute()
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def connect(path, **kwargs):
+    """sqlite3.connect() that records per-statement metrics when enabled."""
+    if ENABLED:
+        kwargs.setdefault("factory", InstrumentedConnection)
+    try:
+        return sqlite3.connect(path, **kwargs)
+    except sqlite3.Error:
+        inc("neurochess_db_errors_total", statement="CONNECT")
+        raise
+
+# --- Flask integration ---
+
+def init_app(app):
+    @app.route('/metrics')
+    def metrics_endpoint():
+        body = render() if ENABLED else "# metrics disabled (NEUROCHESS_METRICS=0)\n"
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
+    if not ENABLED:
+        return
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe("neurochess_http_request_duration_seconds", time.perf_counter() - start, route=route)
+            inc("neurochess_http_requests_total", route=route, method=request.method,
+                status=str(response.status_code))
+        return response
@@ -181,9 +181,10 @@ export const DatabaseService = {
     async getPuzzleCount() {
         if (!this.db) await this.init();
         try {
+            // Materialized counts (create_mobile_db.py), kept current by triggers on DLC merges
             const result = await this.db!.getFirstAsync<{ count: number }>(
-                `SELECT COUNT(*) as count FROM puzzles`
-            );
+                `SELECT SUM(puzzles) as count FROM catalog_stats WHERE theme = 'all'`
+            ).catch(() => this.db!.getFirstAsync<{ count: number }>(`SELECT COUNT(*) as count FROM puzzles`));
             return result?.count ?? 0;
         } catch (e) {
             console.error("Failed to get puzzle count:", e);
@@ -410,12 +411,21 @@ export const DatabaseService = {
 
     async getCountsByBand() {
         if (!this.db) await this.init();
-        const result = await this.db!.getAllAsync<{ rating_band: string; count: number }>(`
+        try {
+            return await this.db!.getAllAsync<{ rating_band: string; count: number }>(`
+      SELECT rating_band, SUM(puzzles) as count
+      FROM catalog_stats
+      WHERE theme = 'all'
+      GROUP BY rating_band
+    `);
+        } catch (e) {
+            // Databases installed before catalog_stats existed
+            return await this.db!.getAllAsync<{ rating_band: string; count: number }>(`
       SELECT rating_band, COUNT(*) as count 
       FROM puzzles 
       GROUP BY rating_band
     `);
-        return result;
+        }
     },
 
     async getPuzzleById(puzzleId: string) {
@@ -702,7 +712,10 @@ export const DatabaseService = {
         if (!this.db) await this.init();
         try {
             const table = mode === 'deep' ? 'puzzles_long' : 'puzzles';
-            const res = await this.db!.getFirstAsync<{ count: number }>(`SELECT COUNT(*) as count FROM ${table} `);
+            const statsTable = mode === 'deep' ? 'catalog_stats_long' : 'catalog_stats';
+            const res = await this.db!.getFirstAsync<{ count: number }>(
+                `SELECT SUM(puzzles) as count FROM ${statsTable} WHERE theme = 'all'`
+            ).catch(() => this.db!.getFirstAsync<{ count: number }>(`SELECT COUNT(*) as count FROM ${table} `));
             return res?.count || 0;
         } catch (e) {
             console.error("Count failed", e);
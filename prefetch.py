@@ -0,0 +1,176 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import metrics
+
+# Per-(user, mode, band, theme) ready queues of pre-selected, pre-serialized
+# puzzles, so a steady-state /get_puzzles is a queue pop instead of a query.
+# A background thread refills queues that drop below LOW_WATERMARK. Queued
+# puzzles outside the user's current ±RATING_WINDOW are dropped at pop time
+# (sampled queues, drawn by rating_sampler's soft curve, are only cleared when
+# the user's rating moves more than RATING_WINDOW from the fill's center),
+# solved puzzles are removed on record_attempt, and idle queues are evicted
+# after IDLE_TTL_S. NEUROCHESS_PREFETCH=0 disables it.
+
+ENABLED = os.environ.get("NEUROCHESS_PREFETCH", "1") != "0"
+TARGET_SIZE = 40        # Puzzles kept ready per queue...
+MAX_TARGET_SIZE = 200   # ...or 2x the largest batch seen for that key, up to this
+LOW_WATERMARK = 0.5     # Refill below this fraction of the target
+RATING_WINDOW = 150     # Same window as the adaptive query
+RECENT_SIZE = 500       # Recently served ids per queue, never re-queued
+IDLE_TTL_S = 600
+SWEEP_INTERVAL_S = 30
+
+metrics.describe("neurochess_prefetch_total", "counter", "/get_puzzles served from (hit) or bypassing (miss) the prefetch queues.")
+metrics.describe("neurochess_prefetch_refills_total", "counter", "Background prefetch queue refills.")
+
+class ReadyQueue:
+    __slots__ = ("items", "recent", "target", "adaptive", "sampled", "center", "last_access")
+
+    def __init__(self, target, adaptive, sampled=False):
+        self.items = deque()                      # (puzzle_id, rating, fragment)
+        self.recent = deque(maxlen=RECENT_SIZE)   # Served or queued ids
+        self.target = target
+        self.adaptive = adaptive                  # Rating-window filtered (no explicit band)
+        self.sampled = sampled                    # Filled by rating_sampler: no per-item window
+        self.center = None                        # User rating the queue was filled around
+        self.last_access = time.monotonic()
+
+class PrefetchManager:
+    def __init__(self, fill, target_size=TARGET_SIZE, idle_ttl=IDLE_TTL_S):
+        """
+        fill(key, user_rating, n, exclude) -> [(puzzle_id, rating, fragment), ...]
+        selects up to n fresh puzzles for key; it runs on the refill thread.
+        """
+        self.fill = fill
+        self.target_size = target_size
+        self.idle_ttl = idle_ttl
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._scheduled = {}  # key -> user_rating of the pending refill
+        self._thread = None
+        self._last_sweep = time.monotonic()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="puzzle-prefetch", daemon=True)
+            self._thread.start()
+
+    def _schedule(self, key, user_rating):
+        # Caller holds self._lock
+        if key not in self._scheduled:
+            self._requests.put(key)
+        self._scheduled[key] = user_rating
+        self._ensure_thread()
+
+    def take(self, key, count, user_rating, adaptive=True, sampled=False):
+        """
+        Pops `count` ready fragments for key, or returns None (and schedules a
+        refill) if the queue can't cover the whole batch. `adaptive` (no explicit
+        band) and `sampled` apply when the queue is first created.
+        """
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = ReadyQueue(min(max(self.target_size, count * 2), MAX_TARGET_SIZE), adaptive, sampled)
+            q.last_access = time.monotonic()
+            q.target = min(max(q.target, count * 2), MAX_TARGET_SIZE)
+
+            if q.adaptive and q.center is not None and abs(user_rating - q.center) > RATING_WINDOW:
+                q.items.clear()  # Whole queue was selected for a window we've left
+
+            taken = []
+            if len(q.items) >= count:
+                low, high = user_rating - RATING_WINDOW, user_rating + RATING_WINDOW
+                while q.items and len(taken) < count:
+                    item = q.items.popleft()
+                    if q.adaptive and not q.sampled and not low <= item[1] <= high:
+                        continue  # Rating drifted; this one no longer fits
+                    taken.append(item)
+
+            if len(taken) < count:
+                # Put back what we popped so a short queue isn't drained for nothing
+                q.items.extendleft(reversed(taken))
+                fragments = None
+            else:
+                fragments = [item[2] for item in taken]
+            if len(q.items) < q.target * LOW_WATERMARK or fragments is None:
+                self._schedule(key, user_rating)
+
+        metrics.inc("neurochess_prefetch_total", result="miss" if fragments is None else "hit")
+        return fragments
+
+    def _refill(self, key, user_rating):
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                return
+            if q.adaptive and q.center is not None and abs(user_rating - q.center) > RATING_WINDOW:
+                q.items.clear()
+            needed = q.target - len(q.items)
+            exclude = set(q.recent)
+        if needed <= 0:
+            return
+
+        items = self.fill(key, user_rating, needed, exclude)
+        metrics.inc("neurochess_prefetch_refills_total")
+        with self._lock:
+            q = self._queues.get(key)
+            if q is None:
+                return
+            q.center = user_rating
+            exclude = set(q.recent)  # Includes anything served or solved while we were filling
+            for item in items:
+                if item[0] not in exclude:
+                    exclude.add(item[0])
+                    q.items.append(item)
+                    q.recent.append(item[0])
+
+    def _run(self):
+        while True:
+            try:
+                key = self._requests.get(timeout=SWEEP_INTERVAL_S)
+            except queue.Empty:
+                key = None
+            if key is not None:
+                with self._lock:
+                    user_rating = self._scheduled.pop(key, None)
+                if user_rating is not None:
+                    try:
+                        self._refill(key, user_rating)
+                    except Exception as e:
+                        print(f"PREFETCH ERROR {key}: {e}", flush=True)
+            if time.monotonic() - self._last_sweep >= SWEEP_INTERVAL_S:
+                self.evict_idle()
+
+    def evict_idle(self):
+        now = time.monotonic()
+        self._last_sweep = now
+        with self._lock:
+            for key in [k for k, q in self._queues.items() if now - q.last_access > self.idle_ttl]:
+                del self._queues[key]
+
+    def discard(self, puzzle_id, user=None):
+        """Drops a (solved) puzzle from every queue, or only `user`'s queues."""
+        with self._lock:
+            for key, q in self._queues.items():
+                if user is None or key[0] == user:
+                    q.items = deque(item for item in q.items if item[0] != puzzle_id)
+                    q.recent.append(puzzle_id)  # Keep an in-flight refill from re-queuing it
+
+    def clear(self, user=None):
+        with self._lock:
+            for key in [k for k in self._queues if user is None or k[0] == user]:
+                del self._queues[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queues": len(self._queues),
+                "ready": sum(len(q.items) for q in self._queues.values()),
+                "pending_refills": len(self._scheduled),
+            }
@@ -0,0 +1,161 @@
+import os
+import gc
+import sys
+import time
+import random
+import signal
+import socket
+import argparse
+
+import app as server
+import metrics
+import prefetch
+import puzzle_cache
+import query_profiler
+import maia_service
+
+# Pre-fork multi-process deployment (Linux/macOS):
+#
+#   python prefork.py --workers 4 --port 5000 --db /data/lichess_mobile_puzzles.sqlite
+#
+# The master loads the app, opens the puzzle DB immutable=1 + memory-mapped (user
+# data lives in the per-user stores, see app.USER_DATA_DIR), serializes the
+# most-played puzzles into puzzle_cache's preloaded blob and freezes the heap,
+# then forks. Workers share those pages copy-on-write and the puzzle DB through
+# the OS page cache; every SQLite handle is opened after fork.
+#
+# Under gunicorn the same hooks apply: preload_app = True, call configure() and
+# preload() before the app is imported by workers, and after_fork() in post_fork.
+
+WORKERS = os.cpu_count() or 1
+MMAP_MB = 4096               # Larger than any puzzle DB we ship: map it whole
+PRELOAD_PUZZLES = 200_000    # Most-played puzzles serialized before fork
+LISTEN_BACKLOG = 1024
+
+def default_legacy_user_db(db_path):
+    # Split user DB written by earlier prefork.py versions (single-user tables)
+    return os.path.splitext(db_path)[0] + "_user.sqlite"
+
+def configure(db_path, user_data_dir=None, mmap_mb=MMAP_MB):
+    server.DB_PATH = db_path
+    server.USER_DATA_DIR = user_data_dir
+    server.PUZZLE_DB_IMMUTABLE = True
+    server.MMAP_SIZE = mmap_mb * 1024 * 1024
+    server.reset_user_store()
+    server.init_user_db()
+    legacy = default_legacy_user_db(db_path)
+    if os.path.exists(legacy):
+        server.get_user_store().migrate_legacy(legacy, server.DEFAULT_USER)
+
+def preload(limit=PRELOAD_PUZZLES):
+    """Builds shared read-only state in the master, before any fork."""
+    start = time.time()
+    conn = server.get_db_connection()
+    if conn is None:
+        sys.exit(1)
+    try:
+        puzzle_cache.cache.validate(conn, server.DB_PATH)
+        count = puzzle_cache.cache.preload(server.most_played(conn, limit))
+        # Shared with the workers too; their warmup then finds them built
+        server.rating_sampler.sampler.warm(conn)
+        server.catalog_stats.cache.catalog_json(conn)
+    finally:
+        conn.close()  # No SQLite handle may cross the fork
+    server.reset_user_store()  # Nor any user store connection (configure() opened some)
+    stats = puzzle_cache.cache.stats()
+    print(f"Preloaded {count:,} puzzles ({stats['preloaded_bytes'] / 1e6:.1f} MB) in {time.time() - start:.1f}s")
+
+    metrics.reset()
+    gc.collect()
+    gc.freeze()  # Keep the collector from touching (and un-sharing) pre-fork objects
+
+def after_fork():
+    """Per-worker reset of state that must not be inherited from the master."""
+    random.seed()  # Otherwise every worker seeks the same "random" puzzles
+    metrics.reset()
+    query_profiler.clear()
+    server.prefetcher = prefetch.PrefetchManager(server.prefetch_fill)  # Threads don't survive fork
+    maia_service._service = None
+    if server.WARMUP:
+        server.startup.start()  # Per-worker caches (stats, page cache); the rest was built before fork
+
+def run_worker(sock, host, port):
+    from werkzeug.serving import make_server
+    after_fork()
+    httpd = make_server(host, port, server.app, threaded=True, fd=sock.fileno())
+    httpd.serve_forever()
+
+def serve(workers, host, port):
+    if not hasattr(os, "fork"):
+        print("prefork.py needs os.fork (Linux/macOS); use app.py or asgi.py on Windows.")
+        sys.exit(1)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(sock, host, port)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"Master {os.getpid()}: {workers} workers on http://{host}:{port}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited ({status}), respawning")
+            spawn()
+
+def main():
+    parser = argparse.ArgumentParser(description="NeuroChess pre-fork server")
+    parser.add_argument("--db", default=server.DB_PATH, help="Puzzle DB (opened immutable)")
+    parser.add_argument("--user-data", default=None, help="Per-user stores directory (default: neurochess_users/ next to --db)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--mmap-mb", type=int, default=MMAP_MB)
+    parser.add_argument("--preload-puzzles", type=int, default=PRELOAD_PUZZLES)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"CRITICAL ERROR: Database not found at {args.db}")
+        sys.exit(1)
+    configure(args.db, args.user_data, args.mmap_mb)
+    print(f"Using DB: {server.DB_PATH} (immutable, mmap {args.mmap_mb} MB) | User stores: {server.get_user_store().data_dir}")
+    preload(args.preload_puzzles)
+    serve(args.workers, args.host, args.port)
+
+if __name__ == '__main__':
+    main()
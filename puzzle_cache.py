@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+import metrics
+
+# Size-bounded LRU of fully serialized per-puzzle JSON fragments, keyed by PuzzleId.
+# Batch responses are assembled by concatenating cached fragments, so hot puzzles
+# skip dict(row), Moves.split() and JSON encoding entirely.
+# The cache is dropped when the puzzle DB is swapped (new file) or its schema
+# changes (tables rebuilt in place); user-table writes don't invalidate it.
+
+try:
+    import orjson  # Optional faster encoder
+except ImportError:
+    orjson = None
+
+MAX_BYTES = int(os.environ.get("NEUROCHESS_PUZZLE_CACHE_MB", "64")) * 1024 * 1024
+CHECK_INTERVAL = 1.0  # Seconds between DB change checks
+CACHE_CONTROL = "public, max-age=86400"  # Puzzle content never changes for a given DB build
+
+metrics.describe("neurochess_puzzle_cache_hits_total", "counter", "Puzzle payloads served from the fragment cache.")
+metrics.describe("neurochess_puzzle_cache_misses_total", "counter", "Puzzle payloads serialized from DB rows.")
+
+def dumps(obj):
+    """Compact JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def puzzle_payload(row):
+    """Client-facing puzzle dict from a puzzles row."""
+    return {
+        "PuzzleId": row['PuzzleId'],
+        "FEN": row['FEN'],
+        "Moves": (row['Moves'] or "").split(),  # Convert 'e2e4 e7e5' to list
+        "Rating": row['Rating'] or 0,
+        "Band": row['rating_band'] or 'Uncategorized',
+        "Themes": row['Themes'] or ''
+    }
+
+def etag_for(fragment):
+    return '"' + hashlib.blake2b(fragment, digest_size=12).hexdigest() + '"'
+
+class PuzzleCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # PuzzleId -> fragment bytes
+        self._bytes = 0
+        self._frozen_blob = b""
+        self._frozen_index = {}  # PuzzleId -> offset << 16 | length, into _frozen_blob
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+
+    def validate(self, conn, db_path, schema="main"):
+        """Clears the cache if the DB file was replaced or its schema changed; True if it did."""
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        st = os.stat(db_path)
+        schema_version = conn.execute(f"PRAGMA {schema}.schema_version").fetchone()[0]
+        signature = (db_path, st.st_dev, st.st_ino, schema_version)
+        if signature != self._signature:
+            self.clear()
+            changed = self._signature is not None
+            self._signature = signature
+            return changed
+        return False
+
+    def _frozen_get(self, puzzle_id):
+        packed = self._frozen_index.get(puzzle_id)
+        if packed is None:
+            return None
+        offset = packed >> 16
+        return self._frozen_blob[offset:offset + (packed & 0xFFFF)]
+
+    def preload(self, rows):
+        """
+        Serializes rows into one immutable blob plus an offset index, checked before the LRU.
+        Built before fork (prefork.py), these pages stay shared copy-on-write: lookups
+        don't reorder anything, and the fragments live in a single refcounted object.
+        """
+        parts, index, offset = [], {}, 0
+        for row in rows:
+            fragment = dumps(puzzle_payload(row))
+            index[row['PuzzleId']] = offset << 16 | len(fragment)
+            parts.append(fragment)
+            offset += len(fragment)
+        with self._lock:
+            self._frozen_blob = b"".join(parts)
+            self._frozen_index = index
+        return len(index)
+
+    def get(self, puzzle_id):
+        with self._lock:
+            fragment = self._frozen_get(puzzle_id)
+            if fragment is None:
+                fragment = self._entries.get(puzzle_id)
+                if fragment is not None:
+                    self._entries.move_to_end(puzzle_id)
+        metrics.inc("neurochess_puzzle_cache_hits_total" if fragment else "neurochess_puzzle_cache_misses_total")
+        return fragment
+
+    def _put_locked(self, puzzle_id, fragment):
+        old = self._entries.pop(puzzle_id, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[puzzle_id] = fragment
+        self._bytes += len(fragment)
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def put(self, puzzle_id, fragment):
+        with self._lock:
+            self._put_locked(puzzle_id, fragment)
+        return fragment
+
+    def fragment_for_row(self, row):
+        """Cached JSON bytes for a puzzles row, serializing it on a miss."""
+        fragment = self.get(row['PuzzleId'])
+        if fragment is None:
+            fragment = self.put(row['PuzzleId'], dumps(puzzle_payload(row)))
+        return fragment
+
+    def fragments_for_rows(self, rows):
+        """fragment_for_row for a whole batch under one lock acquisition."""
+        fragments = []
+        misses = 0
+        with self._lock:
+            for row in rows:
+                puzzle_id = row['PuzzleId']
+                fragment = self._frozen_get(puzzle_id)
+                if fragment is not None:
+                    fragments.append(fragment)
+                    continue
+                fragment = self._entries.get(puzzle_id)
+                if fragment is None:
+                    misses += 1
+                    fragment = dumps(puzzle_payload(row))
+                    self._put_locked(puzzle_id, fragment)
+                else:
+                    self._entries.move_to_end(puzzle_id)
+                fragments.append(fragment)
+        metrics.inc("neurochess_puzzle_cache_hits_total", len(fragments) - misses)
+        metrics.inc("neurochess_puzzle_cache_misses_total", misses)
+        return fragments
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._frozen_blob = b""
+            self._frozen_index = {}
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "preloaded": len(self._frozen_index), "preloaded_bytes": len(self._frozen_blob)}
+
+cache = PuzzleCache()
+
+def batch_response(user_rating, fragments):
+    """{"user_rating": N, "puzzles": [...]} built from pre-serialized fragments."""
+    body = b'{"user_rating":%d,"puzzles":[%s]}' % (round(user_rating), b",".join(fragments))
+    return Response(body, mimetype="application/json")
+
+def puzzle_response(fragment):
+    """Single puzzle response with ETag/Cache-Control (304 on a matching If-None-Match)."""
+    response = Response(fragment, mimetype="application/json")
+    response.headers["ETag"] = etag_for(fragment)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response.make_conditional(request)
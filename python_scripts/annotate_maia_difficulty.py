@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import itertools
+import multiprocessing
+
+import chess
+
+import create_short_db
+import create_long_db
+
+# maia_service.py lives in the project root next to app.py
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import maia_service
+
+# ==============================================================================
+# Annotates every puzzle with the Maia-2 probability that a human at a given
+# Elo finds the whole solution (product of P(solution move) over solver plies).
+#
+# Stored as maia_find_<elo> INTEGER in units of 1/10000 (0..10000), -1 if the
+# puzzle could not be annotated. NULL means "not processed yet", so an
+# interrupted run simply continues where the last committed chunk ended.
+# ==============================================================================
+ELO_LEVELS = [1100, 1500, 1900]
+CHUNK_SIZE = 500        # Puzzles per worker task / per commit
+WORKERS = max(1, (os.cpu_count() or 1) // 2)
+SCALE = 10000
+
+DB_PATHS = {
+    "short": create_short_db.DEST_DB,
+    "long": create_long_db.DEST_DB,
+}
+
+def column_name(elo):
+    return f"maia_find_{elo}"
+
+def ensure_columns(conn, elos):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(puzzles)")}
+    for elo in elos:
+        col = column_name(elo)
+        if col not in existing:
+            print(f"  Adding column {col}...")
+            conn.execute(f"ALTER TABLE puzzles ADD COLUMN {col} INTEGER")
+    conn.commit()
+
+def create_indexes(conn, elos):
+    for elo in elos:
+        col = column_name(elo)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{col} ON puzzles({col})")
+    conn.commit()
+
+def solver_positions(fen, moves):
+    """FEN before each solver move (Moves[1], Moves[3], ...) paired with that move."""
+    board = chess.Board(fen)
+    positions = []
+    for i, uci in enumerate(moves):
+        if i % 2 == 1:
+            positions.append((board.fen(), uci))
+        board.push_uci(uci)
+    return positions
+
+# --- Worker (one model per process) ---
+_service = None
+_elos = None
+
+def _init_worker(threads_per_worker, elos):
+    global _service, _elos
+    _elos = elos
+    _service = maia_service.MaiaService(num_threads=threads_per_worker).start()
+
+def _annotate_chunk(rows):
+    """rows: [(rowid, FEN, Moves)] -> [(rowid, value_per_elo...)]"""
+    # Submit every (position, elo) of the chunk up front so they share forward passes
+    plans = []
+    for rowid, fen, moves in rows:
+        try:
+            positions = solver_positions(fen, moves.split())
+        except ValueError:
+            plans.append((rowid, None))
+            continue
+        futures = {elo: [(_service.submit(pos_fen, elo, elo), uci) for pos_fen, uci in positions] for elo in _elos}
+        plans.append((rowid, futures))
+
+    results = []
+    for rowid, futures in plans:
+        if futures is None:
+            results.append((rowid,) + (-1,) * len(_elos))
+            continue
+        values = []
+        for elo in _elos:
+            try:
+                p = 1.0
+                for future, uci in futures[elo]:
+                    move_probs, _ = future.result()
+                    p *= move_probs.get(uci, 0.0)
+                values.append(round(p * SCALE))
+            except Exception:
+                values.append(-1)
+        results.append((rowid,) + tuple(values))
+    return results
+
+def iter_chunks(conn, elos, chunk_size, limit):
+    """Yields unannotated rows in rowid order; rowid paging keeps each read cheap."""
+    pending = " OR ".join(f"{column_name(elo)} IS NULL" for elo in elos)
+    last_rowid = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = conn.execute(
+            f"SELECT rowid, FEN, Moves FROM puzzles WHERE rowid > ? AND ({pending}) ORDER BY rowid LIMIT ?",
+            (last_rowid, size)
+        ).fetchall()
+        if not rows:
+            return
+        last_rowid = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        yield rows
+
+def annotate_db(db_path, elos, workers, chunk_size, limit=None):
+    print(f"\n--- Annotating {db_path} ---")
+    if not os.path.exists(db_path):
+        print(f"Error: Database not found at {db_path}")
+        return
+
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_columns(conn, elos)
+        pending = " OR ".join(f"{column_name(elo)} IS NULL" for elo in elos)
+        todo = conn.execute(f"SELECT COUNT(*) FROM puzzles WHERE {pending}").fetchone()[0]
+        if limit is not None:
+            todo = min(todo, limit)
+        print(f"Puzzles to annotate: {todo:,} | Elo levels: {elos} | Workers: {workers}")
+
+        update_sql = (f"UPDATE puzzles SET "
+                      + ", ".join(f"{column_name(elo)} = ?" for elo in elos)
+                      + " WHERE rowid = ?")
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+        done = 0
+        start_time = time.time()
+        chunks = iter_chunks(conn, elos, chunk_size, limit)
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(threads_per_worker, elos)) as pool:
+            while True:
+                # Read a bounded wave at a time so memory stays flat on multi-million row DBs
+                wave = list(itertools.islice(chunks, workers * 2))
+                if not wave:
+                    break
+                for results in pool.imap(_annotate_chunk, wave):
+                    conn.executemany(update_sql, [r[1:] + (r[0],) for r in results])
+                    conn.commit()  # Each committed chunk is a checkpoint
+                    done += len(results)
+                    rate = done / (time.time() - start_time) * 3600
+                    print(f"Annotated {done:,}/{todo:,} ({rate:,.0f} puzzles/hour)", end='\r')
+
+        elapsed = time.time() - start_time
+        print(f"\nDone: {done:,} puzzles in {elapsed:.1f}s "
+              f"({done / elapsed * 3600 if elapsed > 0 else 0:,.0f} puzzles/hour on CPU)")
+
+        print("Creating indexes...")
+        create_indexes(conn, elos)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maia-2 human difficulty annotation")
+    parser.add_argument("--db", choices=["short", "long", "both"], default="both")
+    parser.add_argument("--elos", type=int, nargs="+", default=ELO_LEVELS)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="Stop after N puzzles per DB (for measuring)")
+    args = parser.parse_args()
+
+    targets = ["short", "long"] if args.db == "both" else [args.db]
+    for name in targets:
+        annotate_db(DB_PATHS[name], args.elos, args.workers, args.chunk_size, args.limit)
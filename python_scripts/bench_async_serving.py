@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import subprocess
+
+# ==============================================================================
+# Threaded vs ASGI serving benchmark.
+# Starts the API in each mode as a subprocess, holds SLOW_CLIENTS open DLC
+# downloads that read at SLOW_RATE bytes/s, and meanwhile measures
+# /get_puzzles latency from PUZZLE_CLIENTS concurrent clients.
+#   threaded - Flask dev server, threaded=True (app.py __main__)
+#   asgi     - asgi.py under uvicorn (skipped if uvicorn is not installed)
+#
+#   python bench_async_serving.py --db bench_puzzles_200000.db --slow-clients 2000
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+SLOW_CLIENTS = 1000
+SLOW_RATE = 32 * 1024      # Bytes/s per slow downloader
+PUZZLE_CLIENTS = 16
+DURATION_S = 15
+RAMP_S = 3                 # Let the downloads connect before measuring
+DLC_SIZE_MB = 64
+REQUEST_TIMEOUT_S = 10
+PORT = 5099
+MODES = ["threaded", "asgi"]
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+# --- Server side (run as a subprocess) ---
+
+def serve(mode, port, db_path, dlc_path):
+    raise_fd_limit()
+    sys.path.insert(0, BASE_DIR)
+    import app as server
+    server.DB_PATH = os.path.abspath(db_path)
+    server.DLC_PATH = os.path.abspath(dlc_path)
+    server.init_user_db()
+    if mode == "threaded":
+        import logging
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server.app.run(port=port, threaded=True, debug=False)
+    else:
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.app, host="127.0.0.1", port=port, log_level="error", backlog=4096)
+
+# --- Client side ---
+
+async def open_slow_socket(port):
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024)  # Keep the server's sends blocked
+    sock.setblocking(False)
+    await loop.sock_connect(sock, ("127.0.0.1", port))
+    return await asyncio.open_connection(sock=sock)
+
+async def slow_download(port, deadline, stats):
+    try:
+        reader, writer = await asyncio.wait_for(open_slow_socket(port), REQUEST_TIMEOUT_S)
+        writer.write(b"GET /api/dlc/puzzles_v1 HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+    except (OSError, asyncio.TimeoutError):
+        stats["slow_connect_errors"] += 1
+        return
+    stats["slow_connected"] += 1
+    try:
+        while time.perf_counter() < deadline:
+            chunk = await asyncio.wait_for(reader.read(4096), REQUEST_TIMEOUT_S)
+            if not chunk:
+                break
+            stats["slow_bytes"] += len(chunk)
+            await asyncio.sleep(len(chunk) / SLOW_RATE)
+    except (OSError, asyncio.TimeoutError):
+        stats["slow_stalled"] += 1
+    finally:
+        writer.close()
+
+async def puzzle_request(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        data = await reader.read()
+        return int(data.split(b" ", 2)[1]) if data.startswith(b"HTTP/") else 0
+    finally:
+        writer.close()
+
+async def puzzle_client(port, idx, deadline, stats):
+    path = f"/get_puzzles?count=10&rating={1000 + idx * 50}&user=bench{idx}"
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(puzzle_request(port, path), REQUEST_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            stats["puzzle_timeouts"] += 1
+            continue
+        except OSError:
+            stats["puzzle_errors"] += 1
+            await asyncio.sleep(0.1)
+            continue
+        if status == 200:
+            stats["latencies"].append(time.perf_counter() - start)
+        else:
+            stats["puzzle_errors"] += 1
+
+async def drive(port, slow_clients, puzzle_clients, duration):
+    stats = {"slow_connected": 0, "slow_connect_errors": 0, "slow_stalled": 0, "slow_bytes": 0,
+             "puzzle_errors": 0, "puzzle_timeouts": 0, "latencies": []}
+    deadline = time.perf_counter() + RAMP_S + duration
+    slow = [asyncio.ensure_future(slow_download(port, deadline, stats)) for _ in range(slow_clients)]
+    await asyncio.sleep(RAMP_S)
+    start = time.perf_counter()
+    await asyncio.gather(*(puzzle_client(port, i, deadline, stats) for i in range(puzzle_clients)))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*slow)
+    return stats, elapsed
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000 if ordered else float("nan")
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def run_mode(mode, args, dlc_path):
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(args.port),
+                             "--db", args.db, "--dlc", dlc_path], stdout=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            print(f"{mode}: server did not start")
+            return None
+        stats, elapsed = asyncio.run(drive(args.port, args.slow_clients, args.puzzle_clients, args.duration))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    lat = stats.pop("latencies")
+    return {
+        **stats,
+        "puzzle_requests": len(lat),
+        "puzzle_rps": len(lat) / elapsed,
+        "p50_ms": percentile(lat, 50),
+        "p95_ms": percentile(lat, 95),
+        "p99_ms": percentile(lat, 99),
+        "slow_mb_per_s": stats["slow_bytes"] / (args.duration + RAMP_S) / 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Threaded vs ASGI serving benchmark")
+    parser.add_argument("--db", default=None, help="Puzzle DB (e.g. bench_puzzles_200000.db)")
+    parser.add_argument("--dlc", default=None, help="DLC file to serve (default: random file of --dlc-mb)")
+    parser.add_argument("--dlc-mb", type=int, default=DLC_SIZE_MB)
+    parser.add_argument("--slow-clients", type=int, default=SLOW_CLIENTS)
+    parser.add_argument("--puzzle-clients", type=int, default=PUZZLE_CLIENTS)
+    parser.add_argument("--duration", type=float, default=DURATION_S)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    parser.add_argument("--serve", default=None, choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.db, args.dlc)
+        return
+    if not args.db or not os.path.exists(args.db):
+        print("--db must point at a puzzle DB (bench_puzzle_queries.py builds one)")
+        sys.exit(1)
+    args.db = os.path.abspath(args.db)
+
+    fd_limit = raise_fd_limit()
+    if fd_limit < args.slow_clients + args.puzzle_clients + 64:
+        print(f"WARNING: open file limit {fd_limit} is below the client count")
+
+    dlc_path = args.dlc
+    if not dlc_path:
+        dlc_path = os.path.join(SCRIPT_DIR, f"bench_dlc_{args.dlc_mb}mb.bin")
+        if not os.path.exists(dlc_path):
+            with open(dlc_path, "wb") as f:
+                for _ in range(args.dlc_mb):
+                    f.write(os.urandom(1024 * 1024))
+
+    results = {}
+    for mode in args.modes:
+        if mode == "asgi":
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                print("asgi: skipped (pip install uvicorn)")
+                continue
+        print(f"{mode}: {args.slow_clients} slow DLC downloads + {args.puzzle_clients} puzzle clients "
+              f"for {args.duration}s...")
+        results[mode] = run_mode(mode, args, dlc_path)
+
+    print(f"\n{'Mode':<9} | {'DLC conn':>8} | {'DLC err':>7} | {'Puzzle/s':>8} | {'p50 ms':>8} | "
+          f"{'p95 ms':>8} | {'p99 ms':>8} | {'Err':>5} | {'Timeout':>7}")
+    print("-" * 92)
+    for mode, r in results.items():
+        if r is None:
+            continue
+        print(f"{mode:<9} | {r['slow_connected']:>8} | {r['slow_connect_errors']:>7} | {r['puzzle_rps']:>8.1f} | "
+              f"{r['p50_ms']:>8.2f} | {r['p95_ms']:>8.2f} | {r['p99_ms']:>8.2f} | {r['puzzle_errors']:>5} | "
+              f"{r['puzzle_timeouts']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"slow_clients": args.slow_clients, "puzzle_clients": args.puzzle_clients,
+                       "duration_s": args.duration, "results": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
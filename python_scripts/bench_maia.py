@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import threading
+
+import chess
+
+# maia_service.py lives in the project root next to app.py
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import maia_service
+
+# ==============================================================================
+# Throughput / latency of batched CPU Maia-2 inference.
+#   1. inference_each baseline (one FEN per forward pass)
+#   2. Raw forward passes at batch sizes 1..256
+#   3. End-to-end service with concurrent client threads (micro-batching + cache)
+# ==============================================================================
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+REPEATS = 5
+CLIENT_THREADS = [1, 8, 32]
+REQUESTS_PER_CLIENT = 32
+ELO = 1500
+SEED = 42
+
+def random_fens(count, seed=SEED):
+    """Distinct middlegame-ish positions from seeded random playouts."""
+    rng = random.Random(seed)
+    fens = set()
+    while len(fens) < count:
+        board = chess.Board()
+        for _ in range(rng.randint(10, 60)):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            board.push(rng.choice(legal))
+        if not board.is_game_over():
+            fens.add(board.fen())
+    return list(fens)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def bench_each(service, fens):
+    inference = service._inference
+    times = []
+    for fen in fens:
+        start = time.perf_counter()
+        inference.inference_each(service._model, service._prepared, fen, ELO, ELO)
+        times.append(time.perf_counter() - start)
+    return {
+        "positions": len(fens),
+        "p50_ms": percentile(times, 50) * 1000,
+        "positions_per_s": len(fens) / sum(times),
+    }
+
+def bench_batches(service, fens, batch_sizes, repeats):
+    results = []
+    for size in batch_sizes:
+        keys = [(fen, ELO, ELO) for fen in fens[:size]]
+        service._run_batch(keys)  # Warm up allocator for this shape
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            service._run_batch(keys)
+            times.append(time.perf_counter() - start)
+        results.append({
+            "batch_size": size,
+            "p50_ms": percentile(times, 50) * 1000,
+            "p95_ms": percentile(times, 95) * 1000,
+            "positions_per_s": size / statistics.median(times),
+        })
+    return results
+
+def bench_service(fens, threads, requests_per_client, max_batch):
+    """Fresh service per run so every request is a cache miss."""
+    service = maia_service.MaiaService(max_batch=max_batch).start()
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        local = []
+        for i in range(requests_per_client):
+            fen = fens[(offset * requests_per_client + i) % len(fens)]
+            start = time.perf_counter()
+            service.predict(fen, ELO, ELO)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=client, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    stats = service.stats()
+    return {
+        "threads": threads,
+        "requests": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "requests_per_s": len(latencies) / elapsed,
+        "avg_batch_size": stats["avg_batch_size"],
+        "cache_hits": stats["cache_hits"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Maia-2 CPU batching benchmark")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--threads", type=int, nargs="+", default=CLIENT_THREADS)
+    parser.add_argument("--num-threads", type=int, default=None, help="torch.set_num_threads (default: all cores)")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    fens = random_fens(max(max(args.batch_sizes), max(args.threads) * REQUESTS_PER_CLIENT))
+    service = maia_service.MaiaService(num_threads=args.num_threads).start()
+    print(f"Model loaded ({service.model_type}), torch threads: {service.num_threads}")
+
+    each = bench_each(service, fens[:64])
+    print(f"\n[inference_each] {each['positions_per_s']:.1f} positions/s (p50 {each['p50_ms']:.2f}ms)")
+
+    batches = bench_batches(service, fens, args.batch_sizes, args.repeats)
+    print(f"\n{'Batch':>6} | {'p50 ms':>9} | {'p95 ms':>9} | {'Pos/s':>9}")
+    print("-" * 44)
+    for row in batches:
+        print(f"{row['batch_size']:>6} | {row['p50_ms']:>9.2f} | {row['p95_ms']:>9.2f} | {row['positions_per_s']:>9.1f}")
+
+    service_runs = [bench_service(fens, t, REQUESTS_PER_CLIENT, service.max_batch) for t in args.threads]
+    print(f"\n{'Clients':>7} | {'Req/s':>8} | {'p50 ms':>8} | {'p99 ms':>8} | {'Avg batch':>9}")
+    print("-" * 52)
+    for row in service_runs:
+        print(f"{row['threads']:>7} | {row['requests_per_s']:>8.1f} | {row['p50_ms']:>8.2f} | "
+              f"{row['p99_ms']:>8.2f} | {row['avg_batch_size']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"num_threads": service.num_threads, "inference_each": each,
+                       "batches": batches, "service": service_runs}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
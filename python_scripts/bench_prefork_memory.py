@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import socket
+import random
+import argparse
+import subprocess
+import urllib.request
+
+# ==============================================================================
+# Memory benchmark for the pre-fork deployment (prefork.py, Linux only).
+# Starts prefork.py with 1 and N workers, warms every worker with /get_puzzles
+# and /get_puzzle traffic, then sums RSS / PSS / private memory of the master
+# and workers from /proc/<pid>/smaps_rollup. PSS splits shared pages between the
+# processes sharing them, so total PSS is the real footprint; with pages shared
+# copy-on-write, N workers should stay close to the single-worker total.
+#
+#   python bench_prefork_memory.py --db bench_puzzles_1000000.db --workers 4
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+WORKERS = 4
+WARM_REQUESTS = 2000
+PORT = 5098
+
+def smaps_rollup(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return values
+
+def children_of(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+def wait_for_port(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def warm(port, requests, seed=1):
+    rng = random.Random(seed)
+    base = f"http://127.0.0.1:{port}"
+    seen = []
+    for i in range(requests):
+        if seen and i % 3 == 0:
+            path = f"/get_puzzle/{rng.choice(seen)}"
+        else:
+            path = f"/get_puzzles?count=20&rating={rng.randint(800, 2400)}&user=u{rng.randint(0, 50)}"
+        with urllib.request.urlopen(base + path, timeout=30) as resp:
+            body = json.loads(resp.read())
+        if "puzzles" in body:
+            seen = (seen + [p["PuzzleId"] for p in body["puzzles"]])[-1000:]
+
+def measure(args, workers, preload):
+    cmd = [sys.executable, os.path.join(BASE_DIR, "prefork.py"), "--db", args.db, "--workers", str(workers),
+           "--port", str(args.port), "--preload-puzzles", str(preload)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(args.port):
+            raise RuntimeError("prefork.py did not start")
+        warm(args.port, args.requests)
+        time.sleep(1)
+        pids = [proc.pid] + children_of(proc.pid)
+        per_process = {pid: smaps_rollup(pid) for pid in pids}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    def total(key):
+        return sum(p.get(key, 0) for p in per_process.values())
+
+    worker_rss = [per_process[pid]["Rss"] for pid in pids[1:]]
+    return {
+        "workers": workers,
+        "preload": preload,
+        "total_rss_mb": total("Rss") / 1e6,
+        "total_pss_mb": total("Pss") / 1e6,
+        "total_private_mb": (total("Private_Clean") + total("Private_Dirty")) / 1e6,
+        "master_rss_mb": per_process[proc.pid]["Rss"] / 1e6,
+        "avg_worker_rss_mb": sum(worker_rss) / len(worker_rss) / 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="prefork.py memory benchmark")
+    parser.add_argument("--db", required=True, help="Puzzle DB (bench_puzzle_queries.py builds one)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--preload-puzzles", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=WARM_REQUESTS, help="Warm-up requests per run")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("Needs Linux /proc/<pid>/smaps_rollup")
+        sys.exit(1)
+
+    runs = [(1, args.preload_puzzles), (args.workers, args.preload_puzzles), (args.workers, 0)]
+    results = []
+    for workers, preload in runs:
+        print(f"Measuring {workers} worker(s), preload {preload:,}...")
+        results.append(measure(args, workers, preload))
+
+    print(f"\n{'Workers':>7} | {'Preload':>8} | {'Total PSS MB':>12} | {'Private MB':>10} | "
+          f"{'Total RSS MB':>12} | {'Worker RSS MB':>13}")
+    print("-" * 78)
+    for r in results:
+        print(f"{r['workers']:>7} | {r['preload']:>8,} | {r['total_pss_mb']:>12.1f} | {r['total_private_mb']:>10.1f} | "
+              f"{r['total_rss_mb']:>12.1f} | {r['avg_worker_rss_mb']:>13.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": args.db, "results": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import time
+import random
+import string
+import sqlite3
+import argparse
+
+import create_short_db
+from create_sac_puzzles import COLUMNS, ensure_schema
+
+# ==============================================================================
+# Query-plan and latency regression benchmark for the puzzle DB.
+# Builds a synthetic DB with the create_short_db schema (partial theme indexes
+# included) and the user_store.SCHEMA tables, runs every query shape app.py and
+# mobile database.ts issue, asserts on EXPLAIN QUERY PLAN and records latency
+# percentiles to JSON. The puzzle seek and listing shapes are generated by the
+# server's own builders (app.build_puzzle_filter, stream_puzzle_rows,
+# stream_listing_rows) and run with the user's solved set bound (is_solved).
+#
+#   python bench_puzzle_queries.py --rows 1000000 --output run.json
+#   python bench_puzzle_queries.py --rows 1000000 --compare run.json
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, BASE_DIR)
+
+import app as server  # noqa: E402
+import solved_sets  # noqa: E402
+import user_store  # noqa: E402
+
+DEFAULT_ROWS = 200_000
+ITERATIONS = 200
+HISTORY_FRACTION = 0.02  # Share of puzzles in the user's solved history
+FAVORITES = 500
+REGRESSION_FACTOR = 1.5  # p95 slower than this x baseline counts as a regression...
+REGRESSION_MIN_MS = 0.5  # ...if it is also at least this much slower (sub-ms shapes are noisy)
+SEED = 7
+USER = server.DEFAULT_USER
+
+ID_CHARS = string.ascii_letters + string.digits
+THEME_RATE = 0.08
+SAMPLE_FEN = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
+
+# Mobile history tables (database.ts); its user_favorites also has a mode column
+MOBILE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS puzzles_games (
+        puzzle_id TEXT PRIMARY KEY,
+        status TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_puzzles_games_status ON puzzles_games(status);
+    CREATE TABLE IF NOT EXISTS deep_games (
+        puzzle_id TEXT PRIMARY KEY,
+        status TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_deep_games_status ON deep_games(status);
+    ALTER TABLE user_favorites ADD COLUMN mode TEXT DEFAULT 'standard';
+    CREATE INDEX IF NOT EXISTS idx_favorites_mode ON user_favorites(mode);
+'''
+
+def random_id(rng):
+    return ''.join(rng.choices(ID_CHARS, k=5))
+
+def build_db(path, rows, seed=SEED):
+    """Synthetic puzzles + user tables shaped like the server (and mobile) DBs."""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    # Same table and indexes as create_short_db/create_long_db
+    ensure_schema(cursor)
+
+    placeholders = ",".join(["?"] * len(COLUMNS))
+    insert_query = f"INSERT OR IGNORE INTO puzzles ({', '.join(COLUMNS)}) VALUES ({placeholders})"
+    batch = []
+    start = time.time()
+    for _ in range(rows):
+        rating = max(400, min(3200, int(rng.gauss(1500, 450))))
+        ply = rng.choice([2, 2, 4, 4, 4, 6, 6, 8, 10, 12])
+        themes = [t for t in create_short_db.THEMES_TO_INDEX if rng.random() < THEME_RATE]
+        moves = " ".join(rng.choice(["e2e4", "g1f3", "d7d5", "c8g4", "f1c4"]) for _ in range(ply))
+        batch.append((
+            random_id(rng), SAMPLE_FEN, moves, rating, 80, rng.randint(50, 100), rng.randint(0, 50000),
+            " ".join(themes), "https://lichess.org/xxxxxxxx#1", "", create_short_db.get_band_label(rating),
+            (ply + 1) // 2,
+        ) + tuple(1 if t in themes else 0 for t in create_short_db.THEMES_TO_INDEX))
+        if len(batch) >= create_short_db.BATCH_SIZE:
+            cursor.executemany(insert_query, batch)
+            batch = []
+    if batch:
+        cursor.executemany(insert_query, batch)
+
+    # Server user-store tables from user_store.SCHEMA (in one file here, so the plans
+    # can be checked without attaching) + mobile history tables (database.ts)
+    cursor.executescript(user_store.SCHEMA)
+    cursor.executescript(MOBILE_SCHEMA)
+    history = int(rows * HISTORY_FRACTION)
+    # The user_store sync triggers fill sync_changes as the server's writes would
+    cursor.execute("""
+        INSERT INTO user_progress (user_id, puzzle_id, status)
+        SELECT ?, PuzzleId, CASE WHEN abs(random()) % 4 = 0 THEN 'failed' ELSE 'solved' END
+        FROM puzzles ORDER BY random() LIMIT ?
+    """, (USER, history))
+    cursor.execute("""
+        INSERT INTO review_queue (user_id, puzzle_id, due_at, interval_days, ease, reps, lapses)
+        SELECT user_id, puzzle_id, strftime('%s', 'now') + (abs(random()) % 2592000) - 864000, 1, 2.5, 1, 1
+        FROM user_progress WHERE status = 'failed'
+    """)
+    for table in ("puzzles_games", "deep_games"):
+        cursor.execute(f"""
+            INSERT INTO {table} (puzzle_id, status)
+            SELECT PuzzleId, CASE WHEN abs(random()) % 4 = 0 THEN 'loss' ELSE 'win' END
+            FROM puzzles ORDER BY random() LIMIT ?
+        """, (history,))
+    cursor.execute("""
+        INSERT INTO user_favorites (user_id, puzzle_id, mode)
+        SELECT ?, PuzzleId, CASE WHEN abs(random()) % 3 = 0 THEN 'deep' ELSE 'standard' END
+        FROM puzzles ORDER BY random() LIMIT ?
+    """, (USER, FAVORITES))
+    cursor.execute("INSERT INTO player_stats (user_id, mode, rating, rd, vol) VALUES (?, 'standard', 1500, 80, 0.06)",
+                   (USER,))
+    conn.commit()
+    create_short_db.assign_ordinals(conn)
+    create_short_db.build_catalog_stats(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Built {path}: {rows:,} puzzles, {history:,} history rows in {time.time() - start:.1f}s")
+
+# --- Query shapes ---
+# expect_any: at least one plan line must contain one of these
+# forbid: no plan line may contain these
+
+def _adaptive(rng):
+    r = rng.randint(800, 2400)
+    return r - 150, r + 150
+
+def first_page(rows_for):
+    """(sql, params) of the first page app.py fetches for a rows generator (fetch -> rows)."""
+    pages = []
+    def fetch(query, params):
+        pages.append((query, params))
+        return []
+    for _ in rows_for(fetch):
+        pass
+    return pages[0]
+
+def _seek(band=None, theme=None):
+    """/get_puzzles, /stream_puzzles and prefetch fills: one PuzzleId seek page."""
+    def query(rng):
+        base_query, base_params = server.build_puzzle_filter(rng.randint(800, 2400), band and band(rng), theme)
+        return first_page(lambda fetch: server.stream_puzzle_rows(fetch, base_query, base_params, random_id(rng), 10))
+    return query
+
+def _listing(base_query, alias, count):
+    """/favorites and /history: one keyset page after a (timestamp, puzzle_id) cursor."""
+    def query(rng):
+        after = ("9999-12-31", random_id(rng))
+        return first_page(lambda fetch: server.stream_listing_rows(fetch, base_query, [USER], alias, after, count))
+    return query
+
+SHAPES = [
+    # "query": rng -> (sql, params) built by app.py, or a fixed "sql" with "params": rng -> params
+    {
+        "name": "server_adaptive_seek",
+        "query": _seek(),
+        "expect_any": ["USING INDEX idx_puzzles_id (PuzzleId>?)"],
+        "forbid": ["TEMP B-TREE"],
+    },
+    {
+        "name": "server_band_seek",
+        "query": _seek(band=lambda rng: rng.choice(create_short_db.BANDS)[0]),
+        "expect_any": ["USING INDEX idx_puzzles_id (PuzzleId>?)"],
+        "forbid": ["TEMP B-TREE"],
+    },
+    {
+        "name": "server_theme_seek",
+        "query": _seek(theme="sacrifice"),
+        "expect_any": ["USING INDEX idx_puzzles_id (PuzzleId>?)"],
+        "forbid": ["TEMP B-TREE"],
+    },
+    {
+        "name": "server_favorites",
+        "query": _listing(server.FAVORITES_QUERY, "uf", 10),
+        "expect_any": ["idx_favorites_recent (user_id=? AND (timestamp,puzzle_id)<(?,?))"],
+        "forbid": ["TEMP B-TREE"],
+    },
+    {
+        "name": "server_history_page",
+        "query": _listing(server.HISTORY_QUERY, "up", 50),
+        "expect_any": ["idx_progress_recent (user_id=? AND (timestamp,puzzle_id)<(?,?))"],
+        "forbid": ["SCAN", "TEMP B-TREE"],
+    },
+    {
+        # Rebuilding a solved set (first use, or after the puzzle DB was renumbered)
+        "name": "server_solved_set_rebuild",
+        "sql": '''SELECT p.ordinal FROM user_progress up JOIN puzzles p ON p.PuzzleId = up.puzzle_id
+                  WHERE up.user_id = ? AND up.status IN ('solved', 'win')
+                  UNION ALL
+                  SELECT p.ordinal FROM review_queue rq JOIN puzzles p ON p.PuzzleId = rq.puzzle_id
+                  WHERE rq.user_id = ?''',
+        "params": lambda rng: (USER, USER),
+        "expect_any": ["SEARCH up USING PRIMARY KEY (user_id=?)"],
+        "forbid": ["SCAN p"],
+    },
+    {
+        # Adaptive /get_puzzles: rows for the ordinals rating_sampler drew
+        "name": "server_sampler_fetch",
+        "sql": f"SELECT p.* FROM puzzles p WHERE p.ordinal IN ({','.join('?' * 10)})",
+        "params": lambda rng: tuple(rng.randrange(10_000) for _ in range(10)),
+        "expect_any": ["USING INDEX idx_puzzles_ordinal (ordinal=?)"],
+        "forbid": ["SCAN p"],
+    },
+    {
+        # /get_reviews and the review share of /get_puzzles (review_queue.pop_due)
+        "name": "server_reviews_due",
+        "sql": '''SELECT p.* FROM review_queue rq INDEXED BY idx_review_due
+                  JOIN puzzles p ON p.PuzzleId = rq.puzzle_id
+                  WHERE rq.user_id = ? AND rq.due_at <= ? ORDER BY rq.due_at LIMIT ?''',
+        "params": lambda rng: (USER, time.time(), 10),
+        "expect_any": ["COVERING INDEX idx_review_due (user_id=? AND due_at<?)"],
+        "forbid": ["SCAN", "TEMP B-TREE"],
+    },
+    {
+        # /sync pull page (user_sync.pull)
+        "name": "server_sync_pull",
+        "sql": '''SELECT tbl, row_key, seq FROM sync_changes INDEXED BY idx_sync_seq
+                  WHERE user_id = ? AND seq > ? AND seq <= ? ORDER BY seq LIMIT ?''',
+        "params": lambda rng: (USER, rng.randrange(1000), 1_000_000, 500),
+        "expect_any": ["COVERING INDEX idx_sync_seq (user_id=? AND seq>? AND seq<?)"],
+        "forbid": ["SCAN", "TEMP B-TREE"],
+    },
+    {
+        "name": "server_puzzle_by_id",
+        "sql": "SELECT * FROM puzzles WHERE PuzzleId = ?",
+        "params": lambda rng: (random_id(rng),),
+        "expect_any": ["SEARCH puzzles USING INDEX"],
+        "forbid": ["SCAN"],
+    },
+    {
+        "name": "server_player_stats",
+        "sql": "SELECT rating FROM player_stats WHERE user_id = ? AND mode = ?",
+        "params": lambda rng: (USER, "standard"),
+        "expect_any": ["SEARCH player_stats"],
+        "forbid": ["SCAN"],
+    },
+    {
+        "name": "mobile_adaptive_random",
+        "sql": '''SELECT * FROM puzzles WHERE Rating BETWEEN ? AND ?
+                  AND PuzzleId NOT IN (SELECT puzzle_id FROM puzzles_games WHERE status = 'win')
+                  ORDER BY RANDOM() LIMIT 1''',
+        "params": lambda rng: _adaptive(rng),
+        "expect_any": ["idx_puzzles_rating (Rating>? AND Rating<?)"],
+        "forbid": [],
+    },
+    {
+        "name": "mobile_theme_random",
+        "sql": '''SELECT * FROM puzzles WHERE Rating BETWEEN ? AND ?
+                  AND PuzzleId NOT IN (SELECT puzzle_id FROM puzzles_games WHERE status = 'win')
+                  AND has_sacrifice = 1 ORDER BY RANDOM() LIMIT 1''',
+        "params": lambda rng: _adaptive(rng),
+        "expect_any": ["idx_theme_sacrifice", "idx_puzzles_rating"],
+        "forbid": ["SCAN puzzles"],
+    },
+    {
+        "name": "mobile_favorites_random",
+        "sql": '''SELECT * FROM puzzles JOIN user_favorites ON puzzles.PuzzleId = user_favorites.puzzle_id
+                  WHERE user_favorites.mode IN ('standard', 'blindfold') ORDER BY RANDOM() LIMIT 1''',
+        "params": lambda rng: (),
+        "expect_any": ["user_favorites"],
+        "forbid": ["SCAN puzzles"],
+    },
+    {
+        "name": "mobile_deep_move_count",
+        "sql": '''SELECT * FROM puzzles WHERE Rating BETWEEN ? AND ? AND move_count = ?
+                  AND PuzzleId NOT IN (SELECT puzzle_id FROM deep_games WHERE status = 'win')
+                  ORDER BY RANDOM() LIMIT 1''',
+        "params": lambda rng: (*_adaptive(rng), rng.randint(1, 3)),
+        "expect_any": ["idx_move_count", "idx_puzzles_rating"],
+        "forbid": ["SCAN puzzles"],
+    },
+    {
+        "name": "mobile_counts_by_band",
+        "sql": "SELECT rating_band, COUNT(*) as count FROM puzzles GROUP BY rating_band",
+        "params": lambda rng: (),
+        "expect_any": ["COVERING INDEX idx_rating_band"],
+        "forbid": [],
+    },
+    {
+        # Same counts from the materialized table (create_short_db.build_catalog_stats)
+        "name": "catalog_stats_by_band",
+        "sql": "SELECT rating_band, SUM(puzzles) FROM catalog_stats WHERE theme = 'all' GROUP BY rating_band",
+        "params": lambda rng: (),
+        "expect_any": ["catalog_stats"],
+        "forbid": ["SCAN puzzles"],
+    },
+]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def check_plan(plan, shape):
+    problems = []
+    if shape["expect_any"] and not any(e in d for d in plan for e in shape["expect_any"]):
+        problems.append(f"expected one of {shape['expect_any']}")
+    for f in shape["forbid"]:
+        if any(f in d for d in plan):
+            problems.append(f"forbidden '{f}'")
+    return problems
+
+def run_shapes(db_path, iterations, seed=SEED):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row  # app.py's keyset pagers read columns by name
+    results = {}
+    try:
+        # Tables added since an existing bench DB was built
+        conn.executescript(user_store.SCHEMA)
+        if not solved_sets.SolvedSets().has_ordinals(conn):
+            create_short_db.assign_ordinals(conn)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_stats'").fetchone():
+            create_short_db.build_catalog_stats(conn)
+        # The seek shapes filter with is_solved(), bound to the user's solved set as in the server
+        solved_sets.bind(conn, solved_sets.SolvedSets().get(conn, USER))
+        conn.commit()
+        for shape in SHAPES:
+            query = shape.get("query") or (lambda rng: (shape["sql"], shape["params"](rng)))
+            sql, params = query(rng)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            problems = check_plan(plan, shape)
+
+            times = []
+            rows = 0
+            for _ in range(iterations):
+                sql, params = query(rng)
+                start = time.perf_counter()
+                rows += len(conn.execute(sql, params).fetchall())
+                times.append(time.perf_counter() - start)
+
+            results[shape["name"]] = {
+                "plan": plan,
+                "plan_ok": not problems,
+                "problems": problems,
+                "avg_rows": rows / iterations,
+                "p50_ms": percentile(times, 50) * 1000,
+                "p95_ms": percentile(times, 95) * 1000,
+                "p99_ms": percentile(times, 99) * 1000,
+                "max_ms": max(times) * 1000,
+            }
+    finally:
+        conn.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Puzzle DB query-plan / latency benchmark")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Synthetic puzzles (e.g. 100000-5000000)")
+    parser.add_argument("--db", default=None, help="Synthetic DB path (default: bench_puzzles_<rows>.db)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the synthetic DB even if it exists")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare p95 against")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(SCRIPT_DIR, f"bench_puzzles_{args.rows}.db")
+    if args.rebuild or not os.path.exists(db_path):
+        build_db(db_path, args.rows)
+
+    results = run_shapes(db_path, args.iterations)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["shapes"]
+
+    failures = 0
+    print(f"\n{'Shape':<26} | {'Plan':<4} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'vs base':>8}")
+    print("-" * 78)
+    for name, r in results.items():
+        delta = ""
+        if name in baseline:
+            ratio = r["p95_ms"] / baseline[name]["p95_ms"] if baseline[name]["p95_ms"] else 1.0
+            delta = f"{ratio:.2f}x"
+            if ratio > REGRESSION_FACTOR and r["p95_ms"] - baseline[name]["p95_ms"] > REGRESSION_MIN_MS:
+                delta += " !"
+                failures += 1
+        print(f"{name:<26} | {'ok' if r['plan_ok'] else 'FAIL':<4} | {r['p50_ms']:>8.3f} | "
+              f"{r['p95_ms']:>8.3f} | {r['p99_ms']:>8.3f} | {delta:>8}")
+        if not r["plan_ok"]:
+            failures += 1
+            print(f"    {'; '.join(r['problems'])}")
+            for line in r["plan"]:
+                print(f"      {line}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": args.rows, "iterations": args.iterations, "sqlite": sqlite3.sqlite_version,
+                       "shapes": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+    if failures:
+        print(f"\n{failures} plan failure(s)/regression(s).")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+
+import chess
+import chess.pgn
+import chess.engine
+
+import good_or_bad_sac
+
+# ==============================================================================
+# Benchmarks the sacrifice analyzer's own overhead against the deterministic
+# fake engine (fake_uci_engine.py), so results don't depend on Stockfish speed.
+# Runs on CPU-only Linux with no external binaries.
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_ENGINE = os.path.join(SCRIPT_DIR, "fake_uci_engine.py")
+FIXTURE_PGN = os.path.join(SCRIPT_DIR, "bench_fixture.pgn")
+
+FIXTURE_GAMES = 40
+FIXTURE_SEED = 1234
+FIXTURE_MAX_PLY = 80
+WORKER_COUNTS = [1, 2, 4]
+
+def fake_engine_command(latency_ms):
+    return [sys.executable, FAKE_ENGINE, "--latency-ms", str(latency_ms)]
+
+def make_fixture_pgn(path, games=FIXTURE_GAMES, seed=FIXTURE_SEED):
+    """Writes reproducible random games, biased towards captures so pass 2 has work to do."""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(games):
+            board = chess.Board()
+            while not board.is_game_over() and board.ply() < FIXTURE_MAX_PLY:
+                legal = list(board.legal_moves)
+                captures = [m for m in legal if board.is_capture(m)]
+                pool = captures if captures and rng.random() < 0.5 else legal
+                board.push(rng.choice(pool))
+            game = chess.pgn.Game.from_board(board)
+            game.headers["Site"] = f"https://lichess.org/fixture{i:05d}"
+            print(game, file=f, end="\n\n")
+    print(f"Wrote {games} fixture games to {path}")
+
+def index_games(pgn_path):
+    """Returns the byte offset of every game so workers can seek instead of re-parsing."""
+    offsets = []
+    with open(pgn_path) as pgn:
+        while True:
+            offset = pgn.tell()
+            if not chess.pgn.skip_game(pgn):
+                break
+            offsets.append(offset)
+    return offsets
+
+class TimedEngine:
+    """Wraps a SimpleEngine and accumulates wall time spent waiting on analyse()."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.seconds = 0.0
+        self.calls = 0
+
+    def analyse(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.engine.analyse(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+def bench_phases(pgn_path, latency_ms):
+    """Single process run: games/s plus time per phase (parse, pass1, pass2, engine wait)."""
+    engine = TimedEngine(chess.engine.SimpleEngine.popen_uci(fake_engine_command(latency_ms)))
+    timings = {"parse": 0.0}
+    games = 0
+    found = 0
+    start = time.perf_counter()
+    try:
+        with open(pgn_path) as pgn:
+            while True:
+                t0 = time.perf_counter()
+                game = chess.pgn.read_game(pgn)
+                timings["parse"] += time.perf_counter() - t0
+                if not game:
+                    break
+                found += len(good_or_bad_sac.analyze_game(game, engine, 0, float("inf"), timings))
+                games += 1
+    finally:
+        engine.engine.quit()
+    elapsed = time.perf_counter() - start
+
+    analyzer = timings["pass1"] + timings["pass2"] - engine.seconds
+    return {
+        "games": games,
+        "sacrifices": found,
+        "elapsed_s": elapsed,
+        "games_per_s": games / elapsed,
+        "engine_calls": engine.calls,
+        "phase_s": {
+            "parse": timings["parse"],
+            "pass1": timings["pass1"],
+            "pass2": timings["pass2"],
+            "engine_wait": engine.seconds,
+            "analyzer_overhead": analyzer,
+        },
+    }
+
+# --- Worker pool (one engine per process) ---
+_worker_engine = None
+_worker_pgn_path = None
+
+def _init_worker(pgn_path, latency_ms):
+    global _worker_engine, _worker_pgn_path
+    good_or_bad_sac.DEBUG = None
+    _worker_pgn_path = pgn_path
+    _worker_engine = chess.engine.SimpleEngine.popen_uci(fake_engine_command(latency_ms))
+
+def _analyze_offset(offset):
+    with open(_worker_pgn_path) as pgn:
+        pgn.seek(offset)
+        game = chess.pgn.read_game(pgn)
+    return len(good_or_bad_sac.analyze_game(game, _worker_engine, 0, float("inf")))
+
+def bench_scaling(pgn_path, latency_ms, worker_counts):
+    offsets = index_games(pgn_path)
+    results = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(pgn_path, latency_ms)) as pool:
+            found = sum(pool.map(_analyze_offset, offsets, chunksize=1))
+        elapsed = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "games": len(offsets),
+            "sacrifices": found,
+            "elapsed_s": elapsed,
+            "games_per_s": len(offsets) / elapsed,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Sacrifice analyzer benchmark (fake engine)")
+    parser.add_argument("--pgn", default=FIXTURE_PGN, help="Fixture PGN (generated if missing)")
+    parser.add_argument("--games", type=int, default=FIXTURE_GAMES, help="Games to generate for a new fixture")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated engine time per search")
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKER_COUNTS)
+    parser.add_argument("--output", default=None, help="Write results as JSON for run-to-run comparison")
+    args = parser.parse_args()
+
+    good_or_bad_sac.DEBUG = None
+    if not os.path.exists(args.pgn):
+        make_fixture_pgn(args.pgn, args.games)
+
+    print(f"Fixture: {args.pgn} | Engine latency: {args.latency_ms}ms")
+
+    phases = bench_phases(args.pgn, args.latency_ms)
+    print(f"\n[PHASES] {phases['games']} games, {phases['sacrifices']} sacrifices, "
+          f"{phases['engine_calls']} engine calls")
+    print(f"{'Phase':<20} | {'Seconds':>10} | {'Share':>6}")
+    print("-" * 42)
+    for name, seconds in phases["phase_s"].items():
+        print(f"{name:<20} | {seconds:>10.3f} | {seconds / phases['elapsed_s']:>6.1%}")
+    print(f"Throughput: {phases['games_per_s']:.2f} games/s")
+
+    scaling = bench_scaling(args.pgn, args.latency_ms, args.workers)
+    print(f"\n[SCALING]")
+    print(f"{'Workers':<8} | {'Games/s':>8} | {'Speedup':>7}")
+    print("-" * 30)
+    for row in scaling:
+        print(f"{row['workers']:<8} | {row['games_per_s']:>8.2f} | {row['games_per_s'] / scaling[0]['games_per_s']:>6.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "phases": phases, "scaling": scaling}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+import bench_puzzle_queries
+
+# ==============================================================================
+# Solved-puzzle exclusion benchmark: LEFT JOIN user_progress (the previous
+# /get_puzzles query) vs the is_solved() bitmap filter (solved_sets.py), for
+# growing histories. History is taken from the user's adaptive rating window,
+# the worst case for both: most candidate rows near the player are solved.
+# Also reports the persisted bitmap size per history.
+#
+#   python bench_solved_sets.py --db bench_puzzles_1000000.db --histories 0 1000 10000 100000
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, BASE_DIR)
+
+import app as server  # noqa: E402
+import solved_sets  # noqa: E402
+
+HISTORIES = [0, 1_000, 10_000, 100_000]
+REQUESTS = 300
+COUNT = 10
+USER_RATING = 1500
+USER = "bench"
+
+LEGACY_QUERY = '''
+    SELECT p.* FROM puzzles p INDEXED BY idx_puzzles_id
+    LEFT JOIN u.user_progress up ON up.user_id = ? AND p.PuzzleId = up.puzzle_id AND up.status = 'win'
+    WHERE up.puzzle_id IS NULL AND p.Rating BETWEEN ? AND ?
+    AND p.PuzzleId >= ? ORDER BY p.PuzzleId LIMIT ?
+'''
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+
+def fill_history(conn, size):
+    """Solves `size` puzzles, nearest the user's rating first."""
+    conn.execute("DELETE FROM u.user_progress")
+    ids = conn.execute("SELECT PuzzleId, ordinal FROM puzzles ORDER BY abs(Rating - ?) LIMIT ?",
+                       (USER_RATING, size)).fetchall()
+    conn.executemany("INSERT INTO u.user_progress (user_id, puzzle_id, status) VALUES (?, ?, 'win')",
+                     [(USER, pid) for pid, _ in ids])
+    conn.commit()
+    return solved_sets.SolvedBitmap(ordinal for _, ordinal in ids)
+
+def time_requests(fn, requests):
+    times = []
+    for _ in range(requests):
+        start_id = server.random_puzzle_id()
+        start = time.perf_counter()
+        rows = fn(start_id)
+        times.append(time.perf_counter() - start)
+        assert len(rows) <= COUNT
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description="Solved-set exclusion benchmark")
+    parser.add_argument("--db", default=None, help="Puzzle DB with ordinals (default: build a synthetic one)")
+    parser.add_argument("--rows", type=int, default=bench_puzzle_queries.DEFAULT_ROWS)
+    parser.add_argument("--histories", type=int, nargs="+", default=HISTORIES)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(SCRIPT_DIR, f"bench_puzzles_{args.rows}.db")
+    if not os.path.exists(db_path):
+        bench_puzzle_queries.build_db(db_path, args.rows)
+
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_meta'").fetchone():
+        print(f"{db_path} has no ordinals: run optimize_db.py (or --rebuild bench_puzzle_queries.py)")
+        sys.exit(1)
+    conn.execute("ATTACH DATABASE ':memory:' AS u")
+    conn.execute('''CREATE TABLE u.user_progress (user_id TEXT, puzzle_id TEXT, status TEXT,
+                    PRIMARY KEY (user_id, puzzle_id)) WITHOUT ROWID''')
+    query, params = server.build_puzzle_filter(USER_RATING)
+    fetch = lambda q, p: conn.execute(q, p).fetchall()
+
+    results = []
+    for size in args.histories:
+        bitmap = fill_history(conn, size)
+        solved_sets.bind(conn, bitmap)
+        legacy = time_requests(lambda start_id: conn.execute(
+            LEGACY_QUERY, (USER, USER_RATING - 150, USER_RATING + 150, start_id, COUNT)).fetchall(),
+            args.requests)
+        filtered = time_requests(lambda start_id: list(server.stream_puzzle_rows(
+            fetch, query, params, start_id, COUNT)), args.requests)
+        start = time.perf_counter()
+        blob = bitmap.to_bytes()
+        solved_sets.SolvedBitmap.from_bytes(blob)
+        roundtrip_ms = (time.perf_counter() - start) * 1000
+        results.append({
+            "history": len(bitmap),
+            "join_p50_ms": percentile(legacy, 50), "join_p95_ms": percentile(legacy, 95),
+            "bitmap_p50_ms": percentile(filtered, 50), "bitmap_p95_ms": percentile(filtered, 95),
+            "blob_bytes": len(blob), "blob_roundtrip_ms": roundtrip_ms,
+        })
+    conn.close()
+
+    print(f"\n{'History':>8} | {'JOIN p50':>9} | {'JOIN p95':>9} | {'Bitmap p50':>10} | {'Bitmap p95':>10} | "
+          f"{'Blob KB':>8} | {'Load ms':>7}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['history']:>8,} | {r['join_p50_ms']:>9.3f} | {r['join_p95_ms']:>9.3f} | {r['bitmap_p50_ms']:>10.3f} | "
+              f"{r['bitmap_p95_ms']:>10.3f} | {r['blob_bytes'] / 1024:>8.1f} | {r['blob_roundtrip_ms']:>7.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": db_path, "count": COUNT, "results": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+# ==============================================================================
+# Startup benchmark: time-to-first-request of a freshly started server, with the
+# background warmup (app.startup, warmup.py) on and off (NEUROCHESS_WARMUP=0).
+# Each run starts a new process on an empty user-data dir and measures:
+#   ready      spawn -> first answer from /ready
+#   first      spawn -> first /get_puzzles response, and that request's latency
+#   warm       spawn -> /ready?warm=1 answering 200 (warmup runs only)
+#   warm req   latency of a /get_puzzles for a new user once warm
+# plus the duration of every warmup step as reported by /ready.
+#
+#   python bench_startup.py --db bench_puzzles_1000000.db --runs 5
+#   python bench_startup.py --db ... --server prefork --drop-caches   (Linux, root)
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+RUNS = 3
+PORT = 5097
+TIMEOUT_S = 300
+POLL_S = 0.01
+
+# Same startup as app.py's __main__, with the DB and port from the command line
+APP_BOOTSTRAP = '''
+import sys
+sys.path.insert(0, {base!r})
+import app
+app.DB_PATH = {db!r}
+app.USER_DATA_DIR = {user_data!r}
+app.init_user_db()
+if app.WARMUP:
+    app.startup.start()
+app.app.run(port={port}, threaded=True)
+'''
+
+def server_command(args, user_data):
+    if args.server == "prefork":
+        return [sys.executable, os.path.join(BASE_DIR, "prefork.py"), "--db", args.db, "--user-data", user_data,
+                "--port", str(args.port), "--workers", str(args.workers)]
+    return [sys.executable, "-c", APP_BOOTSTRAP.format(base=BASE_DIR, db=args.db, user_data=user_data, port=args.port)]
+
+def get(port, path):
+    """(status, parsed JSON body), or (None, None) while nothing listens."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=30) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null")
+    except (urllib.error.URLError, ConnectionError):
+        return None, None
+
+def wait_for(port, path, until, start):
+    while time.perf_counter() - start < TIMEOUT_S:
+        status, body = get(port, path)
+        if until(status):
+            return time.perf_counter() - start, body
+        time.sleep(POLL_S)
+    raise RuntimeError(f"{path} not answered within {TIMEOUT_S}s")
+
+def timed_puzzles(port, user):
+    start = time.perf_counter()
+    status, body = get(port, f"/get_puzzles?count=10&user={user}")
+    if status != 200 or not body.get("puzzles"):
+        raise RuntimeError(f"/get_puzzles failed: {status}")
+    return (time.perf_counter() - start) * 1000
+
+def drop_caches():
+    subprocess.run(["sync"], check=False)
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3\n")
+
+def measure(args, warmup):
+    user_data = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, NEUROCHESS_WARMUP="1" if warmup else "0")
+    if args.drop_caches:
+        drop_caches()
+    start = time.perf_counter()
+    proc = subprocess.Popen(server_command(args, user_data), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_s, _ = wait_for(args.port, "/ready", lambda status: status is not None, start)
+        first_ms = timed_puzzles(args.port, "bench_first")
+        first_s = time.perf_counter() - start
+        result = {"ready_s": ready_s, "first_s": first_s, "first_ms": first_ms, "warm_s": None, "steps": {}}
+        if warmup:
+            result["warm_s"], body = wait_for(args.port, "/ready?warm=1", lambda status: status == 200, start)
+            result["steps"] = {s["step"]: s.get("seconds") for s in body["steps"]}
+        result["warm_req_ms"] = timed_puzzles(args.port, "bench_warm")
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        shutil.rmtree(user_data, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Server time-to-first-request benchmark")
+    parser.add_argument("--db", required=True, help="Puzzle DB with ordinals (bench_puzzle_queries.py builds one)")
+    parser.add_argument("--server", choices=["app", "prefork"], default="app")
+    parser.add_argument("--workers", type=int, default=2, help="prefork.py workers")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--drop-caches", action="store_true", help="Drop the OS page cache before each run (root)")
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)
+
+    results = {}
+    for warmup in (False, True):
+        label = "warmup" if warmup else "lazy"
+        print(f"Measuring {args.server}, {label}: {args.runs} run(s)...")
+        results[label] = [measure(args, warmup) for _ in range(args.runs)]
+
+    def median(runs, key):
+        values = [r[key] for r in runs if r[key] is not None]
+        return statistics.median(values) if values else float("nan")
+
+    print(f"\n{'Mode':<7} | {'Ready s':>8} | {'First s':>8} | {'First ms':>9} | {'Warm s':>7} | {'Warm req ms':>11}")
+    print("-" * 66)
+    for label, runs in results.items():
+        print(f"{label:<7} | {median(runs, 'ready_s'):>8.3f} | {median(runs, 'first_s'):>8.3f} | "
+              f"{median(runs, 'first_ms'):>9.1f} | {median(runs, 'warm_s'):>7.3f} | {median(runs, 'warm_req_ms'):>11.1f}")
+
+    steps = results["warmup"][0]["steps"]
+    if steps:
+        print(f"\n{'Warmup step':<18} | {'Median s':>8}")
+        print("-" * 29)
+        for step in steps:
+            values = [r["steps"][step] for r in results["warmup"] if r["steps"].get(step) is not None]
+            print(f"{step:<18} | {statistics.median(values) if values else float('nan'):>8.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": args.db, "server": args.server, "runs": args.runs, "results": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
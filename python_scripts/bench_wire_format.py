@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+
+import bench_puzzle_queries
+
+# ==============================================================================
+# Payload-size and encode-time benchmark for /get_puzzles wire formats.
+# Encodes real batches of puzzle rows as:
+#   legacy   - per-puzzle dict + json.dumps (the old jsonify path)
+#   cold     - puzzle_cache fragments, cache empty (serialize every row)
+#   warm     - puzzle_cache fragments, all rows cached (concatenate only)
+#   columnar - wire_format.encode_columnar
+# and reports body size raw / gzip / brotli (if installed) and encode + compress time.
+#
+#   python bench_wire_format.py --db A:\...\lichess_mobile_puzzles.sqlite
+#   python bench_wire_format.py --rows 200000 --output wire.json
+#
+# The synthetic DB repeats one FEN, so its compression ratios are optimistic;
+# use --db with a real puzzle DB for representative sizes.
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+
+import puzzle_cache  # noqa: E402
+import wire_format  # noqa: E402
+
+COUNTS = [10, 50, 200, 1000]
+ITERATIONS = 50
+USER_RATING = 1500
+
+def sample_batches(db_path, count, iterations, seed):
+    """Contiguous PuzzleId runs from random seek points, like the server's random seek."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    batches = []
+    try:
+        while len(batches) < iterations:
+            rand_id = bench_puzzle_queries.random_id(rng)
+            rows = conn.execute("SELECT * FROM puzzles WHERE PuzzleId >= ? ORDER BY PuzzleId LIMIT ?",
+                                (rand_id, count)).fetchall()
+            if len(rows) == count:
+                batches.append(rows)
+    finally:
+        conn.close()
+    return batches
+
+def encode_legacy(rows):
+    puzzles = []
+    for row in rows:
+        data = dict(row)
+        puzzles.append({
+            "PuzzleId": data.get('PuzzleId', 'Unknown'),
+            "FEN": data.get('FEN'),
+            "Moves": data.get('Moves', "").split(),
+            "Rating": data.get('Rating', 0),
+            "Band": data.get('rating_band', 'Uncategorized'),
+            "Themes": data.get('Themes', '')
+        })
+    return json.dumps({"user_rating": USER_RATING, "puzzles": puzzles}).encode()
+
+def encode_fragments(rows):
+    fragments = puzzle_cache.cache.fragments_for_rows(rows)
+    return b'{"user_rating":%d,"puzzles":[%s]}' % (USER_RATING, b",".join(fragments))
+
+def encode_columnar(rows):
+    return puzzle_cache.dumps(wire_format.encode_columnar(USER_RATING, rows))
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+def run(db_path, counts, iterations, seed):
+    encodings = ["identity", "gzip"] + (["br"] if wire_format.brotli is not None else [])
+    results = {}
+    for count in counts:
+        batches = sample_batches(db_path, count, iterations, seed + count)
+        formats = {
+            "legacy": (encode_legacy, None),
+            "cold": (encode_fragments, "clear"),
+            "warm": (encode_fragments, "warm"),
+            "columnar": (encode_columnar, None),
+        }
+        for name, (encode, cache_state) in formats.items():
+            encode_times, sizes = [], {e: [] for e in encodings}
+            compress_times = {e: [] for e in encodings if e != "identity"}
+            for rows in batches:
+                if cache_state == "clear":
+                    puzzle_cache.cache.clear()
+                elif cache_state == "warm":
+                    encode(rows)
+                start = time.perf_counter()
+                body = encode(rows)
+                encode_times.append(time.perf_counter() - start)
+                sizes["identity"].append(len(body))
+                for e in compress_times:
+                    start = time.perf_counter()
+                    compressed = wire_format.compress(body, e)
+                    compress_times[e].append(time.perf_counter() - start)
+                    sizes[e].append(len(compressed))
+            results[f"{name}/{count}"] = {
+                "format": name,
+                "count": count,
+                "encode_ms": median(encode_times) * 1000,
+                "compress_ms": {e: median(t) * 1000 for e, t in compress_times.items()},
+                "bytes": {e: int(sum(s) / len(s)) for e, s in sizes.items()},
+            }
+    return results, encodings
+
+def main():
+    parser = argparse.ArgumentParser(description="/get_puzzles wire format benchmark")
+    parser.add_argument("--db", default=None, help="Puzzle DB (default: synthetic bench_puzzles_<rows>.db)")
+    parser.add_argument("--rows", type=int, default=bench_puzzle_queries.DEFAULT_ROWS)
+    parser.add_argument("--counts", type=int, nargs="+", default=COUNTS)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write results JSON")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(SCRIPT_DIR, f"bench_puzzles_{args.rows}.db")
+    if not os.path.exists(db_path):
+        if args.db:
+            print(f"DB not found: {db_path}")
+            sys.exit(1)
+        bench_puzzle_queries.build_db(db_path, args.rows)
+
+    print(f"DB: {db_path} | encoder: {'orjson' if puzzle_cache.orjson else 'json'} | "
+          f"brotli: {'yes' if wire_format.brotli else 'not installed'}")
+    results, encodings = run(db_path, args.counts, args.iterations, args.seed)
+
+    size_cols = " | ".join(f"{e + ' B':>10}" for e in encodings)
+    comp_cols = " | ".join(f"{e + ' ms':>8}" for e in encodings if e != "identity")
+    print(f"\n{'Format':<9} | {'Count':>5} | {'encode ms':>9} | {comp_cols} | {size_cols}")
+    print("-" * (36 + 11 * len(encodings) + 13 * len(encodings)))
+    for r in results.values():
+        comp = " | ".join(f"{r['compress_ms'][e]:>8.3f}" for e in encodings if e != "identity")
+        size = " | ".join(f"{r['bytes'][e]:>10,}" for e in encodings)
+        print(f"{r['format']:<9} | {r['count']:>5} | {r['encode_ms']:>9.3f} | {comp} | {size}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"db": db_path, "iterations": args.iterations, "results": results}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+
+# ==============================================================================
+# Self-check for the server's SQLite instrumentation (metrics.py,
+# query_profiler.py): every way app code runs a statement - conn.execute(),
+# executemany(), executescript() and cursor().execute() - must be counted in
+# /metrics and captured by the slow-query profiler. Exits non-zero on failure.
+#
+#   python check_sql_profiling.py
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, BASE_DIR)
+
+import metrics  # noqa: E402
+import query_profiler  # noqa: E402
+
+def statement_count(label):
+    prefix = f'neurochess_sql_statements_total{{statement="{label}"}} '
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0
+
+def check():
+    query_profiler.SLOW_QUERY_MS = 0  # Capture every statement
+    query_profiler.clear()
+    conn = query_profiler.connect(":memory:", factory=query_profiler.ProfiledConnection)
+
+    failures = []
+    def expect(name, ok):
+        print(f"{name:<40} {'ok' if ok else 'FAILED'}")
+        if not ok:
+            failures.append(name)
+
+    expect("conn.execute() cursor type", isinstance(conn.execute("SELECT 1"), query_profiler.ProfiledCursor))
+
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.executescript("CREATE INDEX idx_t_x ON t(x);")
+    rows = conn.execute("SELECT x FROM t WHERE x > ?", (4,)).fetchall()
+    conn.cursor().execute("SELECT count(*) FROM t").fetchone()
+
+    expect("conn.execute() result", len(rows) == 5)
+    for label in ("CREATE t", "INSERT t", "SCRIPT", "SELECT t"):
+        expect(f"metrics: {label}", statement_count(label) >= 1)
+
+    captured = [entry["sql"] for entry in query_profiler.entries()]
+    expanded = [entry["expanded_sql"] for entry in query_profiler.entries()]
+    expect("profiler: conn.execute()", "SELECT x FROM t WHERE x > 4" in expanded)
+    expect("profiler: conn.executemany()", any(sql.startswith("INSERT INTO t") for sql in captured))
+    expect("profiler: cursor().execute()", "SELECT count(*) FROM t" in captured)
+    conn.close()
+
+    if not metrics.ENABLED:
+        print("Note: NEUROCHESS_METRICS=0, metrics.render() is still exercised directly")
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll checks passed")
+
+if __name__ == "__main__":
+    check()
@@ -2,6 +2,8 @@ import sqlite3
 import os
 import argparse
 
+from create_short_db import assign_ordinals, build_catalog_stats
+
 # Paths
 # Note: Assuming script is run from python_scripts/, so DB is in parent root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,18 +53,18 @@ def get_stats():
         print(f"Error: Subset database not found at {DEST_DB}")
         return
 
-    query = """
-    SELECT rating_band, COUNT(*) 
-    FROM puzzles 
-    GROUP BY rating_band 
-    ORDER BY MIN(Rating) ASC;
-    """
-    
     with sqlite3.connect(DEST_DB) as conn:
         cursor = conn.cursor()
-        print(f"Generating stats from pre-computed column in: {DEST_DB}\n")
-        cursor.execute(query)
-        results = cursor.fetchall()
+        if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_stats'").fetchone():
+            print("Building catalog_stats (first run on this DB)...")
+            build_catalog_stats(conn)
+        print(f"Generating stats from catalog_stats in: {DEST_DB}\n")
+        # Band labels sort in rating order
+        results = cursor.execute("""
+            SELECT rating_band, SUM(puzzles) FROM catalog_stats
+            WHERE theme = 'all' GROUP BY rating_band ORDER BY rating_band
+        """).fetchall()
+        theme_counts = dict(cursor.execute("SELECT theme, SUM(puzzles) FROM catalog_stats GROUP BY theme"))
     
     print(f"{'Rating Band':<15} | {'Count':<10}")
     print("-" * 30)
@@ -72,9 +74,7 @@ def get_stats():
     print("\nTheme Stats (True Count):")
     print("-" * 30)
     for theme in THEMES_TO_INDEX:
-        col_name = f"has_{theme}"
-        cursor.execute(f"SELECT COUNT(*) FROM puzzles WHERE {col_name} = 1")
-        count = cursor.fetchone()[0]
+        count = theme_counts.get(theme, 0)
         print(f"{theme:<20} | {count:<10,}")
 
 def create_long_puzzles_db():
@@ -191,6 +191,7 @@ def create_long_puzzles_db():
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_move_count ON puzzles(move_count);")
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_rating ON puzzles(Rating);")
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_id ON puzzles(PuzzleId);")
+        dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_nbplays ON puzzles(NbPlays);")  # Server warmup/preload: most played first
         
         print("Creating Partial Theme Indexes (Super Fast!)...")
         for theme in THEMES_TO_INDEX:
@@ -200,6 +201,12 @@ def create_long_puzzles_db():
             # We include Rating in the index for faster range queries: "Give me endgame puzzles rated 1200-1400"
             dest_cursor.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON puzzles(Rating) WHERE {col_name} = 1;")
 
+        print("Assigning Puzzle Ordinals...")
+        assign_ordinals(dest_conn)
+
+        print("Materializing Catalog Stats...")
+        build_catalog_stats(dest_conn)
+
         # 5. Create User Tables
         print("Creating User Tables (Favorites & Progress)...")
         dest_cursor.execute('''
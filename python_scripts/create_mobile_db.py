@@ -3,6 +3,8 @@ import os
 import argparse
 import random
 
+from create_short_db import assign_ordinals, build_catalog_stats
+
 # Paths
 # Script is in python_scripts/, DBs are in root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -299,7 +301,20 @@ def create_mobile_db():
                 dest_cursor_extra.executemany(f"INSERT INTO puzzles VALUES ({placeholders})", extra_rows)
                 total_extra += len(extra_rows)
 
-        # 3. Optimize (Vacuum)
+        # 3. Ordinals for the server's solved sets (this DB is its DB_PATH). The extra
+        # DB continues the numbering: the app merges it with INSERT ... SELECT *, so
+        # both need the column, and the ranges must not collide
+        dest_conn_base.commit()
+        dest_conn_extra.commit()
+        base_count = assign_ordinals(dest_conn_base)
+        assign_ordinals(dest_conn_extra, first=base_count)
+
+        # 4. Catalog counts for the band picker / DLC status; the triggers keep
+        # them current when the app merges DLC puzzles into the base DB
+        build_catalog_stats(dest_conn_base)
+        build_catalog_stats(dest_conn_base, table="puzzles_long", stats_table="catalog_stats_long")
+
+        # 5. Optimize (Vacuum)
         for conn in [dest_conn_base, dest_conn_extra]:
             conn.commit()
             conn.execute("VACUUM")
@@ -0,0 +1,199 @@
+import sqlite3
+import os
+import json
+import time
+import argparse
+
+import create_short_db
+import create_long_db
+
+# Paths
+# Script is in python_scripts/, DBs are in root
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAC_RESULTS = os.path.join(BASE_DIR, "sac_analysis.ndjson")  # Output of good_or_bad_sac.py
+
+ACCEPTED_VERDICTS = {"GOOD", "SPECULATIVE"}
+MAX_SOLUTION_PLY = 9     # Engine PV is cut to at most this many plies (always ending on the solver's move)
+BATCH_SIZE = 10000
+
+# Uncalibrated puzzles: high deviation until real attempts come in
+SAC_RATING_DEVIATION = 500
+MIN_RATING = 600
+MAX_RATING = 2800
+
+COLUMNS = [
+    "PuzzleId", "FEN", "Moves", "Rating", "RatingDeviation", "Popularity", "NbPlays",
+    "Themes", "GameUrl", "OpeningTags", "rating_band", "move_count"
+] + [f"has_{theme}" for theme in create_short_db.THEMES_TO_INDEX]
+
+def estimate_rating(details, solution_ply):
+    """
+    Rough difficulty estimate from the cached analysis (no engine calls).
+    Longer lines, bigger material investments and non-top engine moves are harder to find.
+    """
+    solver_moves = (solution_ply + 1) // 2
+    rating = 1200
+    rating += 150 * (solver_moves - 1)
+    rating += details.get("sac", 0) // 4
+    if details.get("rank", 1) != 1:
+        rating += 200  # Speculative: engine preferred something else
+    return max(MIN_RATING, min(MAX_RATING, rating))
+
+def make_puzzle_id(game_url, ply):
+    """Deterministic ID so re-running the stage replaces rows instead of duplicating them."""
+    game_id = game_url.rstrip("/").split("/")[-1]
+    return f"sac{game_id}{ply}"
+
+def build_puzzle_row(sac):
+    """
+    Turns one miner result into a row matching the short/long puzzles schema, or None if unusable.
+    Follows the Lichess layout: FEN is the position before the opponent's last move,
+    Moves[0] is that setup move and Moves[1] is the sacrifice.
+    """
+    if sac.get("verdict") not in ACCEPTED_VERDICTS:
+        return None
+    pv = sac.get("pv")
+    if not pv or not sac.get("fen") or not sac.get("setup_move"):
+        return None  # Mined before positions were cached
+    if pv[0] != sac["move"]:
+        return None
+
+    # Solution must end on the solver's move: odd number of plies
+    solution = pv[:MAX_SOLUTION_PLY]
+    if len(solution) % 2 == 0:
+        solution = solution[:-1]
+
+    moves = [sac["setup_move"]] + solution
+    ply_count = len(moves)
+    rating = estimate_rating(sac.get("details", {}), len(solution))
+
+    theme_flags = tuple(1 if theme == "sacrifice" else 0 for theme in create_short_db.THEMES_TO_INDEX)
+
+    return (
+        make_puzzle_id(sac["game_url"], sac["ply"]),
+        sac["fen"],
+        " ".join(moves),
+        rating,
+        SAC_RATING_DEVIATION,
+        0,  # Popularity
+        0,  # NbPlays
+        "sacrifice",
+        f"{sac['game_url']}#{sac['ply']}",
+        "",
+        create_short_db.get_band_label(rating),
+        (ply_count + 1) // 2,
+    ) + theme_flags
+
+def ensure_schema(cursor):
+    """Creates the enriched puzzles table (if missing) and the same indexes as create_short_db/create_long_db."""
+    extra_cols_def = "".join(f", has_{theme} INTEGER DEFAULT 0" for theme in create_short_db.THEMES_TO_INDEX)
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS puzzles (
+            PuzzleId TEXT PRIMARY KEY,
+            FEN TEXT,
+            Moves TEXT,
+            Rating INTEGER,
+            RatingDeviation INTEGER,
+            Popularity INTEGER,
+            NbPlays INTEGER,
+            Themes TEXT,
+            GameUrl TEXT,
+            OpeningTags TEXT,
+            rating_band TEXT,
+            move_count INTEGER{extra_cols_def}
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rating_band ON puzzles(rating_band);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_move_count ON puzzles(move_count);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_rating ON puzzles(Rating);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_id ON puzzles(PuzzleId);")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_nbplays ON puzzles(NbPlays);")
+    for theme in create_short_db.THEMES_TO_INDEX:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_theme_{theme} ON puzzles(Rating) WHERE has_{theme} = 1;")
+
+def create_sac_puzzles(results_path=SAC_RESULTS):
+    print(f"Source:    {results_path}")
+    print(f"Dest Short: {create_short_db.DEST_DB}")
+    print(f"Dest Long:  {create_long_db.DEST_DB}")
+
+    if not os.path.exists(results_path):
+        print(f"No sacrifice results at {results_path}, skipping.")
+        return
+
+    short_conn = sqlite3.connect(create_short_db.DEST_DB)
+    long_conn = sqlite3.connect(create_long_db.DEST_DB)
+
+    placeholders = ",".join(["?"] * len(COLUMNS))
+    # An upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the catalog_stats
+    # delete trigger, so re-running the stage would count replaced rows twice
+    updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS if column != "PuzzleId")
+    insert_query = f'''
+        INSERT INTO puzzles ({', '.join(COLUMNS)}) VALUES ({placeholders})
+        ON CONFLICT(PuzzleId) DO UPDATE SET {updates}
+    '''
+
+    start_time = time.time()
+    candidates = 0
+    skipped = 0
+    counts = {"short": 0, "long": 0}
+
+    try:
+        batches = {"short": [], "long": []}
+        cursors = {"short": short_conn.cursor(), "long": long_conn.cursor()}
+        for cursor in cursors.values():
+            ensure_schema(cursor)
+
+        def flush(kind):
+            if batches[kind]:
+                cursors[kind].executemany(insert_query, batches[kind])
+                counts[kind] += len(batches[kind])
+                batches[kind] = []
+
+        # Stream the NDJSON so memory stays flat regardless of how many sacrifices were mined
+        with open(results_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                candidates += 1
+                row = build_puzzle_row(json.loads(line))
+                if row is None:
+                    skipped += 1
+                    continue
+
+                ply_count = row[2].count(" ") + 1
+                if ply_count <= create_short_db.MAX_PLY:
+                    kind = "short"
+                elif ply_count >= create_long_db.MIN_PLY:
+                    kind = "long"
+                else:
+                    skipped += 1
+                    continue
+
+                batches[kind].append(row)
+                if len(batches[kind]) >= BATCH_SIZE:
+                    flush(kind)
+                    print(f"Processed {candidates:,} candidates...", end='\r')
+
+        flush("short")
+        flush("long")
+        short_conn.commit()
+        long_conn.commit()
+        # New rows have no ordinal: renumber (new ordinals_id) so the server's solved sets cover them
+        for kind, conn in (("short", short_conn), ("long", long_conn)):
+            if counts[kind]:
+                create_short_db.assign_ordinals(conn)
+    finally:
+        short_conn.close()
+        long_conn.close()
+
+    elapsed = time.time() - start_time
+    rate = candidates / elapsed * 60 if elapsed > 0 else 0
+    print(f"\nCandidates: {candidates:,} | Short: {counts['short']:,} | Long: {counts['long']:,} | Skipped: {skipped:,}")
+    print(f"Elapsed: {elapsed:.2f}s ({rate:,.0f} candidates/min)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load mined sacrifices into the NeuroChess puzzle DBs")
+    parser.add_argument("--input", default=SAC_RESULTS, help="NDJSON produced by good_or_bad_sac.py")
+    args = parser.parse_args()
+
+    create_sac_puzzles(args.input)
@@ -1,5 +1,6 @@
 import sqlite3
 import os
+import uuid
 import argparse
 
 # Paths
@@ -45,24 +46,99 @@ def get_band_label(rating):
             return label
     return "Unknown"
 
+def assign_ordinals(conn, first=0):
+    """
+    Numbers puzzles first..first+N-1 in PuzzleId order (puzzles.ordinal) for the
+    server's solved-set bitmaps, and records a new catalog_meta 'ordinals_id' so
+    bitmaps built against a previous numbering get rebuilt. Returns N.
+    """
+    cursor = conn.cursor()
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(puzzles)")]
+    if "ordinal" not in columns:
+        cursor.execute("ALTER TABLE puzzles ADD COLUMN ordinal INTEGER")
+    cursor.execute("DROP INDEX IF EXISTS idx_puzzles_ordinal")
+    cursor.execute("CREATE TEMP TABLE puzzle_ordinals (row_id INTEGER PRIMARY KEY, ordinal INTEGER)")
+    cursor.execute("""
+        INSERT INTO puzzle_ordinals (row_id, ordinal)
+        SELECT rowid, ROW_NUMBER() OVER (ORDER BY PuzzleId) - 1 + ? FROM puzzles
+    """, (first,))
+    cursor.execute("UPDATE puzzles SET ordinal = (SELECT ordinal FROM puzzle_ordinals WHERE row_id = puzzles.rowid)")
+    cursor.execute("DROP TABLE puzzle_ordinals")
+    cursor.execute("CREATE UNIQUE INDEX idx_puzzles_ordinal ON puzzles(ordinal)")
+    cursor.execute("CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+    cursor.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('ordinals_id', ?)", (uuid.uuid4().hex,))
+    conn.commit()
+    return cursor.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+def build_catalog_stats(conn, table="puzzles", stats_table="catalog_stats"):
+    """
+    Materializes puzzle counts per (rating_band, theme, move_count) into
+    stats_table - theme 'all' plus one row set per has_<theme> column - and
+    installs triggers on `table` that keep them current on later inserts,
+    deletes and updates (e.g. DLC merges), so readers never scan `table`.
+    """
+    cursor = conn.cursor()
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table})")]
+    themes = [c[len("has_"):] for c in columns if c.startswith("has_")]
+    band, moves = "COALESCE(rating_band, 'Unknown')", "COALESCE(move_count, 0)"
+
+    cursor.execute(f"DROP TABLE IF EXISTS {stats_table}")
+    cursor.execute(f"""
+        CREATE TABLE {stats_table} (
+            rating_band TEXT NOT NULL,
+            theme TEXT NOT NULL,      -- 'all' or a has_<theme> column
+            move_count INTEGER NOT NULL,
+            puzzles INTEGER NOT NULL,
+            PRIMARY KEY (rating_band, theme, move_count)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute(f"INSERT INTO {stats_table} SELECT {band}, 'all', {moves}, COUNT(*) FROM {table} GROUP BY 1, 3")
+    for theme in themes:
+        cursor.execute(f"""
+            INSERT INTO {stats_table} SELECT {band}, '{theme}', {moves}, COUNT(*)
+            FROM {table} WHERE has_{theme} = 1 GROUP BY 1, 3
+        """)
+
+    def apply(row, delta):
+        # One statement per trigger: a +/-1 for 'all' and every theme flag set on the row
+        flags = " UNION ALL ".join(["SELECT 'all' AS theme, 1 AS hit"] + [f"SELECT '{t}', {row}.has_{t} = 1" for t in themes])
+        return f"""
+            INSERT INTO {stats_table} (rating_band, theme, move_count, puzzles)
+            SELECT COALESCE({row}.rating_band, 'Unknown'), theme, COALESCE({row}.move_count, 0), {delta}
+            FROM ({flags})
+            WHERE hit
+            ON CONFLICT (rating_band, theme, move_count) DO UPDATE SET puzzles = puzzles + excluded.puzzles;
+        """
+
+    for event in ("insert", "delete", "update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {stats_table}_{event}")
+    cursor.execute(f"CREATE TRIGGER {stats_table}_insert AFTER INSERT ON {table} BEGIN {apply('NEW', 1)} END")
+    cursor.execute(f"CREATE TRIGGER {stats_table}_delete AFTER DELETE ON {table} BEGIN {apply('OLD', -1)} END")
+    watched = ", ".join(["rating_band", "move_count"] + [f"has_{t}" for t in themes])
+    cursor.execute(f"""
+        CREATE TRIGGER {stats_table}_update AFTER UPDATE OF {watched} ON {table}
+        BEGIN {apply('OLD', -1)} {apply('NEW', 1)} END
+    """)
+    conn.commit()
+
 def get_stats():
     """Calculates stats using the pre-computed rating_band column."""
     if not os.path.exists(DEST_DB):
         print(f"Error: Subset database not found at {DEST_DB}")
         return
 
-    query = """
-    SELECT rating_band, COUNT(*) 
-    FROM puzzles 
-    GROUP BY rating_band 
-    ORDER BY MIN(Rating) ASC;
-    """
-    
     with sqlite3.connect(DEST_DB) as conn:
         cursor = conn.cursor()
-        print(f"Generating stats from pre-computed column in: {DEST_DB}\n")
-        cursor.execute(query)
-        results = cursor.fetchall()
+        if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_stats'").fetchone():
+            print("Building catalog_stats (first run on this DB)...")
+            build_catalog_stats(conn)
+        print(f"Generating stats from catalog_stats in: {DEST_DB}\n")
+        # Band labels sort in rating order
+        results = cursor.execute("""
+            SELECT rating_band, SUM(puzzles) FROM catalog_stats
+            WHERE theme = 'all' GROUP BY rating_band ORDER BY rating_band
+        """).fetchall()
+        theme_counts = dict(cursor.execute("SELECT theme, SUM(puzzles) FROM catalog_stats GROUP BY theme"))
     
     print(f"{'Rating Band':<15} | {'Count':<10}")
     print("-" * 30)
@@ -72,9 +148,7 @@ def get_stats():
     print("\nTheme Stats (True Count):")
     print("-" * 30)
     for theme in THEMES_TO_INDEX:
-        col_name = f"has_{theme}"
-        cursor.execute(f"SELECT COUNT(*) FROM puzzles WHERE {col_name} = 1")
-        count = cursor.fetchone()[0]
+        count = theme_counts.get(theme, 0)
         print(f"{theme:<20} | {count:<10,}")
 
 def create_short_puzzles_db():
@@ -192,6 +266,7 @@ def create_short_puzzles_db():
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_move_count ON puzzles(move_count);")
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_rating ON puzzles(Rating);")
         dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_id ON puzzles(PuzzleId);")
+        dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_puzzles_nbplays ON puzzles(NbPlays);")  # Server warmup/preload: most played first
         
         print("Creating Partial Theme Indexes (Super Fast!)...")
         for theme in THEMES_TO_INDEX:
@@ -201,6 +276,12 @@ def create_short_puzzles_db():
             # We include Rating in the index for faster range queries: "Give me endgame puzzles rated 1200-1400"
             dest_cursor.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON puzzles(Rating) WHERE {col_name} = 1;")
 
+        print("Assigning Puzzle Ordinals...")
+        assign_ordinals(dest_conn)
+
+        print("Materializing Catalog Stats...")
+        build_catalog_stats(dest_conn)
+
         # 5. Create User Tables
         print("Creating User Tables (Favorites & Progress)...")
         dest_cursor.execute('''
@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import zlib
+import argparse
+
+import chess
+
+# ==============================================================================
+# Deterministic stand-in for Stockfish.
+# Speaks enough UCI for chess.engine.SimpleEngine.analyse (incl. MultiPV).
+# Scores and PVs are derived from a hash of the FEN, so every run is identical.
+#
+# Usage with python-chess:
+#   chess.engine.SimpleEngine.popen_uci([sys.executable, "fake_uci_engine.py", "--latency-ms", "5"])
+# ==============================================================================
+
+DEFAULT_PV_LENGTH = 6
+SCORE_RANGE = 200  # Scores fall in [-SCORE_RANGE, SCORE_RANGE] cp (keeps positions "close")
+
+def fen_hash(fen):
+    return zlib.crc32(fen.encode())
+
+def scripted_line(board, script):
+    """Returns a scripted {"score": cp, "pv": [uci...]} for this position, if any.
+    Like real UCI output, the score is from the side to move."""
+    return script.get(board.fen()) or script.get(board.epd())
+
+def synthetic_lines(board, multipv, pv_length):
+    """Builds `multipv` distinct deterministic lines: (score_cp, [moves...])."""
+    legal = sorted(board.legal_moves, key=lambda m: m.uci())
+    if not legal:
+        return []
+    h = fen_hash(board.fen())
+    base_score = (h % (2 * SCORE_RANGE + 1)) - SCORE_RANGE
+
+    lines = []
+    for rank in range(min(multipv, len(legal))):
+        first = legal[(h + rank) % len(legal)]
+        pv = [first]
+        temp = board.copy(stack=False)
+        temp.push(first)
+        while len(pv) < pv_length:
+            replies = sorted(temp.legal_moves, key=lambda m: m.uci())
+            if not replies:
+                break
+            reply = replies[fen_hash(temp.fen()) % len(replies)]
+            pv.append(reply)
+            temp.push(reply)
+        # Lower ranked lines are slightly worse for the side to move
+        lines.append((base_score - 15 * rank, pv))
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake UCI engine")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Sleep per 'go' command")
+    parser.add_argument("--pv-length", type=int, default=DEFAULT_PV_LENGTH)
+    parser.add_argument("--script", default=None, help="JSON file mapping FEN/EPD -> {score, pv}")
+    args = parser.parse_args()
+
+    script = {}
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    board = chess.Board()
+    multipv = 1
+    out = sys.stdout
+
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        cmd = tokens[0]
+
+        if cmd == "uci":
+            out.write("id name FakeUCI\nid author NeuroChess\n")
+            out.write("option name MultiPV type spin default 1 min 1 max 500\n")
+            out.write("option name Threads type spin default 1 min 1 max 1024\n")
+            out.write("option name Hash type spin default 16 min 1 max 33554432\n")
+            out.write("uciok\n")
+        elif cmd == "isready":
+            out.write("readyok\n")
+        elif cmd == "setoption":
+            # setoption name <id> value <x>
+            if "name" in tokens and "value" in tokens:
+                name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+                if name.lower() == "multipv":
+                    multipv = int(tokens[tokens.index("value") + 1])
+        elif cmd == "ucinewgame":
+            board = chess.Board()
+        elif cmd == "position":
+            if tokens[1] == "startpos":
+                board = chess.Board()
+                rest = tokens[2:]
+            else:
+                end = tokens.index("moves") if "moves" in tokens else len(tokens)
+                board = chess.Board(" ".join(tokens[2:end]))
+                rest = tokens[end:]
+            if rest and rest[0] == "moves":
+                for uci in rest[1:]:
+                    board.push_uci(uci)
+        elif cmd == "go":
+            if args.latency_ms:
+                time.sleep(args.latency_ms / 1000.0)
+            depth = int(tokens[tokens.index("depth") + 1]) if "depth" in tokens else 1
+
+            scripted = scripted_line(board, script)
+            if scripted:
+                lines = [(scripted["score"], [chess.Move.from_uci(m) for m in scripted["pv"]])]
+            else:
+                lines = synthetic_lines(board, multipv, args.pv_length)
+
+            if not lines:
+                out.write(f"info depth 0 score {'mate 0' if board.is_checkmate() else 'cp 0'}\n")
+                out.write("bestmove (none)\n")
+            else:
+                for rank, (score, pv) in enumerate(lines):
+                    out.write(f"info depth {depth} multipv {rank + 1} score cp {score} "
+                              f"pv {' '.join(m.uci() for m in pv)}\n")
+                out.write(f"bestmove {lines[0][1][0].uci()}\n")
+        elif cmd == "quit":
+            break
+        out.flush()
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import chess.pgn
 import chess.engine
 import json
 import os
+import time
+import argparse
 
 # ==============================================================================
 # CONFIGURATION
@@ -10,7 +12,11 @@ import os
 DEBUG = "verbose"
 GAME_ID = None         
 PGN_PATH = r"A:\applications\torok\games\lichess_db_standard_rated_2013-01.pgn"
-STOCKFISH_PATH = r"V:\Life\Applications\torok\engines\stockfish\stockfish-windows-x86-64-avx2.exe"
+STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", r"V:\Life\Applications\torok\engines\stockfish\stockfish-windows-x86-64-avx2.exe")
+
+OUTPUT_PATH = "sac_analysis.ndjson"            # One JSON result per line, appended as found
+CHECKPOINT_PATH = "sac_analysis.checkpoint.json"
+CHECKPOINT_EVERY = 10  # Games between checkpoints (results are always flushed per game)
 
 PUZZLE_COUNT = 10      # Stop exactly when this many total sacrifices are found
 SKIP_OPENING_PLY = 12  
@@ -70,23 +76,39 @@ def get_exchange_cleared_state(moves, start_ply):
             break
     return get_rel_balance(temp_board), current_ply
 
-def analyze_game(game, engine, total_found, limit):
+def analyze_game(game, engine, total_found, limit, timings=None, start_ply=0):
+    """
+    Finds targeted sacrifices in one game, from start_ply on (resuming a game cut short by `limit`).
+    If `timings` is a dict, seconds spent in each pass are added to it ("pass1", "pass2").
+    """
     results = []
+    phase_start = time.perf_counter()
     moves = list(game.mainline_moves())
     game_url = game.headers.get("Site", "Unknown")
     
+    first_ply = max(SKIP_OPENING_PLY, start_ply)
+
     # Pass 1: Pre-eval baseline to enforce the +/- 300 cp constraint
+    # (positions before first_ply are never read: left at 0 unanalysed)
     temp_board = game.board()
     evals = []
     evals.append(0)
     for i, move in enumerate(moves):
         temp_board.push(move)
+        if i + 1 < first_ply:
+            evals.append(0)
+            continue
         info = engine.analyse(temp_board, chess.engine.Limit(depth=SF_DEPTH))
         score = info["score"].white().score(mate_score=10000)
         evals.append(score)
 
+    if timings is not None:
+        now = time.perf_counter()
+        timings["pass1"] = timings.get("pass1", 0.0) + now - phase_start
+        phase_start = now
+
     # Pass 2: Evaluate targeted captures in close positions
-    for i in range(SKIP_OPENING_PLY, len(moves) - 1):
+    for i in range(first_ply, len(moves) - 1):
         if total_found + len(results) >= limit:
             break
 
@@ -110,9 +132,11 @@ def analyze_game(game, engine, total_found, limit):
         analysis = engine.analyse(board_before, chess.engine.Limit(depth=SF_DEPTH), multipv=MULTI_PV)
         actual_move = moves[i]
         move_rank = -1
+        move_pv = []
         for rank, entry in enumerate(analysis):
             if entry["pv"][0] == actual_move:
                 move_rank = rank + 1
+                move_pv = entry["pv"]
                 break
         
         # Verify material settlement
@@ -140,42 +164,116 @@ def analyze_game(game, engine, total_found, limit):
                 print(f"    Capture: {actual_move} | Rank: {move_rank} | Deficit: {actual_sac_value}")
                 print(f"    Position Eval: {pre_move_eval} | Delta: {eval_delta} | Verdict: {verdict}")
 
+            # Cache the position and engine line so puzzles can be built later without the engine
+            board_setup = board_before.copy()
+            setup_move = board_setup.pop()
+
             results.append({
                 "game_url": game_url,
                 "move": actual_move.uci(),
                 "verdict": verdict,
-                "details": {"rank": move_rank, "sac": actual_sac_value, "delta": eval_delta, "baseline": pre_move_eval}
+                "details": {"rank": move_rank, "sac": actual_sac_value, "delta": eval_delta, "baseline": pre_move_eval},
+                "ply": i,
+                "fen": board_setup.fen(),
+                "setup_move": setup_move.uci(),
+                "pv": [m.uci() for m in move_pv]
             })
 
+    if timings is not None:
+        timings["pass2"] = timings.get("pass2", 0.0) + time.perf_counter() - phase_start
+
     return results
 
+def load_checkpoint():
+    """Returns the last saved checkpoint, or a fresh one if none exists."""
+    if not os.path.exists(CHECKPOINT_PATH):
+        return {"pgn_offset": 0, "game_index": 0, "total_found": 0, "output_offset": 0, "resume_ply": 0}
+    with open(CHECKPOINT_PATH) as f:
+        state = json.load(f)
+    state.setdefault("resume_ply", 0)  # Checkpoints from before per-game resume points
+    return state
+
+def save_checkpoint(state):
+    """Atomically replaces the checkpoint file so a crash never leaves it half-written."""
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
 def main():
+    parser = argparse.ArgumentParser(description="Sacrifice Miner")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+
+    if args.resume:
+        state = load_checkpoint()
+        print(f"Resuming at game {state['game_index']}, ply {state['resume_ply']} "
+              f"({state['total_found']}/{PUZZLE_COUNT} found).")
+    else:
+        state = {"pgn_offset": 0, "game_index": 0, "total_found": 0, "output_offset": 0, "resume_ply": 0}
+
     engine = chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH)
-    all_output = []
-    total_found = 0
+    # Open for update so results written after the last checkpoint can be discarded;
+    # the games that produced them are re-analyzed on resume.
+    out = open(OUTPUT_PATH, "r+" if args.resume and os.path.exists(OUTPUT_PATH) else "w")
+    out.seek(state["output_offset"])
+    out.truncate()
+
+    games_since_checkpoint = 0
+
+    def checkpoint():
+        out.flush()
+        os.fsync(out.fileno())
+        state["output_offset"] = out.tell()
+        save_checkpoint(state)
 
     try:
         with open(PGN_PATH) as pgn:
-            while total_found < PUZZLE_COUNT:
+            pgn.seek(state["pgn_offset"])
+            while state["total_found"] < PUZZLE_COUNT:
                 game = chess.pgn.read_game(pgn)
                 if not game: break
+                next_offset = pgn.tell()
                 
                 url = game.headers.get("Site", "")
-                if GAME_ID and GAME_ID not in url: continue
+                if GAME_ID and GAME_ID not in url:
+                    state["pgn_offset"] = next_offset
+                    state["game_index"] += 1
+                    continue
+
+                game_sacs = analyze_game(game, engine, state["total_found"], PUZZLE_COUNT,
+                                         start_ply=state["resume_ply"])
+                for sac in game_sacs:
+                    out.write(json.dumps(sac) + "\n")
+                out.flush()
 
-                game_sacs = analyze_game(game, engine, total_found, PUZZLE_COUNT)
                 if game_sacs:
-                    all_output.extend(game_sacs)
-                    total_found += len(game_sacs)
-                    print(f"Progress: {total_found}/{PUZZLE_COUNT} individual sacrifices found.")
+                    state["total_found"] += len(game_sacs)
+                    print(f"Progress: {state['total_found']}/{PUZZLE_COUNT} individual sacrifices found.")
+
+                # Only advance past a game once its results are written. A game cut short by
+                # PUZZLE_COUNT stays current: a resume with a higher count continues after its last sac
+                if game_sacs and state["total_found"] >= PUZZLE_COUNT:
+                    state["resume_ply"] = game_sacs[-1]["ply"] + 1
+                else:
+                    state["pgn_offset"] = next_offset
+                    state["game_index"] += 1
+                    state["resume_ply"] = 0
+                games_since_checkpoint += 1
+
+                if games_since_checkpoint >= CHECKPOINT_EVERY:
+                    checkpoint()
+                    games_since_checkpoint = 0
                 
                 if GAME_ID and GAME_ID in url: break
     finally:
+        checkpoint()
+        out.close()
         engine.quit()
     
-    with open("sac_analysis.json", "w") as f:
-        json.dump(all_output[:PUZZLE_COUNT], f, indent=4)
-    print(f"\nSaved {len(all_output[:PUZZLE_COUNT])} sacrifices to JSON.")
+    print(f"\nSaved {state['total_found']} sacrifices to {OUTPUT_PATH} ({state['game_index']} games scanned).")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
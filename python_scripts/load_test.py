@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+
+# ==============================================================================
+# HTTP load generator for the NeuroChess Flask API.
+# Drives a realistic mix of /get_puzzles, /record_attempt, /toggle_favorite and
+# /get_stats from N concurrent clients (one player each, ?user=load<N>), or
+# replays a recorded request log.
+# Reports throughput, latency percentiles per endpoint and SQLite lock errors.
+#
+#   python load_test.py --url http://localhost:5000 --clients 16 --duration 30
+#   python load_test.py --in-process --db bench_puzzles_200000.db --clients 8
+#   python load_test.py --in-process --db ... --record traffic.ndjson
+#   python load_test.py --url http://localhost:5000 --replay traffic.ndjson --speed 2
+# ==============================================================================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_URL = "http://localhost:5000"
+CLIENTS = 8
+DURATION_S = 20
+MIX = [
+    ("get_puzzles", 60),
+    ("record_attempt", 20),
+    ("toggle_favorite", 10),
+    ("get_stats", 10),
+]
+LOCK_ERRORS = ("database is locked", "database table is locked", "SQLITE_BUSY")
+
+# --- Transports ---
+
+class HttpTransport:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, body=None):
+        resp = self.session.request(method, self.base_url + path, json=body, timeout=60)
+        return resp.status_code, resp.text
+
+class InProcessTransport:
+    """Flask test client: no sockets, so results isolate the app + SQLite cost."""
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method, path, body=None):
+        resp = self.client.open(path, method=method, json=body)
+        return resp.status_code, resp.get_data(as_text=True)
+
+def load_flask_app(db_path):
+    sys.path.insert(0, BASE_DIR)
+    import app as server
+    if db_path:
+        server.DB_PATH = os.path.abspath(db_path)
+    server.init_user_db()
+    return server.app
+
+# --- Traffic ---
+
+class Client:
+    """Generates the request mix, reusing PuzzleIds it was served like a real player."""
+    def __init__(self, rng, user):
+        self.rng = rng
+        self.user = user
+        self.recent_ids = []
+        self.rating = rng.randint(900, 2100)
+        self.mode = rng.choice(["standard", "standard", "blindfold"])
+
+    def next_request(self):
+        kind = self.rng.choices([k for k, _ in MIX], weights=[w for _, w in MIX])[0]
+        if kind in ("record_attempt", "toggle_favorite") and not self.recent_ids:
+            kind = "get_puzzles"
+
+        if kind == "get_puzzles":
+            count = self.rng.choice([1, 5, 10, 20])
+            path = f"/get_puzzles?count={count}&mode={self.mode}&user={self.user}"
+            if self.rng.random() < 0.5:
+                path += f"&rating={self.rating}"
+            return kind, "GET", path, None
+        if kind == "record_attempt":
+            return kind, "POST", "/record_attempt", {
+                "PuzzleId": self.rng.choice(self.recent_ids),
+                "success": self.rng.random() < 0.6,
+                "puzzleRating": self.rating + self.rng.randint(-150, 150),
+                "mode": self.mode,
+                "user": self.user,
+            }
+        if kind == "toggle_favorite":
+            return kind, "POST", "/toggle_favorite", {"puzzle_id": self.rng.choice(self.recent_ids),
+                                                               "user": self.user}
+        return kind, "GET", f"/get_stats?mode={self.mode}&user={self.user}", None
+
+    def observe(self, kind, status, text):
+        if kind == "get_puzzles" and status == 200:
+            try:
+                ids = [p["PuzzleId"] for p in json.loads(text).get("puzzles", [])]
+            except ValueError:
+                return
+            self.recent_ids = (self.recent_ids + ids)[-50:]
+
+def endpoint_name(path):
+    return path.split("?", 1)[0].strip("/").split("/")[0] or "index"
+
+# --- Results ---
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock_errors = defaultdict(int)
+        self.transport_errors = defaultdict(int)
+
+    def add(self, name, elapsed, status, text):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            self.statuses[name][status] += 1
+            if status >= 500 and any(e in text for e in LOCK_ERRORS):
+                self.lock_errors[name] += 1
+
+    def add_failure(self, name):
+        with self.lock:
+            self.transport_errors[name] += 1
+
+    def summary(self, elapsed):
+        def pct(values, p):
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000 if ordered else 0.0
+
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            endpoints[name] = {
+                "requests": len(values),
+                "rps": len(values) / elapsed,
+                "p50_ms": pct(values, 50),
+                "p95_ms": pct(values, 95),
+                "p99_ms": pct(values, 99),
+                "max_ms": max(values) * 1000,
+                "statuses": dict(self.statuses[name]),
+                "lock_errors": self.lock_errors[name],
+                "transport_errors": self.transport_errors[name],
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "rps": total / elapsed if elapsed else 0.0,
+            "lock_errors": sum(self.lock_errors.values()),
+            "errors_5xx": sum(c for s in self.statuses.values() for code, c in s.items() if code >= 500),
+            "endpoints": endpoints,
+        }
+
+# --- Runners ---
+
+def timed_request(transport, results, name, method, path, body):
+    start = time.perf_counter()
+    try:
+        status, text = transport.request(method, path, body)
+    except Exception:
+        results.add_failure(name)
+        return None, None
+    results.add(name, time.perf_counter() - start, status, text)
+    return status, text
+
+def run_mix(make_transport, clients, duration, seed, record_path=None):
+    results = Results()
+    deadline = time.perf_counter() + duration
+    run_start = time.perf_counter()
+    record_lock = threading.Lock()
+    record_file = open(record_path, "w") if record_path else None
+
+    def worker(idx):
+        transport = make_transport()
+        client = Client(random.Random(seed + idx), f"load{idx}")
+        while time.perf_counter() < deadline:
+            kind, method, path, body = client.next_request()
+            if record_file:
+                entry = {"t": round(time.perf_counter() - run_start, 4), "method": method, "path": path, "json": body}
+                with record_lock:
+                    record_file.write(json.dumps(entry) + "\n")
+            status, text = timed_request(transport, results, kind, method, path, body)
+            if status is not None:
+                client.observe(kind, status, text)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if record_file:
+        record_file.close()
+    return results.summary(time.perf_counter() - start)
+
+def run_replay(make_transport, clients, log_path, speed):
+    """Replays an NDJSON log ({t, method, path, json}); speed 0 = as fast as possible."""
+    with open(log_path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries.sort(key=lambda e: e.get("t", 0))
+
+    results = Results()
+    next_idx = [0]
+    idx_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def worker():
+        transport = make_transport()
+        while True:
+            with idx_lock:
+                if next_idx[0] >= len(entries):
+                    return
+                entry = entries[next_idx[0]]
+                next_idx[0] += 1
+            if speed > 0:
+                wait = entry.get("t", 0) / speed - (time.perf_counter() - start)
+                if wait > 0:
+                    time.sleep(wait)
+            path = entry["path"]
+            timed_request(transport, results, endpoint_name(path), entry.get("method", "GET"), path, entry.get("json"))
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results.summary(time.perf_counter() - start)
+
+def print_summary(summary):
+    print(f"\nTotal: {summary['requests']:,} requests in {summary['elapsed_s']:.1f}s "
+          f"({summary['rps']:.1f} req/s) | 5xx: {summary['errors_5xx']} | SQLite lock errors: {summary['lock_errors']}")
+    print(f"\n{'Endpoint':<18} | {'Req':>7} | {'Req/s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | "
+          f"{'p99 ms':>8} | {'Locked':>6} | Statuses")
+    print("-" * 100)
+    for name, e in summary["endpoints"].items():
+        print(f"{name:<18} | {e['requests']:>7} | {e['rps']:>7.1f} | {e['p50_ms']:>8.2f} | {e['p95_ms']:>8.2f} | "
+              f"{e['p99_ms']:>8.2f} | {e['lock_errors']:>6} | {e['statuses']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="NeuroChess API load test")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Server base URL")
+    parser.add_argument("--in-process", action="store_true", help="Use the Flask test client instead of HTTP")
+    parser.add_argument("--db", default=None, help="Puzzle DB for --in-process (overrides app.DB_PATH)")
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--duration", type=float, default=DURATION_S, help="Seconds to run the synthetic mix")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--record", default=None, help="Write the generated traffic to this NDJSON log")
+    parser.add_argument("--replay", default=None, help="Replay an NDJSON log instead of the synthetic mix")
+    parser.add_argument("--speed", type=float, default=0, help="Replay speed multiplier (0 = as fast as possible)")
+    parser.add_argument("--output", default=None, help="Write summary JSON")
+    args = parser.parse_args()
+
+    if args.in_process:
+        flask_app = load_flask_app(args.db)
+        make_transport = lambda: InProcessTransport(flask_app)
+        target = f"in-process ({args.db or 'app.DB_PATH'})"
+    else:
+        make_transport = lambda: HttpTransport(args.url)
+        target = args.url
+
+    print(f"Target: {target} | Clients: {args.clients}")
+    if args.replay:
+        print(f"Replaying {args.replay} (speed {args.speed or 'max'})")
+        summary = run_replay(make_transport, args.clients, args.replay, args.speed)
+    else:
+        print(f"Running mix {dict(MIX)} for {args.duration}s")
+        summary = run_mix(make_transport, args.clients, args.duration, args.seed, args.record)
+
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": target, "clients": args.clients, **summary}, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
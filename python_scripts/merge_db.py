@@ -1,76 +1,291 @@
-import sqlite3
 import os
-import shutil
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+# ==============================================================================
+# User data merge and online backup.
+#
+# merge: folds a user DB into the per-user stores (user_store.py) set-based:
+# the source is ATTACHed to the target store and each table is merged with one
+# INSERT ... SELECT ... ON CONFLICT, using the precedence rules of /sync
+# (user_sync.ON_CONFLICT): solved/win beats failed/loss, then the later
+# timestamp; stats keep the later last_active. Re-running a merge is a no-op.
+# Merged failed/loss rows are scheduled in review_queue as record_result
+# does (review_queue.record): new items are due after RELEARN_DELAY_S, items
+# already queued lapse.
+# The source is either a legacy single-user user_data.sqlite (rows go to
+# --user) or another store file (rows keep their user_id).
+#
+# backup: copies every store file with the SQLite online backup API, PAGES
+# pages per step, while the server keeps running. A step that finds the source
+# changed by another connection restarts the copy, so each file is a consistent
+# snapshot; it is written to <file>.part and renamed when complete. Files whose
+# fingerprint (size, mtime, WAL size and header) matches the last run's
+# manifest are skipped, so repeated runs only copy stores that changed.
+#
+#   python merge_db.py merge --source user_data.sqlite --user local
+#   python merge_db.py backup --dest backups/neurochess_users
+# ==============================================================================
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.insert(0, BASE_DIR)
+
+import review_queue  # noqa: E402
+import solved_sets  # noqa: E402
+import user_store  # noqa: E402
+import user_sync  # noqa: E402
 
 MAIN_DB = r"A:\applications\torok\lichess_short_puzzles.sqlite"
 USER_DB = r"A:\applications\torok\user_data.sqlite"
-BACKUP_DB = r"A:\applications\torok\lichess_short_puzzles.sqlite.bak"
-
-def merge_databases():
-    if not os.path.exists(MAIN_DB):
-        print("Main DB not found!")
-        return
-
-    # Backup mostly for safety
-    if not os.path.exists(BACKUP_DB):
-        print("Backing up main DB...")
-        shutil.copy2(MAIN_DB, BACKUP_DB)
-
-    print("Connecting to databases...")
-    dest_conn = sqlite3.connect(MAIN_DB)
-    dest_cursor = dest_conn.cursor()
-
-    # Create tables in Dest if not exist
-    print("Creating tables in Main DB...")
-    dest_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_progress (
-            puzzle_id TEXT PRIMARY KEY,
-            status TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    dest_cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_status ON user_progress(status)")
-
-    dest_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS player_stats (
-            mode TEXT PRIMARY KEY,
-            rating REAL,
-            rd REAL,
-            vol REAL,
-            last_active DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migrate Data
-    if os.path.exists(USER_DB):
-        print("Migrating data from User DB...")
-        src_conn = sqlite3.connect(USER_DB)
-        src_conn.row_factory = sqlite3.Row
-        src_cursor = src_conn.cursor()
-        
-        # User Progress
-        rows = src_cursor.execute("SELECT * FROM user_progress").fetchall()
-        print(f"  Migrating {len(rows)} progress records...")
-        dest_cursor.executemany(
-            "INSERT OR IGNORE INTO user_progress (puzzle_id, status, timestamp) VALUES (?, ?, ?)",
-            [tuple(r) for r in rows]
-        )
-        
-        # Player Stats
-        rows = src_cursor.execute("SELECT * FROM player_stats").fetchall()
-        print(f"  Migrating {len(rows)} stats records...")
-        dest_cursor.executemany(
-            "INSERT OR REPLACE INTO player_stats (mode, rating, rd, vol, last_active) VALUES (?, ?, ?, ?, ?)",
-            [tuple(r) for r in rows]
-        )
-        
-        src_conn.close()
+USER_DATA_DIR = None  # Default: neurochess_users/ next to MAIN_DB, as in app.py
+BACKUP_DIR = r"A:\applications\torok\backups\neurochess_users"
+PAGES = 1024          # Pages copied per backup step
+STEP_SLEEP_S = 0.005  # Retry delay of a step that finds the source locked
+PROGRESS_EVERY_S = 1.0
+MANIFEST = "backup_manifest.json"
+
+MERGED_TABLES = {
+    # sync table -> (user store table, columns after user_id)
+    "progress": ("user_progress", "puzzle_id, status, timestamp"),
+    "favorites": ("user_favorites", "puzzle_id, timestamp"),
+    "stats": ("player_stats", "mode, rating, rd, vol, last_active"),
+}
+
+# Failed rows the merge wrote (absent or different before it), scheduled as review_queue.record does
+SCHEDULE_REVIEWS = f'''
+    INSERT INTO main.review_queue (user_id, puzzle_id, due_at, interval_days, ease, reps, lapses)
+    SELECT up.user_id, up.puzzle_id, ?, 0, {review_queue.START_EASE}, 0, 1
+    FROM main.user_progress up
+    JOIN temp.merge_failed f ON f.puzzle_id = up.puzzle_id
+    WHERE up.user_id = ? AND up.status NOT IN {solved_sets.SOLVED_STATUSES}
+        AND (f.before_status IS NULL OR f.before_status IS NOT up.status OR f.before_timestamp IS NOT up.timestamp)
+    ON CONFLICT (user_id, puzzle_id) DO UPDATE SET
+        due_at = excluded.due_at, interval_days = 0, reps = 0, lapses = lapses + 1,
+        ease = MAX({review_queue.MIN_EASE}, ease - {review_queue.LAPSE_EASE_PENALTY})
+'''
+
+def default_data_dir():
+    return USER_DATA_DIR or os.path.join(os.path.dirname(os.path.abspath(MAIN_DB)), "neurochess_users")
+
+# --- Merge ---
+
+def source_layout(path):
+    """{store table: has user_id column} for the merged tables present in path."""
+    conn = sqlite3.connect(user_store.sqlite_uri(path, mode="ro"), uri=True)
+    try:
+        layout = {}
+        for table, _ in MERGED_TABLES.values():
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if columns:
+                layout[table] = "user_id" in columns
+        return layout
+    finally:
+        conn.close()
+
+def source_users(path):
+    conn = sqlite3.connect(user_store.sqlite_uri(path, mode="ro"), uri=True)
+    try:
+        layout = source_layout(path)
+        parts = [f"SELECT user_id FROM {table}" for table, per_user in layout.items() if per_user]
+        return [row[0] for row in conn.execute(" UNION ".join(parts))] if parts else []
+    finally:
+        conn.close()
+
+def merge_user(store, source, layout, user, source_user):
+    """Merges source_user's rows from source into user's store: {sync table: rows written, "reviews": items scheduled}."""
+    written = {}
+    with store.session(user) as conn:
+        conn.execute("ATTACH DATABASE ? AS src", (user_store.sqlite_uri(source, mode="ro"),))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if "user_progress" in layout:
+                # The source's failed rows with the target's row before the merge
+                where, params = ("AND user_id = ?", (source_user,)) if layout["user_progress"] else ("", ())
+                conn.execute(f'''
+                    CREATE TEMP TABLE merge_failed AS
+                    SELECT s.puzzle_id, up.status AS before_status, up.timestamp AS before_timestamp
+                    FROM (SELECT DISTINCT puzzle_id FROM src.user_progress
+                          WHERE status NOT IN {solved_sets.SOLVED_STATUSES} {where}) s
+                    LEFT JOIN main.user_progress up ON up.user_id = ? AND up.puzzle_id = s.puzzle_id
+                ''', (*params, user))
+            for tbl, (table, columns) in MERGED_TABLES.items():
+                if table not in layout:
+                    continue
+                where = "WHERE user_id = ?" if layout[table] else "WHERE true"  # WHERE keeps ON CONFLICT unambiguous
+                params = (user, source_user) if layout[table] else (user,)
+                written[tbl] = conn.execute(f'''
+                    INSERT INTO main.{table} (user_id, {columns})
+                    SELECT ?, {columns} FROM src.{table} {where}
+                    {user_sync.ON_CONFLICT[tbl]}
+                ''', params).rowcount
+            if "user_progress" in layout:
+                written["reviews"] = conn.execute(SCHEDULE_REVIEWS, (time.time() + review_queue.RELEARN_DELAY_S,
+                                                                     user)).rowcount
+                conn.execute("DROP TABLE temp.merge_failed")
+            if written.get("progress"):
+                # Derived from user_progress and review_queue: stale tags make the server rebuild them on next use
+                conn.execute("UPDATE solved_sets SET catalog = '', version = version + 1 WHERE user_id = ?", (user,))
+                conn.execute("UPDATE solved_counts SET catalog = '' WHERE user_id = ?", (user,))
+            conn.commit()
+        finally:
+            conn.rollback()  # No-op after the commit; DETACH fails inside a transaction
+            conn.execute("DETACH DATABASE src")
+    return written
+
+def run_merge(args):
+    if not os.path.exists(args.source):
+        print(f"Source DB not found: {args.source}")
+        sys.exit(1)
+    layout = source_layout(args.source)
+    if not layout:
+        print(f"{args.source} has none of: {', '.join(t for t, _ in MERGED_TABLES.values())}")
+        sys.exit(1)
+    if not all(layout.values()) and not args.user:
+        print("Source has single-user tables: pass --user to merge them into")
+        sys.exit(1)
+
+    store = user_store.UserStore(args.user_data)
+    if all(layout.values()):
+        pairs = [(args.user, args.source_user or args.user)] if args.user else [(u, u) for u in source_users(args.source)]
     else:
-        print("User DB not found, skipping data migration (tables created though).")
+        pairs = [(args.user, None)]
+
+    print(f"Merging {args.source} into {args.user_data} ({len(pairs)} user(s))...")
+    totals = {tbl: 0 for tbl in (*MERGED_TABLES, "reviews")}
+    start = time.perf_counter()
+    try:
+        for i, (user, source_user) in enumerate(pairs, 1):
+            for tbl, count in merge_user(store, args.source, layout, user, source_user).items():
+                totals[tbl] += count
+            if i % 100 == 0 or i == len(pairs):
+                elapsed = time.perf_counter() - start
+                print(f"  {i:,}/{len(pairs):,} users, {sum(totals.values()):,} rows written "
+                      f"({sum(totals.values()) / max(elapsed, 1e-9):,.0f} rows/s)")
+    finally:
+        store.close_all()
 
-    dest_conn.commit()
-    dest_conn.close()
-    print("Merge Complete.")
+    print(f"\n{'Table':<16} | {'Written':>10}")
+    print("-" * 29)
+    for tbl, (table, _) in MERGED_TABLES.items():
+        print(f"{table:<16} | {totals[tbl]:>10,}")
+    print(f"{'review_queue':<16} | {totals['reviews']:>10,}")
+    print(f"\nMerge complete in {time.perf_counter() - start:.2f}s (rows already up to date are not rewritten).")
+
+# --- Backup ---
+
+def fingerprint(path):
+    """
+    Changes whenever the DB or its WAL is written. The WAL's mtime is not used:
+    opening a WAL database, even read-only, touches it.
+    """
+    st = os.stat(path)
+    parts = [st.st_size, st.st_mtime_ns]
+    try:
+        with open(path + "-wal", "rb") as f:
+            header = f.read(32)  # Checkpoint sequence and salts: new on every WAL reset
+            parts += [os.fstat(f.fileno()).st_size, header.hex()]
+    except FileNotFoundError:
+        parts += [0, ""]
+    return parts
+
+def backup_file(path, dest, pages, sleep):
+    """Online backup of path to dest: (pages copied, bytes, restarts)."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    part = dest + ".part"
+    if os.path.exists(part):
+        os.remove(part)
+    state = {"restarts": 0, "remaining": None, "printed": time.perf_counter()}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1  # Source written by another connection: copy starts over
+        state["remaining"] = remaining
+        if time.perf_counter() - state["printed"] >= PROGRESS_EVERY_S:
+            state["printed"] = time.perf_counter()
+            print(f"    {total - remaining:,}/{total:,} pages ({(total - remaining) * 100 // max(total, 1)}%)")
+
+    src = sqlite3.connect(user_store.sqlite_uri(path, mode="ro"), uri=True)
+    dst = sqlite3.connect(part)
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        page_size = dst.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    os.replace(part, dest)
+    return page_count, page_count * page_size, state["restarts"]
+
+def run_backup(args):
+    if not os.path.isdir(args.user_data):
+        print(f"User data dir not found: {args.user_data}")
+        sys.exit(1)
+    os.makedirs(args.dest, exist_ok=True)
+    manifest_path = os.path.join(args.dest, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not args.full:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    files = sorted(os.path.relpath(os.path.join(root, name), args.user_data)
+                   for root, _, names in os.walk(args.user_data) for name in names if name.endswith(".sqlite"))
+    print(f"Backing up {len(files)} store file(s) from {args.user_data} to {args.dest}...")
+
+    results = []
+    start = time.perf_counter()
+    for rel in files:
+        path = os.path.join(args.user_data, rel)
+        before = fingerprint(path)
+        if manifest.get(rel, {}).get("fingerprint") == before and os.path.exists(os.path.join(args.dest, rel)):
+            results.append({"file": rel, "skipped": True})
+            continue
+        file_start = time.perf_counter()
+        page_count, size, restarts = backup_file(path, os.path.join(args.dest, rel), args.pages, args.sleep)
+        seconds = time.perf_counter() - file_start
+        # Taken before the copy: a write during it makes the next run copy the file again
+        manifest[rel] = {"fingerprint": before, "pages": page_count, "bytes": size,
+                         "backed_up_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        results.append({"file": rel, "skipped": False, "pages": page_count, "bytes": size,
+                        "seconds": seconds, "restarts": restarts})
+        print(f"  {rel}: {size / 1e6:.1f} MB in {seconds:.2f}s ({size / 1e6 / max(seconds, 1e-9):.1f} MB/s)"
+              + (f", {restarts} restart(s)" if restarts else ""))
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    copied = [r for r in results if not r["skipped"]]
+    total_bytes = sum(r["bytes"] for r in copied)
+    elapsed = time.perf_counter() - start
+    print(f"\n{'Files':>6} | {'Copied':>6} | {'Skipped':>7} | {'MB':>8} | {'Seconds':>8} | {'MB/s':>7} | {'Restarts':>8}")
+    print("-" * 68)
+    print(f"{len(results):>6} | {len(copied):>6} | {len(results) - len(copied):>7} | {total_bytes / 1e6:>8.1f} | "
+          f"{elapsed:>8.2f} | {total_bytes / 1e6 / max(elapsed, 1e-9):>7.1f} | {sum(r['restarts'] for r in copied):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge user DBs into the user stores, or back the stores up online")
+    parser.add_argument("--user-data", default=None, help="User store directory (default: next to MAIN_DB)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge = commands.add_parser("merge", help="Set-based merge of a user DB into the stores")
+    merge.add_argument("--source", default=USER_DB, help="Legacy user_data.sqlite or a store file")
+    merge.add_argument("--user", default=None, help="Target user (required for single-user sources)")
+    merge.add_argument("--source-user", default=None, help="User to read from a store source (default: --user)")
+
+    backup = commands.add_parser("backup", help="Online backup of every store file")
+    backup.add_argument("--dest", default=BACKUP_DIR)
+    backup.add_argument("--pages", type=int, default=PAGES, help="Pages per backup step")
+    backup.add_argument("--sleep", type=float, default=STEP_SLEEP_S, help="Retry delay when the source is locked")
+    backup.add_argument("--full", action="store_true", help="Copy every file, ignoring the manifest")
+    args = parser.parse_args()
+    args.user_data = args.user_data or default_data_dir()
+
+    if args.command == "merge":
+        run_merge(args)
+    else:
+        run_backup(args)
 
 if __name__ == "__main__":
-    merge_databases()
+    main()
@@ -13,6 +13,7 @@ ROOT_DIR = os.path.dirname(SCRIPT_DIR) # Parent of python_scripts (A:\applicatio
 # Script Paths
 SHORT_DB_SCRIPT = os.path.join(SCRIPT_DIR, "create_short_db.py")
 LONG_DB_SCRIPT = os.path.join(SCRIPT_DIR, "create_long_db.py")
+SAC_PUZZLES_SCRIPT = os.path.join(SCRIPT_DIR, "create_sac_puzzles.py")
 MOBILE_DB_SCRIPT = os.path.join(SCRIPT_DIR, "create_mobile_db.py")
 
 # File Paths (For Verification)
@@ -46,9 +47,13 @@ def main():
     # Step 2: Create Long DB (Enriched with Themes)
     run_step("2. Generating Enriched Long DB (Ply >= 8)...", LONG_DB_SCRIPT)
 
-    # Step 3: Create Mobile DB (Subset)
+    # Step 3: Load mined sacrifices (from good_or_bad_sac.py) into Short/Long DBs
+    # Uses the cached engine lines only; skipped if no sacrifice results exist
+    run_step("3. Loading Mined Sacrifice Puzzles...", SAC_PUZZLES_SCRIPT)
+
+    # Step 4: Create Mobile DB (Subset)
     # This reads the enriched short DB and creates the lightweight mobile asset directly
-    run_step("3. Generating Mobile Asset DB, Extra Puzzles & Deep DLC...", MOBILE_DB_SCRIPT)
+    run_step("4. Generating Mobile Asset DB, Extra Puzzles & Deep DLC...", MOBILE_DB_SCRIPT)
 
     # Verification
     print(f"\n[VERIFICATION]")
@@ -1,5 +1,8 @@
 import sqlite3
 import os
+import argparse
+
+from create_short_db import assign_ordinals, build_catalog_stats
 
 MAIN_DB = r"A:\applications\torok\lichess_short_puzzles.sqlite"
 USER_DB = r"A:\applications\torok\user_data.sqlite"
@@ -22,17 +25,72 @@ def add_indexes(db_path, statements):
     except Exception as e:
         print(f"Error: {e}")
 
+def has_column(db_path, table, column):
+    if not os.path.exists(db_path):
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        return column in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    finally:
+        conn.close()
+
+def add_ordinals(db_path):
+    """Numbers puzzles for the server's solved-set bitmaps (DBs built before ordinals)."""
+    if not os.path.exists(db_path):
+        print(f"Skipping {db_path} (Not Found)")
+        return
+
+    print(f"Assigning puzzle ordinals in {db_path}...")
+    try:
+        conn = sqlite3.connect(db_path)
+        has_meta = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_meta'").fetchone()
+        if has_meta and conn.execute("SELECT 1 FROM catalog_meta WHERE key = 'ordinals_id'").fetchone():
+            print("Already numbered (renumbering would force every solved set to be rebuilt).")
+        else:
+            assign_ordinals(conn)
+            print("Done.")
+        conn.close()
+    except Exception as e:
+        print(f"Error: {e}")
+
+def add_catalog_stats(db_path):
+    """Materialized per-(band, theme, move_count) counts for /catalog_stats (DBs built before them)."""
+    if not os.path.exists(db_path):
+        print(f"Skipping {db_path} (Not Found)")
+        return
+
+    print(f"Building catalog stats in {db_path}...")
+    try:
+        conn = sqlite3.connect(db_path)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'catalog_stats'").fetchone():
+            print("Already present (kept current by triggers).")
+        else:
+            build_catalog_stats(conn)
+            print("Done.")
+        conn.close()
+    except Exception as e:
+        print(f"Error: {e}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add indexes, ordinals and catalog stats to existing DBs")
+    parser.add_argument("--db", default=MAIN_DB, help="Puzzle DB (the server's DB_PATH)")
+    parser.add_argument("--user-db", default=USER_DB, help="Legacy single-user DB")
+    args = parser.parse_args()
+
     # 1. Main DB Indexes
     main_indexes = [
         "CREATE INDEX IF NOT EXISTS idx_puzzles_rating ON puzzles(Rating)",
         "CREATE INDEX IF NOT EXISTS idx_puzzles_id ON puzzles(PuzzleId)",
         "CREATE INDEX IF NOT EXISTS idx_rating_band ON puzzles(rating_band)"
     ]
-    add_indexes(MAIN_DB, main_indexes)
+    if has_column(args.db, "puzzles", "NbPlays"):  # Not in the mobile schema: the server then preloads in PuzzleId order
+        main_indexes.append("CREATE INDEX IF NOT EXISTS idx_puzzles_nbplays ON puzzles(NbPlays)")  # Server warmup/preload: most played first
+    add_indexes(args.db, main_indexes)
+    add_ordinals(args.db)
+    add_catalog_stats(args.db)
     
     # 2. User DB Indexes
     user_indexes = [
         "CREATE INDEX IF NOT EXISTS idx_user_status ON user_progress(status)"
     ]
-    add_indexes(USER_DB, user_indexes)
+    add_indexes(args.user_db, user_indexes)
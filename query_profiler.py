@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import jsonify, request, has_request_context
+
+import metrics
+
+# Slow-query profiler for the server's SQLite layer.
+# Statements slower than SLOW_QUERY_MS (execute + fetch) are captured with the
+# SQL as SQLite ran it (bound parameters inlined, via set_trace_callback), the
+# parameters themselves and an EXPLAIN QUERY PLAN dump, into a bounded ring
+# buffer served at /debug/slow_queries. NEUROCHESS_SLOW_QUERY_MS=0 disables it.
+
+SLOW_QUERY_MS = float(os.environ.get("NEUROCHESS_SLOW_QUERY_MS", "100"))
+RING_SIZE = int(os.environ.get("NEUROCHESS_SLOW_QUERY_RING", "200"))
+ENABLED = SLOW_QUERY_MS > 0
+
+_entries = deque(maxlen=RING_SIZE)
+_lock = threading.Lock()
+_captured_total = 0
+
+metrics.describe("neurochess_slow_queries_total", "counter", "Statements slower than the slow-query threshold.")
+
+def _jsonable(value):
+    return value if isinstance(value, (int, float, str)) or value is None else repr(value)
+
+def _plan_is_full_scan(plan):
+    # "SCAN" walks a whole table or index ("SCAN p USING INDEX idx_puzzles_id" included);
+    # constrained lookups show up as "SEARCH"
+    return any(d.startswith("SCAN ") for d in plan)
+
+def _explain(conn, sql, params):
+    try:
+        # Plain cursor so the plan lookup is neither traced nor timed itself
+        cur = sqlite3.Cursor(conn)
+        return [row[3] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except sqlite3.Error as e:
+        return [f"EXPLAIN failed: {e}"]
+
+def record(conn, sql, params, expanded_sql, elapsed):
+    global _captured_total
+    plan = _explain(conn, sql, params)
+    entry = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "statement": metrics.statement_label(sql),
+        "sql": " ".join(sql.split()),
+        "params": ({k: _jsonable(v) for k, v in params.items()} if isinstance(params, dict)
+                   else [_jsonable(p) for p in params]),
+        "expanded_sql": " ".join((expanded_sql or "").split()),
+        "plan": plan,
+        "full_scan": _plan_is_full_scan(plan),
+        "temp_btree": any("TEMP B-TREE" in d for d in plan),
+        "route": request.path if has_request_context() else None,
+    }
+    with _lock:
+        _entries.append(entry)
+        _captured_total += 1
+    metrics.inc("neurochess_slow_queries_total", statement=entry["statement"])
+
+class ProfiledCursor(metrics.InstrumentedCursor):
+    _sql = None
+    _params = ()
+    _elapsed = 0.0
+    _expanded = None
+
+    def _track(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+            if self._sql is not None and self._elapsed * 1000 >= SLOW_QUERY_MS:
+                sql, self._sql = self._sql, None  # Report each statement once
+                expanded = self._expanded if self._expanded is not None else self.connection._last_trace
+                record(self.connection, sql, self._params, expanded, self._elapsed)
+
+    def _begin(self, sql, params):
+        self._sql = sql
+        self._params = tuple(params) if not isinstance(params, dict) else params
+        self._elapsed = 0.0
+        self._expanded = None
+        self.connection._last_trace = None
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        try:
+            return self._track(super().execute, sql, parameters)
+        finally:
+            self._expanded = self.connection._last_trace
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        return self._track(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        return self._track(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._track(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._track(super().fetchall)
+
+class ProfiledConnection(metrics.InstrumentedConnection):
+    # conn.execute*() are routed through cursor() by InstrumentedConnection, so they get a
+    # ProfiledCursor too (python_scripts/check_sql_profiling.py checks both styles)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_trace = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        self._last_trace = statement
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+def connect(path, **kwargs):
+    """metrics.connect() plus slow-query capture when the profiler is enabled."""
+    if ENABLED:
+        kwargs.setdefault("factory", ProfiledConnection)
+    return metrics.connect(path, **kwargs)
+
+def entries():
+    with _lock:
+        return list(_entries)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def init_app(app):
+    @app.route('/debug/slow_queries', methods=['GET', 'DELETE'])
+    def slow_queries():
+        if request.method == 'DELETE':
+            clear()
+            return jsonify({"message": "Cleared"})
+        captured = entries()
+        if request.args.get('full_scan') == '1':
+            captured = [e for e in captured if e["full_scan"]]
+        return jsonify({
+            "enabled": ENABLED,
+            "threshold_ms": SLOW_QUERY_MS,
+            "ring_size": RING_SIZE,
+            "captured_total": _captured_total,
+            "entries": captured[::-1],  # Newest first
+        })
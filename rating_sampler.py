@@ -0,0 +1,182 @@
+import os
+import math
+import random
+import threading
+from array import array
+from collections import OrderedDict
+
+import metrics
+import rating
+
+# Adaptive puzzle selection weighted by expected score. Instead of a uniform
+# pick from a hard +/-150 Rating window, puzzles are drawn with probability
+# proportional to a curve over the Glicko expected score (rating._E/_g) of the
+# user against the puzzle, peaking at TARGET_SCORE. The user's RD enters
+# through g(sqrt(RD^2 + PUZZLE_RD^2)): uncertain (new) users get a flatter curve
+# and so a wider spread of puzzles, established users a narrow one.
+#
+# The puzzle DB's ordinals are held in memory sorted into BUCKET_WIDTH rating
+# buckets. For a target (rating, rd), quantized to TABLE_STEP, a Vose alias
+# table over buckets (bucket size x weight) is built once and cached; a draw is
+# then two random numbers and two array reads, whatever the catalog size or
+# how sparse the puzzles near the user are. Every bucket keeps a small weight,
+# so extreme ratings draw from the nearest populated buckets, never nothing.
+# Solved puzzles are rejected against the solved bitmap before any DB access;
+# the accepted ordinals are fetched in one query on idx_puzzles_ordinal.
+
+ENABLED = os.environ.get("NEUROCHESS_RATING_SAMPLER", "1") != "0"
+TARGET_SCORE = float(os.environ.get("NEUROCHESS_TARGET_SCORE", "0.5"))  # Expected solve probability aimed at
+CONCENTRATION = 8.0    # Sharpness of the curve around TARGET_SCORE
+BUCKET_WIDTH = 25      # Rating points per histogram bucket
+PUZZLE_RD = 30.0       # As in record_result
+TABLE_STEP = 10        # Rating/RD quantization of cached alias tables
+MAX_TABLES = 256
+MIN_WEIGHT = 1e-6      # Floor relative to the peak bucket
+DRAWS_PER_PUZZLE = 20  # Draw budget per requested puzzle (rejections included)
+GLICKO_SCALE = 173.7178
+
+metrics.describe("neurochess_sampler_draws_total", "counter", "Rating sampler draws, by result (accepted, solved, duplicate).")
+
+def log_weight(user_rating, user_rd, puzzle_rating):
+    """Log of the (unnormalized) draw weight of a puzzle; 0 at the target score."""
+    mu = (user_rating - 1500) / GLICKO_SCALE
+    mu_j = (puzzle_rating - 1500) / GLICKO_SCALE
+    phi = math.sqrt(user_rd * user_rd + PUZZLE_RD * PUZZLE_RD) / GLICKO_SCALE
+    e = min(max(rating._E(mu, mu_j, phi), 1e-12), 1 - 1e-12)
+    # Beta-shaped kernel over the expected score, maximal (1) at E = TARGET_SCORE
+    t = TARGET_SCORE
+    return CONCENTRATION * (t * math.log(e / t) + (1 - t) * math.log((1 - e) / (1 - t)))
+
+def alias_table(weights):
+    """Vose alias table (prob, alias) for sampling indexes proportionally to weights."""
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights]
+    prob, alias = array("d", [1.0] * n), array("I", range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+        scaled[l] -= 1.0 - scaled[s]
+        (small if scaled[l] < 1.0 else large).append(l)
+    return prob, alias
+
+class RatingSampler:
+    def __init__(self, max_tables=MAX_TABLES):
+        self.max_tables = max_tables
+        self._lock = threading.Lock()
+        self._index = None            # (ordinals, bucket starts, bucket ratings); None without ordinals
+        self._loaded = False
+        self._tables = OrderedDict()  # quantized (rating, rd) -> (prob, alias)
+
+    def _load(self, conn):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._index = self._build(conn)
+                    self._loaded = True
+        return self._index
+
+    def available(self, conn):
+        """False on puzzle DBs without ordinals: callers select from the Rating window instead."""
+        return self._load(conn) is not None
+
+    def warm(self, conn):
+        """Builds the index ahead of the first adaptive request. Returns the puzzles indexed."""
+        index = self._load(conn)
+        return len(index[0]) if index is not None else "no ordinals (Rating window)"
+
+    @staticmethod
+    def _build(conn):
+        if "ordinal" not in {row[1] for row in conn.execute("PRAGMA table_info(puzzles)")}:
+            return None
+        ordinals, starts, centers = array("I"), array("I"), array("d")
+        last = None
+        for bucket, ordinal in conn.execute('''
+            SELECT CAST(Rating AS INTEGER) / ? AS bucket, ordinal FROM puzzles
+            WHERE Rating IS NOT NULL AND ordinal IS NOT NULL ORDER BY bucket
+        ''', (BUCKET_WIDTH,)):
+            if bucket != last:
+                starts.append(len(ordinals))
+                centers.append((bucket + 0.5) * BUCKET_WIDTH)
+                last = bucket
+            ordinals.append(ordinal)
+        starts.append(len(ordinals))
+        return ordinals, starts, centers
+
+    def _table(self, index, user_rating, user_rd):
+        key = (round(user_rating / TABLE_STEP), round(user_rd / TABLE_STEP))
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        _, starts, centers = index
+        logs = [log_weight(key[0] * TABLE_STEP, key[1] * TABLE_STEP, c) for c in centers]
+        peak = max(logs)
+        # Relative to the peak bucket, so far-off targets still weigh their nearest buckets
+        weights = [(starts[i + 1] - starts[i]) * max(math.exp(w - peak), MIN_WEIGHT) for i, w in enumerate(logs)]
+        table = alias_table(weights)
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return table
+
+    def draw_ordinals(self, conn, user_rating, user_rd, count, solved):
+        """Up to `count` distinct ordinals not in `solved`, drawn by the weight curve."""
+        index = self._load(conn)
+        if index is None or count <= 0:
+            return []
+        ordinals, starts, _ = index
+        if not ordinals:
+            return []
+        prob, alias = self._table(index, user_rating, user_rd)
+        buckets, rand, randrange = len(prob), random.random, random.randrange
+        picked, seen = [], set()
+        rejected = {"solved": 0, "duplicate": 0}
+        for _ in range(count * DRAWS_PER_PUZZLE):
+            i = randrange(buckets)
+            bucket = i if rand() < prob[i] else alias[i]
+            ordinal = ordinals[randrange(starts[bucket], starts[bucket + 1])]
+            if ordinal in seen:
+                rejected["duplicate"] += 1
+            elif ordinal in solved:
+                rejected["solved"] += 1
+            else:
+                seen.add(ordinal)
+                picked.append(ordinal)
+                if len(picked) >= count:
+                    break
+        metrics.inc("neurochess_sampler_draws_total", len(picked), result="accepted")
+        for result, n in rejected.items():
+            if n:
+                metrics.inc("neurochess_sampler_draws_total", n, result=result)
+        return picked
+
+    def sample(self, conn, user_rating, user_rd, count, solved):
+        """Puzzle rows for up to `count` draws, in draw order."""
+        picked = self.draw_ordinals(conn, user_rating, user_rd, count, solved)
+        rows = {}
+        for i in range(0, len(picked), 500):
+            chunk = picked[i:i + 500]
+            for row in conn.execute(f"SELECT p.* FROM puzzles p WHERE p.ordinal IN ({','.join('?' * len(chunk))})",
+                                    chunk):
+                rows[row['ordinal']] = row
+        return [rows[o] for o in picked if o in rows]
+
+    def clear(self):
+        """The puzzle DB was replaced."""
+        with self._lock:
+            self._index = None
+            self._loaded = False
+            self._tables.clear()
+
+    def stats(self):
+        with self._lock:
+            index = self._index
+            return {"puzzles": len(index[0]) if index else 0, "buckets": len(index[2]) if index else 0,
+                    "tables": len(self._tables)}
+
+sampler = RatingSampler()
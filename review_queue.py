@@ -0,0 +1,125 @@
+import os
+import time
+import random
+
+import metrics
+
+# Spaced-repetition reviews of failed puzzles (SM-2 intervals). A failure puts
+# the puzzle in the user's review_queue (user store) due RELEARN_DELAY_S later;
+# each later success grows the interval by the item's ease factor, each lapse
+# resets it and lowers the ease. Due items are read through the
+# (user_id, due_at) index, so popping them costs O(log n + k) whatever the size
+# of the user's history.
+#
+# Scheduled puzzles are also added to the user's solved set (solved_sets.py),
+# so random selection no longer serves them: they come back through
+# /get_reviews, or interleaved into /get_puzzles at INTERLEAVE_RATIO.
+
+INTERLEAVE_RATIO = float(os.environ.get("NEUROCHESS_REVIEW_RATIO", "0.2"))  # Share of an adaptive /get_puzzles batch
+RELEARN_DELAY_S = 600      # A failed puzzle is due again after this
+LEASE_S = 600              # Popped items are hidden this long, until answered
+START_EASE = 2.5
+MIN_EASE = 1.3
+LAPSE_EASE_PENALTY = 0.2
+PASS_QUALITY = 4           # SM-2 grade (0-5) of a success; 4 keeps the ease
+FIRST_INTERVALS_DAYS = (1, 6)
+MAX_INTERVAL_DAYS = 365
+DAY_S = 86400
+
+metrics.describe("neurochess_reviews_scheduled_total", "counter", "Review queue updates by outcome (new, lapse, pass).")
+
+def next_ease(ease, quality=PASS_QUALITY):
+    """SM-2 ease factor update for a 0-5 grade."""
+    return max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+def next_interval(reps, interval_days, ease):
+    """Days until the next review after the reps-th consecutive success."""
+    if reps <= len(FIRST_INTERVALS_DAYS):
+        return FIRST_INTERVALS_DAYS[reps - 1]
+    return min(MAX_INTERVAL_DAYS, interval_days * ease)
+
+def record(conn, user, puzzle_id, success, now=None):
+    """
+    Updates puzzle_id's schedule after an attempt. Failures schedule (or lapse)
+    the item; successes only advance items already in the queue. Returns True
+    when the puzzle is in the queue afterwards.
+    """
+    now = time.time() if now is None else now
+    row = conn.execute('''
+        SELECT interval_days, ease, reps, lapses FROM review_queue
+        WHERE user_id = ? AND puzzle_id = ?
+    ''', (user, puzzle_id)).fetchone()
+    if row is None:
+        if success:
+            return False
+        conn.execute('''
+            INSERT INTO review_queue (user_id, puzzle_id, due_at, interval_days, ease, reps, lapses)
+            VALUES (?, ?, ?, 0, ?, 0, 1)
+        ''', (user, puzzle_id, now + RELEARN_DELAY_S, START_EASE))
+        metrics.inc("neurochess_reviews_scheduled_total", outcome="new")
+        return True
+
+    interval_days, ease, reps, lapses = row
+    if success:
+        reps += 1
+        ease = next_ease(ease)
+        interval_days = next_interval(reps, interval_days, ease)
+        due_at = now + interval_days * DAY_S
+        outcome = "pass"
+    else:
+        reps, lapses = 0, lapses + 1
+        ease = max(MIN_EASE, ease - LAPSE_EASE_PENALTY)
+        interval_days = 0
+        due_at = now + RELEARN_DELAY_S
+        outcome = "lapse"
+    conn.execute('''
+        UPDATE review_queue SET due_at = ?, interval_days = ?, ease = ?, reps = ?, lapses = ?
+        WHERE user_id = ? AND puzzle_id = ?
+    ''', (due_at, interval_days, ease, reps, lapses, user, puzzle_id))
+    metrics.inc("neurochess_reviews_scheduled_total", outcome=outcome)
+    return True
+
+def pop_due(conn, user, limit, now=None):
+    """
+    Puzzle rows of up to `limit` due reviews, most overdue first. They are leased
+    for LEASE_S so the next call returns other items; the answer reschedules them.
+    """
+    now = time.time() if now is None else now
+    if limit <= 0:
+        return []
+    rows = conn.execute('''
+        SELECT p.* FROM review_queue rq INDEXED BY idx_review_due
+        JOIN puzzles p ON p.PuzzleId = rq.puzzle_id
+        WHERE rq.user_id = ? AND rq.due_at <= ?
+        ORDER BY rq.due_at LIMIT ?
+    ''', (user, now, limit)).fetchall()
+    if rows:
+        conn.executemany("UPDATE review_queue SET due_at = ? WHERE user_id = ? AND puzzle_id = ?",
+                         [(now + LEASE_S, user, row['PuzzleId']) for row in rows])
+    return rows
+
+def due_summary(conn, user, now=None):
+    """(number of items due now, due_at of the next item or None)."""
+    now = time.time() if now is None else now
+    due = conn.execute("SELECT COUNT(*) FROM review_queue WHERE user_id = ? AND due_at <= ?",
+                       (user, now)).fetchone()[0]
+    next_due = conn.execute("SELECT MIN(due_at) FROM review_queue WHERE user_id = ?", (user,)).fetchone()[0]
+    return due, next_due
+
+def review_share(count, ratio=INTERLEAVE_RATIO):
+    """Reviews to put in a batch of `count`; the fractional part is drawn at random."""
+    expected = max(0.0, min(1.0, ratio)) * count
+    whole = int(expected)
+    return whole + (random.random() < expected - whole)
+
+def interleave(puzzles, reviews):
+    """Spreads reviews evenly through puzzles."""
+    if not reviews:
+        return list(puzzles)
+    total = len(puzzles) + len(reviews)
+    slots = {int((i + 0.5) * total / len(reviews)) for i in range(len(reviews))}
+    puzzles, reviews = iter(puzzles), iter(reviews)
+    return [next(reviews) if i in slots else next(puzzles) for i in range(total)]
+
+def forget(conn, user):
+    conn.execute("DELETE FROM review_queue WHERE user_id = ?", (user,))
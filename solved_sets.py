@@ -0,0 +1,307 @@
+import os
+import sys
+import struct
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import groupby
+
+import metrics
+
+# Per-user solved sets as compressed bitmaps over puzzle ordinals. Puzzle
+# selection skips solved puzzles with an is_solved(p.ordinal) SQL function (see
+# bind) - an O(1)/O(log 4096) membership test per candidate row - instead of
+# joining the user's (growing) user_progress history.
+#
+# Ordinals are dense integers assigned in PuzzleId order when the puzzle DB is
+# built (create_short_db.assign_ordinals, create_mobile_db.py, or optimize_db.py
+# --db for existing DBs), together with a catalog_meta 'ordinals_id' that
+# changes on every reassignment.
+# Bitmaps are persisted in the user store (solved_sets) tagged with that id and
+# rebuilt from user_progress when it no longer matches; user_progress stays the
+# source of truth. Loaded bitmaps are kept in an LRU of MAX_CACHED_USERS and
+# revalidated with one primary-key read of the stored version per use, so
+# writes from other processes (prefork.py workers) are picked up.
+#
+# Puzzles scheduled for review (review_queue.py) are in the set as well: they
+# are served by the review queue, not by random selection.
+#
+# Puzzle DBs built without ordinals have no bitmaps: has_ordinals() is False,
+# mark() does nothing and app.build_puzzle_filter excludes solved puzzles with
+# anti-joins on user_progress and review_queue instead.
+
+MAX_CACHED_USERS = int(os.environ.get("NEUROCHESS_SOLVED_CACHE_USERS", "10000"))
+SOLVED_STATUSES = ("solved", "win")  # record_attempt writes 'solved', record_result 'win'
+
+ARRAY_MAX = 4096        # Containers switch to a bitmap above this many entries...
+BITMAP_BYTES = 8192     # ...which is when 2-byte array entries outgrow 2^16 bits
+_MAGIC = b"NCRB"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBI")     # magic, format version, container count
+_CONTAINER = struct.Struct("<HBI")   # high 16 bits, kind, cardinality
+_ARRAY, _BITMAP = 0, 1
+
+metrics.describe("neurochess_solved_set_loads_total", "counter", "Solved-set lookups by source (cache, blob, rebuild).")
+
+class MissingOrdinals(RuntimeError):
+    pass
+
+def _popcount(data):
+    return bin(int.from_bytes(data, "little")).count("1")
+
+class SolvedBitmap:
+    """
+    Roaring-style set of non-negative ints below 2^32: values are split by their
+    high 16 bits into containers holding the low 16 bits, either as a sorted
+    array('H') (sparse) or a 65536-bit bytearray (dense).
+    """
+    __slots__ = ("_containers", "_count")
+
+    def __init__(self, ordinals=()):
+        self._containers = {}
+        self._count = 0
+        for high, group in groupby(sorted(set(ordinals) - {None}), key=lambda o: o >> 16):
+            lows = array("H", (o & 0xFFFF for o in group))
+            self._containers[high] = lows if len(lows) <= ARRAY_MAX else self._to_bitmap(lows)
+            self._count += len(lows)
+
+    @staticmethod
+    def _to_bitmap(lows):
+        bits = bytearray(BITMAP_BYTES)
+        for low in lows:
+            bits[low >> 3] |= 1 << (low & 7)
+        return bits
+
+    def __contains__(self, ordinal):
+        if ordinal is None:
+            return False  # Puzzle loaded without an ordinal: never in the set
+        container = self._containers.get(ordinal >> 16)
+        if container is None:
+            return False
+        low = ordinal & 0xFFFF
+        if type(container) is bytearray:
+            return (container[low >> 3] >> (low & 7)) & 1 == 1
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+
+    def __len__(self):
+        return self._count
+
+    def add(self, ordinal):
+        """Adds ordinal; True if it was not present. None (no ordinal) is ignored."""
+        if ordinal is None:
+            return False
+        high, low = ordinal >> 16, ordinal & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = array("H", (low,))
+        elif type(container) is bytearray:
+            mask = 1 << (low & 7)
+            if container[low >> 3] & mask:
+                return False
+            container[low >> 3] |= mask
+        else:
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                return False
+            container.insert(i, low)
+            if len(container) > ARRAY_MAX:
+                self._containers[high] = self._to_bitmap(container)
+        self._count += 1
+        return True
+
+    def discard(self, ordinal):
+        """Removes ordinal; True if it was present."""
+        if ordinal is None:
+            return False
+        high, low = ordinal >> 16, ordinal & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            return False
+        if type(container) is bytearray:
+            mask = 1 << (low & 7)
+            if not container[low >> 3] & mask:
+                return False
+            container[low >> 3] &= ~mask
+            if _popcount(container) <= ARRAY_MAX:  # Back to a sparse array
+                self._containers[high] = array("H", (v for v in range(65536) if container[v >> 3] >> (v & 7) & 1))
+        else:
+            i = bisect_left(container, low)
+            if i >= len(container) or container[i] != low:
+                return False
+            del container[i]
+            if not container:
+                del self._containers[high]
+        self._count -= 1
+        return True
+
+    def to_bytes(self):
+        parts = [_HEADER.pack(_MAGIC, _VERSION, len(self._containers))]
+        for high in sorted(self._containers):
+            container = self._containers[high]
+            if type(container) is bytearray:
+                parts.append(_CONTAINER.pack(high, _BITMAP, _popcount(container)))
+                parts.append(bytes(container))
+            else:
+                parts.append(_CONTAINER.pack(high, _ARRAY, len(container)))
+                if sys.byteorder == "big":
+                    container = array("H", container)
+                    container.byteswap()
+                parts.append(container.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        bitmap = cls()
+        magic, version, containers = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a solved-set bitmap")
+        offset = _HEADER.size
+        for _ in range(containers):
+            high, kind, cardinality = _CONTAINER.unpack_from(data, offset)
+            offset += _CONTAINER.size
+            if kind == _BITMAP:
+                bitmap._containers[high] = bytearray(data[offset:offset + BITMAP_BYTES])
+                offset += BITMAP_BYTES
+            else:
+                lows = array("H")
+                lows.frombytes(data[offset:offset + cardinality * 2])
+                if sys.byteorder == "big":
+                    lows.byteswap()
+                bitmap._containers[high] = lows
+                offset += cardinality * 2
+            bitmap._count += cardinality
+        return bitmap
+
+def bind(conn, bitmap):
+    """Makes is_solved(ordinal) test `bitmap` in SQL run on conn (rebind per user)."""
+    conn.create_function("is_solved", 1, bitmap.__contains__, deterministic=True)
+
+class SolvedSets:
+    """LRU of users' solved bitmaps over user store connections (puzzle DB attached)."""
+
+    def __init__(self, max_users=MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user_id -> (version, bitmap)
+        self._lock = threading.Lock()
+        self._catalog = None
+
+    def catalog_id(self, conn):
+        if self._catalog is None:
+            try:
+                row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'ordinals_id'").fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            self._catalog = row[0] if row else ""  # "" until clear(): no ordinals
+        if not self._catalog:
+            raise MissingOrdinals("Puzzle DB has no ordinals: run python_scripts/optimize_db.py --db <puzzle DB>")
+        return self._catalog
+
+    def has_ordinals(self, conn):
+        """False for puzzle DBs built without ordinals (selection then excludes by user_progress)."""
+        try:
+            self.catalog_id(conn)
+            return True
+        except MissingOrdinals:
+            return False
+
+    def _load(self, conn, user):
+        catalog = self.catalog_id(conn)
+        row = conn.execute("SELECT version, catalog FROM solved_sets WHERE user_id = ?", (user,)).fetchone()
+        version = row[0] if row else 0
+        if row and row[1] == catalog:
+            with self._lock:
+                entry = self._entries.get(user)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(user)
+                    metrics.inc("neurochess_solved_set_loads_total", source="cache")
+                    return entry
+            blob = conn.execute("SELECT bitmap FROM solved_sets WHERE user_id = ?", (user,)).fetchone()[0]
+            bitmap = SolvedBitmap.from_bytes(blob)
+            metrics.inc("neurochess_solved_set_loads_total", source="blob")
+        else:
+            # No bitmap yet, or one over ordinals of an older puzzle DB build
+            placeholders = ",".join("?" * len(SOLVED_STATUSES))
+            bitmap = SolvedBitmap(r[0] for r in conn.execute(f'''
+                SELECT p.ordinal FROM user_progress up
+                JOIN puzzles p ON p.PuzzleId = up.puzzle_id
+                WHERE up.user_id = ? AND up.status IN ({placeholders})
+                UNION ALL
+                SELECT p.ordinal FROM review_queue rq
+                JOIN puzzles p ON p.PuzzleId = rq.puzzle_id
+                WHERE rq.user_id = ?
+            ''', (user, *SOLVED_STATUSES, user)))
+            version += 1
+            self._store(conn, user, catalog, version, bitmap)
+            metrics.inc("neurochess_solved_set_loads_total", source="rebuild")
+        return self._remember(user, version, bitmap)
+
+    def _remember(self, user, version, bitmap):
+        entry = (version, bitmap)
+        with self._lock:
+            self._entries[user] = entry
+            self._entries.move_to_end(user)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _store(conn, user, catalog, version, bitmap):
+        conn.execute('''
+            INSERT INTO solved_sets (user_id, catalog, version, bitmap) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+            catalog = excluded.catalog, version = excluded.version, bitmap = excluded.bitmap
+        ''', (user, catalog, version, bitmap.to_bytes()))
+
+    def get(self, conn, user):
+        """The user's solved bitmap (shared: treat it as read-only)."""
+        return self._load(conn, user)[1]
+
+    def mark(self, conn, user, puzzle_id, solved=True):
+        """
+        Adds (or removes) puzzle_id in the user's set and persists it. Call after
+        writing user_progress in the same transaction, so the store's write lock is
+        already held and no other process can update the set in between.
+        """
+        return self.mark_many(conn, user, [puzzle_id], solved) > 0
+
+    def mark_many(self, conn, user, puzzle_ids, solved=True):
+        """mark for a batch of puzzles, persisting the set once. Returns how many changed."""
+        if not self.has_ordinals(conn):
+            return 0  # No bitmaps on this puzzle DB: user_progress alone is the solved set
+        ordinals = []
+        for i in range(0, len(puzzle_ids), 500):
+            chunk = puzzle_ids[i:i + 500]
+            ordinals += [r[0] for r in conn.execute(
+                f"SELECT ordinal FROM puzzles WHERE PuzzleId IN ({','.join('?' * len(chunk))}) AND ordinal IS NOT NULL",
+                chunk)]
+        if not ordinals:
+            return 0
+        version, bitmap = self._load(conn, user)
+        update = bitmap.add if solved else bitmap.discard
+        changed = sum(1 for ordinal in ordinals if update(ordinal))
+        if changed:
+            # Updated in place: a rolled-back write leaves the cached version ahead
+            # of the stored one, so the next _load re-reads the blob.
+            self._store(conn, user, self.catalog_id(conn), version + 1, bitmap)
+            self._remember(user, version + 1, bitmap)
+        return changed
+
+    def forget(self, conn, user):
+        conn.execute("DELETE FROM solved_sets WHERE user_id = ?", (user,))
+        with self._lock:
+            self._entries.pop(user, None)
+
+    def clear(self):
+        """Drops cached bitmaps and the catalog id (the puzzle DB was replaced)."""
+        with self._lock:
+            self._entries.clear()
+            self._catalog = None
+
+    def stats(self):
+        with self._lock:
+            return {"cached_users": len(self._entries), "max_users": self.max_users}
+
+cache = SolvedSets()
@@ -0,0 +1,267 @@
+import os
+import time
+import weakref
+import threading
+from collections import OrderedDict
+
+import metrics
+import rating
+
+# Process-local cache of player_stats rows, keyed by (user, mode). Reads
+# (adaptive /get_puzzles, /get_stats) are served from memory, and Glicko updates
+# are applied to the cached row under one lock, so concurrent attempts never
+# compute from the same stale rating. Updated rows are written back by a
+# background thread every FLUSH_INTERVAL_S, one transaction per store file.
+#
+# Each entry remembers the store connection it was read through and that
+# connection's PRAGMA data_version, which changes when any other connection
+# (another worker process, merge_db.py) commits to the file. A clean entry
+# whose file changed is re-read; a dirty one is newer than the DB and is kept.
+# Sessions of one store file run on separate pooled connections, so an entry
+# read through another connection is re-read (one primary-key read). Writers
+# outside the cache keep it in step inside the user's session: /sync flushes
+# the user's pending rows first and forgets them after, and /reset_progress
+# forgets them. The write-back takes the file's write lock before it picks the
+# dirty rows, so it cannot write a row /sync flushed and then replaced. verify() compares clean entries with the DB
+# every VERIFY_INTERVAL_S and drops those that disagree.
+
+FLUSH_INTERVAL_S = float(os.environ.get("NEUROCHESS_STATS_FLUSH_S", "0.5"))
+MAX_ENTRIES = 100_000
+WARM_LIMIT = 10_000       # Most recently active rows loaded at startup
+VERIFY_INTERVAL_S = 300
+DEFAULTS = (rating.START_RATING, rating.START_RD, rating.START_VOL)
+
+UPSERT = '''
+    INSERT INTO player_stats (user_id, mode, rating, rd, vol, last_active) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, mode) DO UPDATE SET
+    rating = excluded.rating, rd = excluded.rd, vol = excluded.vol, last_active = excluded.last_active
+'''
+
+metrics.describe("neurochess_stats_cache_reads_total", "counter", "player_stats reads by result (hit, miss, stale).")
+metrics.describe("neurochess_stats_cache_flushed_rows_total", "counter", "player_stats rows written back by the stats cache.")
+metrics.describe("neurochess_stats_cache_mismatches_total", "counter", "Cached player_stats rows that disagreed with the DB in verify().")
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())  # CURRENT_TIMESTAMP format
+
+def _data_version(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+class StatsEntry:
+    __slots__ = ("values", "last_active", "exists", "version", "flushed", "conn", "data_version")
+
+    def __init__(self, values, last_active, exists, conn, data_version):
+        self.values = values            # (rating, rd, vol); DEFAULTS while the user has no row
+        self.last_active = last_active
+        self.exists = exists            # The user has a row in the DB
+        self.version = 0                # Bumped on every update...
+        self.flushed = 0                # ...and copied here once written
+        self.conn = weakref.ref(conn)   # Connection data_version was read from
+        self.data_version = data_version
+
+    @property
+    def dirty(self):
+        return self.version > self.flushed
+
+class PlayerStatsCache:
+    def __init__(self, get_store, max_entries=MAX_ENTRIES, flush_interval=FLUSH_INTERVAL_S):
+        """get_store() -> the UserStore rows are read from and written back to."""
+        self.get_store = get_store
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._entries = OrderedDict()  # (user, mode) -> StatsEntry
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_verify = time.monotonic()
+
+    def _ensure_thread(self):
+        # Started lazily: threads do not survive prefork's fork
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stats-writeback", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _read(conn, user, mode, data_version):
+        """data_version: read before the row, so a commit in between makes the entry stale, not wrong."""
+        row = conn.execute("SELECT rating, rd, vol, last_active FROM player_stats WHERE user_id = ? AND mode = ?",
+                           (user, mode)).fetchone()
+        values, last_active = ((row[0], row[1], row[2]), row[3]) if row else (DEFAULTS, None)
+        return StatsEntry(values, last_active, row is not None, conn, data_version)
+
+    def _remember(self, key, entry):
+        # Caller holds self._lock
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old_key = next((k for k, e in self._entries.items() if not e.dirty), None)
+            if old_key is None:
+                break  # Everything dirty: the writer is behind
+            del self._entries[old_key]
+
+    def _entry(self, conn, user, mode):
+        key = (user, mode)
+        data_version = _data_version(conn)  # Outside the lock: reads of other users don't wait on SQLite
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.dirty or (entry.conn() is conn and entry.data_version == data_version):
+                    metrics.inc("neurochess_stats_cache_reads_total", result="hit")
+                    return entry
+        metrics.inc("neurochess_stats_cache_reads_total", result="miss" if entry is None else "stale")
+        fresh = self._read(conn, user, mode, data_version)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.dirty:
+                return current  # Updated meanwhile; the DB is behind it
+            self._remember(key, fresh)
+        return fresh
+
+    def get(self, conn, user, mode):
+        """(rating, rd, vol) of the user (START_* defaults if they have no row)."""
+        return self._entry(conn, user, mode).values
+
+    def update(self, conn, user, mode, apply):
+        """
+        Replaces the user's (rating, rd, vol) with apply(rating, rd, vol),
+        atomically, and queues the row for write-back. Returns the new values.
+        """
+        key = (user, mode)
+        entry = self._entry(conn, user, mode)
+        with self._lock:
+            entry = self._entries.get(key, entry)
+            entry.values = tuple(apply(*entry.values))
+            entry.last_active = _now()
+            entry.version += 1
+            self._remember(key, entry)
+            self._dirty.add(key)
+            self._ensure_thread()
+            return entry.values
+
+    def set(self, conn, user, mode, values):
+        return self.update(conn, user, mode, lambda *_: values)
+
+    # --- Write-back ---
+
+    def _write(self, conn, keys):
+        """Writes the current values of dirty keys through conn: [(key, entry, version)]."""
+        with self._lock:
+            rows = [(key, self._entries[key]) for key in keys
+                    if key in self._entries and self._entries[key].dirty]
+            rows = [(key, entry, entry.version, (*key, *entry.values, entry.last_active)) for key, entry in rows]
+        conn.executemany(UPSERT, [params for *_, params in rows])
+        metrics.inc("neurochess_stats_cache_flushed_rows_total", len(rows))
+        return [(key, entry, version) for key, entry, version, _ in rows]
+
+    def _mark_flushed(self, written):
+        with self._lock:
+            for key, entry, version in written:
+                entry.flushed = max(entry.flushed, version)
+                entry.exists = True
+                if not entry.dirty and self._entries.get(key) is entry:
+                    self._dirty.discard(key)
+
+    def flush(self):
+        """Writes every pending row, one transaction per store file."""
+        with self._lock:
+            pending = list(self._dirty)
+        if not pending:
+            return
+        store = self.get_store()
+        by_path = {}
+        for key in pending:
+            by_path.setdefault(store.store_path(key[0]), []).append(key)
+        for path, keys in by_path.items():
+            try:
+                with store.file_session(path) as conn:
+                    conn.execute("BEGIN IMMEDIATE")  # See the module comment
+                    written = self._write(conn, keys)
+                self._mark_flushed(written)
+            except Exception as e:
+                print(f"STATS FLUSH ERROR {path}: {e}", flush=True)  # Rows stay dirty; retried next round
+
+    def flush_user(self, conn, user):
+        """Writes the user's pending rows now (inside their session), committing them."""
+        with self._lock:
+            keys = [key for key in self._dirty if key[0] == user]
+        if keys:
+            written = self._write(conn, keys)
+            conn.commit()
+            self._mark_flushed(written)
+
+    def forget(self, user):
+        """Drops the user's entries, pending writes included (call inside their session)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user]:
+                del self._entries[key]
+                self._dirty.discard(key)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.monotonic() - self._last_verify >= VERIFY_INTERVAL_S:
+                self._last_verify = time.monotonic()
+                try:
+                    self.verify()
+                except Exception as e:
+                    print(f"STATS VERIFY ERROR: {e}", flush=True)
+
+    # --- Startup and checks ---
+
+    def warm(self, limit=WARM_LIMIT):
+        """Loads the most recently active rows of every store file. Returns the count."""
+        store = self.get_store()
+        files = store.store_files()
+        per_file = max(1, limit // max(1, len(files)))
+        loaded = 0
+        for path in files:
+            with store.file_session(path) as conn:
+                data_version = _data_version(conn)
+                rows = conn.execute('''
+                    SELECT user_id, mode, rating, rd, vol, last_active FROM player_stats
+                    ORDER BY last_active DESC LIMIT ?
+                ''', (per_file,)).fetchall()
+                with self._lock:
+                    for user, mode, r, rd, vol, last_active in rows:
+                        if (user, mode) not in self._entries:
+                            self._remember((user, mode), StatsEntry((r, rd, vol), last_active, True, conn, data_version))
+                            loaded += 1
+        return loaded
+
+    def verify(self):
+        """Compares clean entries with the DB, dropping those that differ. Returns how many did."""
+        store = self.get_store()
+        with self._lock:
+            by_path = {}
+            for key, entry in self._entries.items():
+                if not entry.dirty:
+                    by_path.setdefault(store.store_path(key[0]), []).append((key, entry))
+        mismatches = 0
+        for path, items in by_path.items():
+            with store.file_session(path) as conn:
+                users = sorted({key[0] for key, _ in items})
+                stored = {}
+                for i in range(0, len(users), 500):
+                    chunk = users[i:i + 500]
+                    for row in conn.execute(f'''
+                        SELECT user_id, mode, rating, rd, vol FROM player_stats
+                        WHERE user_id IN ({",".join("?" * len(chunk))})
+                    ''', chunk):
+                        stored[(row[0], row[1])] = (row[2], row[3], row[4])
+                with self._lock:
+                    for key, entry in items:
+                        if self._entries.get(key) is not entry or entry.dirty:
+                            continue  # Changed since the snapshot
+                        cached = entry.values if entry.exists else None
+                        if stored.get(key) != cached:
+                            del self._entries[key]
+                            mismatches += 1
+        if mismatches:
+            metrics.inc("neurochess_stats_cache_mismatches_total", mismatches)
+        return mismatches
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "dirty": len(self._dirty), "max_entries": self.max_entries}
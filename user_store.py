@@ -0,0 +1,324 @@
+import os
+import zlib
+import uuid
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+import query_profiler
+
+# Per-user progress stores, kept apart from the read-only puzzle DB.
+# Users are hash-sharded over SHARD_COUNT SQLite files (SHARD_COUNT=0 gives
+# every user a file of their own). Each file is in WAL mode with its own writer
+# lock, so writes from different shards never contend. Sessions on one file get
+# connections from its pool of up to POOL_SIZE: WAL readers run concurrently with
+# each other and the writer, and SQLite's write lock (BUSY_TIMEOUT_MS) orders the
+# writes. At most MAX_OPEN connections stay open over all files; idle ones of the
+# least recently used files are closed first.
+# Changing SHARD_COUNT moves users to other files: keep it fixed once data exists.
+
+SHARD_COUNT = int(os.environ.get("NEUROCHESS_USER_SHARDS", "64"))
+MAX_OPEN = int(os.environ.get("NEUROCHESS_USER_HANDLES", "128"))
+POOL_SIZE = int(os.environ.get("NEUROCHESS_USER_POOL", "4"))  # Connections per store file
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS user_progress (
+        user_id TEXT NOT NULL,
+        puzzle_id TEXT NOT NULL,
+        status TEXT, -- 'solved'/'failed' (record_attempt) or 'win'/'loss' (record_result); see solved_sets.SOLVED_STATUSES
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, puzzle_id)
+    ) WITHOUT ROWID;
+    -- Keyset order of /history and /favorites (app.stream_listing_rows)
+    CREATE INDEX IF NOT EXISTS idx_progress_recent ON user_progress(user_id, timestamp, puzzle_id);
+
+    CREATE TABLE IF NOT EXISTS user_favorites (
+        user_id TEXT NOT NULL,
+        puzzle_id TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, puzzle_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_favorites_recent ON user_favorites(user_id, timestamp, puzzle_id);
+
+    CREATE TABLE IF NOT EXISTS player_stats (
+        user_id TEXT NOT NULL,
+        mode TEXT NOT NULL, -- 'standard', 'blindfold'
+        rating REAL DEFAULT 1200,
+        rd REAL DEFAULT 350,
+        vol REAL DEFAULT 0.06,
+        last_active DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, mode)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS solved_sets (
+        user_id TEXT PRIMARY KEY,
+        catalog TEXT,    -- puzzle DB ordinals_id the bitmap's ordinals refer to
+        version INTEGER, -- Bumped on every write; cached copies compare it
+        bitmap BLOB      -- solved_sets.SolvedBitmap.to_bytes()
+    ); -- Rowid table: blobs are too large for WITHOUT ROWID
+
+    CREATE TABLE IF NOT EXISTS solved_counts (
+        user_id TEXT NOT NULL,
+        rating_band TEXT NOT NULL,  -- '' for the user's total
+        catalog TEXT,               -- Puzzle DB ordinals_id the bands were read from
+        solved INTEGER NOT NULL,    -- Maintained by catalog_stats.py triggers
+        PRIMARY KEY (user_id, rating_band)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS review_queue (
+        user_id TEXT NOT NULL,
+        puzzle_id TEXT NOT NULL,
+        due_at REAL NOT NULL,  -- Unix time; see review_queue.py
+        interval_days REAL,
+        ease REAL,
+        reps INTEGER,          -- Consecutive successful reviews
+        lapses INTEGER,
+        PRIMARY KEY (user_id, puzzle_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_review_due ON review_queue(user_id, due_at);
+
+    CREATE TABLE IF NOT EXISTS store_meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+
+    -- Change feed for /sync (user_sync.py): the last change of every synced row,
+    -- kept up to date by the triggers below (deleted rows stay as tombstones)
+    CREATE TABLE IF NOT EXISTS sync_changes (
+        user_id TEXT NOT NULL,
+        tbl TEXT NOT NULL,      -- Key of SYNCED_TABLES
+        row_key TEXT NOT NULL,  -- puzzle_id, or mode for player_stats
+        seq INTEGER NOT NULL,   -- Per-user change counter
+        PRIMARY KEY (user_id, tbl, row_key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_sync_seq ON sync_changes(user_id, seq);
+'''
+
+SYNCED_TABLES = {
+    # sync_changes.tbl -> (table, key column)
+    "progress": ("user_progress", "puzzle_id"),
+    "favorites": ("user_favorites", "puzzle_id"),
+    "stats": ("player_stats", "mode"),
+}
+
+def _sync_triggers():
+    triggers = []
+    for tag, (table, key) in SYNCED_TABLES.items():
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            triggers.append(f'''
+    CREATE TRIGGER IF NOT EXISTS sync_{table}_{event.lower()} AFTER {event} ON {table} BEGIN
+        INSERT INTO sync_changes (user_id, tbl, row_key, seq)
+        VALUES ({row}.user_id, '{tag}', {row}.{key},
+                (SELECT COALESCE(MAX(seq), 0) + 1 FROM sync_changes WHERE user_id = {row}.user_id))
+        ON CONFLICT (user_id, tbl, row_key) DO UPDATE SET seq = excluded.seq;
+    END;''')
+    return "".join(triggers)
+
+SCHEMA += _sync_triggers()
+
+# Rows written before the triggers existed, numbered once per store
+SYNC_BACKFILL = " UNION ALL ".join(
+    f"SELECT user_id, '{tag}' AS tbl, {key} AS row_key FROM {table}"
+    for tag, (table, key) in SYNCED_TABLES.items())
+
+LEGACY_TABLES = {
+    # Single-user tables (no user_id) that init_user_db used to create in the puzzle DB
+    "user_progress": "puzzle_id, status, timestamp",
+    "user_favorites": "puzzle_id, timestamp",
+    "player_stats": "mode, rating, rd, vol, last_active",
+}
+
+def sqlite_uri(path, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return "file:" + pathname2url(os.path.abspath(path)) + ("?" + query if query else "")
+
+class StorePool:
+    __slots__ = ("path", "idle", "open", "in_use")
+
+    def __init__(self, path):
+        self.path = path
+        self.idle = []   # Connections between sessions, most recently used last
+        self.open = 0    # Connections open or being opened
+        self.in_use = 0
+
+class UserStore:
+    def __init__(self, data_dir, on_connect=None, shard_count=SHARD_COUNT, max_open=MAX_OPEN,
+                 pool_size=POOL_SIZE):
+        """on_connect(conn) runs once per new connection (app.py attaches the puzzle DB there)."""
+        self.data_dir = data_dir
+        self.on_connect = on_connect
+        self.shard_count = shard_count
+        self.max_open = max_open
+        self.pool_size = max(1, pool_size)
+        self._pools = OrderedDict()  # store file -> StorePool, least recently used first
+        self._open_count = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)  # A connection went back to its pool
+        os.makedirs(data_dir, exist_ok=True)
+
+    def store_path(self, user_id):
+        if self.shard_count:
+            shard = zlib.crc32(user_id.encode("utf-8")) % self.shard_count
+            return os.path.join(self.data_dir, f"users_{shard:03d}.sqlite")
+        digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.data_dir, digest[:2], f"{digest}.sqlite")
+
+    def _open(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Connections move between request threads, but only one session uses each at a time
+        conn = query_profiler.connect(sqlite_uri(path), uri=True, check_same_thread=False,
+                                      timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(SCHEMA)
+        self._backfill_sync(conn)
+        if self.on_connect:
+            self.on_connect(conn)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _backfill_sync(conn):
+        if conn.execute("SELECT 1 FROM store_meta WHERE key = 'sync_epoch'").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM store_meta WHERE key = 'sync_epoch'").fetchone():
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO sync_changes (user_id, tbl, row_key, seq)
+                    SELECT user_id, tbl, row_key, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY tbl, row_key)
+                    FROM ({SYNC_BACKFILL})
+                ''')
+                # Identifies this store's seq numbering; clients of a recreated store resync from 0
+                conn.execute("INSERT INTO store_meta (key, value) VALUES ('sync_epoch', ?)", (uuid.uuid4().hex,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _acquire(self, path):
+        with self._available:
+            while True:
+                pool = self._pools.get(path)
+                if pool is None:
+                    pool = self._pools[path] = StorePool(path)
+                self._pools.move_to_end(path)
+                if pool.idle:
+                    pool.in_use += 1
+                    return pool, pool.idle.pop()
+                if pool.open < self.pool_size:
+                    pool.open += 1
+                    pool.in_use += 1
+                    self._open_count += 1
+                    break
+                self._available.wait()  # Every connection of the file is in a session
+        # Opening (WAL pragmas, schema, backfill, ATTACH) can wait on the file's busy
+        # timeout: done outside the lock, so only this session waits for it
+        try:
+            conn = self._open(path)
+        except BaseException:
+            with self._available:
+                pool.open -= 1
+                pool.in_use -= 1
+                self._open_count -= 1
+                self._drop_if_unused(pool)
+                self._available.notify_all()
+            raise
+        return pool, conn
+
+    def _release(self, pool, conn):
+        with self._available:
+            pool.in_use -= 1
+            if self._pools.get(pool.path) is pool:
+                pool.idle.append(conn)
+            else:
+                conn.close()  # close_all() ran during the session
+                pool.open -= 1
+                self._open_count -= 1
+            self._evict()
+            self._available.notify_all()
+
+    def _drop_if_unused(self, pool):
+        # Caller holds self._lock
+        if pool.open == 0 and pool.in_use == 0 and self._pools.get(pool.path) is pool:
+            del self._pools[pool.path]
+
+    def _evict(self):
+        # Caller holds self._lock: close idle connections, least recently used files first
+        for pool in list(self._pools.values()):
+            while self._open_count > self.max_open and pool.idle:
+                pool.idle.pop(0).close()
+                pool.open -= 1
+                self._open_count -= 1
+            self._drop_if_unused(pool)
+            if self._open_count <= self.max_open:
+                break
+
+    def store_files(self):
+        """Paths of the store files that exist so far."""
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(self.data_dir)
+                      for name in names if name.endswith(".sqlite"))
+
+    @contextmanager
+    def session(self, user_id):
+        """Connection to user_id's store (puzzles attached), committed on success."""
+        with self.file_session(self.store_path(user_id)) as conn:
+            yield conn
+
+    @contextmanager
+    def file_session(self, path):
+        """session() for a store file, whichever users it holds."""
+        pool, conn = self._acquire(path)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._release(pool, conn)
+
+    def migrate_legacy(self, legacy_path, user_id):
+        """Copies single-user tables from legacy_path into user_id's store, once."""
+        marker = f"legacy_migrated:{os.path.abspath(legacy_path)}"
+        with self.session(user_id) as conn:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (marker,)).fetchone():
+                return 0
+            conn.execute("ATTACH DATABASE ? AS legacy", (sqlite_uri(legacy_path, mode="ro"),))
+            try:
+                existing = {row[0] for row in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type = 'table'")}
+                copied = 0
+                for table, columns in LEGACY_TABLES.items():
+                    legacy_columns = {row[1] for row in conn.execute(f"PRAGMA legacy.table_info({table})")}
+                    if table not in existing or "user_id" in legacy_columns:
+                        continue
+                    copied += conn.execute(
+                        f"INSERT OR IGNORE INTO main.{table} (user_id, {columns}) "
+                        f"SELECT ?, {columns} FROM legacy.{table}", (user_id,)).rowcount
+                conn.execute("INSERT INTO store_meta (key, value) VALUES (?, ?)", (marker, str(copied)))
+                conn.commit()
+            finally:
+                conn.rollback()  # No-op after the commit; DETACH fails inside a transaction
+                conn.execute("DETACH DATABASE legacy")
+        return copied
+
+    def close_all(self):
+        """Closes idle connections; those in a session are closed when it ends."""
+        with self._lock:
+            for pool in self._pools.values():
+                for conn in pool.idle:
+                    conn.close()
+                pool.open -= len(pool.idle)
+                self._open_count -= len(pool.idle)
+                pool.idle.clear()
+            self._pools.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"open_handles": self._open_count, "max_open": self.max_open,
+                    "open_files": len(self._pools), "pool_size": self.pool_size,
+                    "in_use": sum(pool.in_use for pool in self._pools.values())}
@@ -0,0 +1,255 @@
+import re
+
+import metrics
+import solved_sets
+import review_queue
+
+# Bidirectional delta sync of user data (mobile database.ts <-> user store).
+# Every write to a synced table bumps the row's entry in sync_changes to the
+# user's next change number (triggers in user_store.py), so a client that
+# remembers the cursor of its last sync pulls only rows changed since, in seq
+# order, PULL_BATCH at a time; cost follows activity, not history size.
+#
+# POST /sync {"since": cursor, "epoch": epoch, "skip": skip, "changes": {...}, "deleted": {...}}
+# Rows are positional arrays, in both directions:
+#   progress   [puzzle_id, status, timestamp]
+#   favorites  [puzzle_id, timestamp]
+#   stats      [mode, rating, rd, vol, last_active]
+# "deleted" lists progress/favorites rows the client removed, as
+# [puzzle_id, deleted_at]; the response lists server deletions as bare keys.
+# Timestamps are UTC 'YYYY-MM-DD HH:MM:SS' (SQLite CURRENT_TIMESTAMP).
+#
+# Pushed rows are merged with deterministic rules, so both sides converge
+# whatever the order of syncs:
+#   progress   solved/win beats failed/loss (as in record_attempt), then the
+#              later timestamp, then the greater status
+#   favorites  the later timestamp; a delete only removes rows not newer than it
+#   stats      the later last_active, then the higher rating
+# Accepted rows are not echoed back; rejected ones are returned with the
+# server's row. The response cursor covers the client's own writes, so the
+# next sync does not download them again. While "more" is true the cursor is
+# still below them: the response's "skip" lists the seq ranges [after, upto]
+# of the client's accepted writes, and the next round sends it back so the
+# pull leaves them out (a row written again since has moved to a newer seq).
+
+PULL_BATCH = 500
+MAX_PULL_BATCH = 2000
+MAX_PUSH_ROWS = 5000
+MAX_SKIP_RANGES = 16  # Older ranges are dropped: their rows are pulled again, which is harmless
+STATUSES = ("solved", "failed", "win", "loss")
+_TIMESTAMP = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+
+metrics.describe("neurochess_sync_rows_total", "counter", "Rows exchanged by /sync, by direction (push, pull) and table.")
+
+# Conflict clauses, shared with the set-based merge in python_scripts/merge_db.py
+ON_CONFLICT = {
+    "progress": f'''
+        ON CONFLICT (user_id, puzzle_id) DO UPDATE SET status = excluded.status, timestamp = excluded.timestamp
+        WHERE (excluded.status IN {solved_sets.SOLVED_STATUSES}, excluded.timestamp, excluded.status)
+            > (status IN {solved_sets.SOLVED_STATUSES}, COALESCE(timestamp, ''), COALESCE(status, ''))
+    ''',
+    "favorites": '''
+        ON CONFLICT (user_id, puzzle_id) DO UPDATE SET timestamp = excluded.timestamp
+        WHERE excluded.timestamp > COALESCE(timestamp, '')
+    ''',
+    "stats": '''
+        ON CONFLICT (user_id, mode) DO UPDATE SET
+            rating = excluded.rating, rd = excluded.rd, vol = excluded.vol, last_active = excluded.last_active
+        WHERE (excluded.last_active, excluded.rating) > (COALESCE(last_active, ''), COALESCE(rating, 0))
+    ''',
+}
+
+MERGE = {
+    "progress": "INSERT INTO user_progress (user_id, puzzle_id, status, timestamp) VALUES (?, ?, ?, ?)"
+                + ON_CONFLICT["progress"],
+    "favorites": "INSERT INTO user_favorites (user_id, puzzle_id, timestamp) VALUES (?, ?, ?)"
+                 + ON_CONFLICT["favorites"],
+    "stats": "INSERT INTO player_stats (user_id, mode, rating, rd, vol, last_active) VALUES (?, ?, ?, ?, ?, ?)"
+             + ON_CONFLICT["stats"],
+}
+
+DELETE = {
+    "progress": "DELETE FROM user_progress WHERE user_id = ? AND puzzle_id = ? AND COALESCE(timestamp, '') <= ?",
+    "favorites": "DELETE FROM user_favorites WHERE user_id = ? AND puzzle_id = ? AND COALESCE(timestamp, '') <= ?",
+}
+
+ROWS = {
+    # Current rows by key, in the wire order
+    "progress": "SELECT puzzle_id, status, timestamp FROM user_progress WHERE user_id = ? AND puzzle_id IN ({})",
+    "favorites": "SELECT puzzle_id, timestamp FROM user_favorites WHERE user_id = ? AND puzzle_id IN ({})",
+    "stats": "SELECT mode, rating, rd, vol, last_active FROM player_stats WHERE user_id = ? AND mode IN ({})",
+}
+
+def _timestamp(value):
+    if not isinstance(value, str) or not _TIMESTAMP.match(value):
+        raise ValueError(f"bad timestamp {value!r}")
+    return value
+
+def _key(value):
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"bad key {value!r}")
+    return value
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"bad number {value!r}")
+    return float(value)
+
+def parse_push(payload):
+    """Validated ({tbl: [params]}, {tbl: [(key, deleted_at)]}); ValueError if malformed."""
+    changes = payload.get("changes") or {}
+    deleted = payload.get("deleted") or {}
+    if not isinstance(changes, dict) or not isinstance(deleted, dict):
+        raise ValueError("changes and deleted must be objects")
+    if set(changes) - set(MERGE) or set(deleted) - set(DELETE):
+        raise ValueError("unknown table")
+    total = sum(len(rows) for rows in changes.values()) + sum(len(rows) for rows in deleted.values())
+    if total > MAX_PUSH_ROWS:
+        raise ValueError(f"more than {MAX_PUSH_ROWS} rows; split the push")
+
+    upserts = {}
+    try:
+        for puzzle_id, status, timestamp in changes.get("progress", ()):
+            if status not in STATUSES:
+                raise ValueError(f"bad status {status!r}")
+            upserts.setdefault("progress", []).append((_key(puzzle_id), status, _timestamp(timestamp)))
+        for puzzle_id, timestamp in changes.get("favorites", ()):
+            upserts.setdefault("favorites", []).append((_key(puzzle_id), _timestamp(timestamp)))
+        for mode, rating, rd, vol, last_active in changes.get("stats", ()):
+            upserts.setdefault("stats", []).append(
+                (_key(mode), _number(rating), _number(rd), _number(vol), _timestamp(last_active)))
+        deletes = {tbl: [(_key(key), _timestamp(deleted_at)) for key, deleted_at in rows]
+                   for tbl, rows in deleted.items()}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"malformed row: {e}")
+    return upserts, deletes
+
+def parse_skip(payload):
+    """Validated [[after, upto], ...] seq ranges from the previous round; ValueError if malformed."""
+    skip = payload.get("skip") or []
+    if not isinstance(skip, list) or len(skip) > MAX_SKIP_RANGES:
+        raise ValueError("bad skip")
+    ranges = []
+    for pair in skip:
+        if (not isinstance(pair, list) or len(pair) != 2
+                or any(isinstance(v, bool) or not isinstance(v, int) for v in pair) or not 0 <= pair[0] < pair[1]):
+            raise ValueError("bad skip")
+        ranges.append(pair)
+    return ranges
+
+def current_seq(conn, user):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sync_changes WHERE user_id = ?", (user,)).fetchone()[0]
+
+def epoch(conn):
+    return conn.execute("SELECT value FROM store_meta WHERE key = 'sync_epoch'").fetchone()[0]
+
+def apply_push(conn, user, upserts, deletes):
+    """
+    Merges pushed rows. Returns (keys the server kept its own row for, puzzle ids
+    newly solved or scheduled for review - for prefetch.discard).
+    """
+    rejected = []
+    applied = {}
+    for tbl, rows in upserts.items():
+        for params in rows:
+            if conn.execute(MERGE[tbl], (user, *params)).rowcount:
+                applied.setdefault(tbl, []).append(params)
+            else:
+                rejected.append((tbl, params[0]))
+        metrics.inc("neurochess_sync_rows_total", len(rows), direction="push", table=tbl)
+
+    removed = []
+    for tbl, rows in deletes.items():
+        for key, deleted_at in rows:
+            if conn.execute(DELETE[tbl], (user, key, deleted_at)).rowcount:
+                if tbl == "progress":
+                    removed.append(key)
+            else:
+                rejected.append((tbl, key))
+        metrics.inc("neurochess_sync_rows_total", len(rows), direction="push", table=tbl)
+
+    # Keep solved sets and the review queue in step with record_result
+    excluded = []
+    for puzzle_id, status, _ in applied.get("progress", ()):
+        solved = status in solved_sets.SOLVED_STATUSES
+        if review_queue.record(conn, user, puzzle_id, solved) or solved:
+            excluded.append(puzzle_id)
+    if excluded:
+        solved_sets.cache.mark_many(conn, user, excluded)
+    if removed:
+        conn.executemany("DELETE FROM review_queue WHERE user_id = ? AND puzzle_id = ?",
+                         [(user, puzzle_id) for puzzle_id in removed])
+        solved_sets.cache.mark_many(conn, user, removed, solved=False)
+    return rejected, excluded
+
+def rows_for(conn, user, keys):
+    """({tbl: [row arrays]}, {tbl: [deleted keys]}) for (tbl, key) pairs."""
+    by_table = {}
+    for tbl, key in keys:
+        by_table.setdefault(tbl, []).append(key)
+    changes, deleted = {}, {}
+    for tbl, wanted in by_table.items():
+        found = {}
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            for row in conn.execute(ROWS[tbl].format(",".join("?" * len(chunk))), (user, *chunk)):
+                found[row[0]] = list(row)
+        for key in wanted:
+            if key in found:
+                changes.setdefault(tbl, []).append(found[key])
+            else:
+                deleted.setdefault(tbl, []).append(key)
+    return changes, deleted
+
+def pull(conn, user, since, upto, limit, skip=()):
+    """Keys changed in (since, upto], outside the skip ranges, in seq order: ([(tbl, key)], last seq, more)."""
+    skipped = "".join(" AND NOT (seq > ? AND seq <= ?)" for _ in skip)
+    rows = conn.execute(f'''
+        SELECT tbl, row_key, seq FROM sync_changes INDEXED BY idx_sync_seq
+        WHERE user_id = ? AND seq > ? AND seq <= ?{skipped} ORDER BY seq LIMIT ?
+    ''', (user, since, upto, *(seq for pair in skip for seq in pair), limit + 1)).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return [(r[0], r[1]) for r in rows], (rows[-1][2] if rows else since), more
+
+def sync(conn, user, payload):
+    """One /sync round in an IMMEDIATE transaction: (response dict, ids for prefetch.discard)."""
+    upserts, deletes = parse_push(payload)
+    skip = parse_skip(payload)
+    since = payload.get("since") or 0
+    limit = payload.get("limit") or PULL_BATCH
+    if isinstance(since, bool) or not isinstance(since, int) or since < 0:
+        raise ValueError("bad since")
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+        raise ValueError("bad limit")
+    limit = min(limit, MAX_PULL_BATCH)
+
+    # Hold the write lock from the start: seq numbers read here must not move
+    conn.execute("BEGIN IMMEDIATE")
+    store_epoch = epoch(conn)
+    if payload.get("epoch") != store_epoch:
+        since, skip = 0, []  # First sync, or the store was recreated
+    floor = current_seq(conn, user)
+    rejected, excluded = apply_push(conn, user, upserts, deletes)
+
+    keys, last, more = pull(conn, user, since, floor, limit, skip)
+    # Accepted pushes got seqs above floor; skip past them once the pull has caught up,
+    # and leave them out of the later rounds until then
+    if more:
+        cursor = last
+        skip = [pair for pair in skip if pair[1] > last]
+        pushed = current_seq(conn, user)
+        if pushed > floor:
+            if skip and skip[-1][1] == floor:
+                skip[-1] = [skip[-1][0], pushed]
+            else:
+                skip.append([floor, pushed])
+        skip = skip[-MAX_SKIP_RANGES:]
+    else:
+        cursor, skip = current_seq(conn, user), []
+    seen = set(keys)
+    changes, deleted = rows_for(conn, user, keys + [k for k in rejected if k not in seen])
+    for tbl, rows in changes.items():
+        metrics.inc("neurochess_sync_rows_total", len(rows), direction="pull", table=tbl)
+    return {"epoch": store_epoch, "cursor": cursor, "more": more, "skip": skip,
+            "changes": changes, "deleted": deleted}, excluded
@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+
+import metrics
+
+# Startup in two phases. The server starts serving as soon as the user stores
+# open (app.init_user_db); everything that only makes requests faster - page
+# cache, selection indexes, serialized payloads, hot player ratings - is built
+# afterwards by a Warmup, one named step at a time on a background thread.
+# Every cache it fills is also filled lazily by the first request that needs
+# it, so warmup changes latency, never results. /ready reports its progress.
+
+PAGE_CHUNK = 4 * 1024 * 1024
+
+metrics.describe("neurochess_warmup_step_duration_seconds", "summary", "Startup warmup steps, by step.")
+
+def prefetch_file(path, max_bytes):
+    """
+    Pulls the first max_bytes of a file into the OS page cache (which SQLite
+    reads and mmap share). Returns the bytes requested.
+    """
+    with open(path, "rb") as f:
+        size = min(os.fstat(f.fileno()).st_size, max_bytes)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)  # Kernel reads ahead asynchronously
+        else:
+            remaining = size
+            while remaining > 0 and f.read(min(PAGE_CHUNK, remaining)):
+                remaining -= PAGE_CHUNK
+    return size
+
+class Warmup:
+    def __init__(self, steps=()):
+        """steps: (name, fn) pairs; fn() may return a short detail for /ready."""
+        self._steps = list(steps)
+        self._state = {name: {"step": name, "state": "pending"} for name, _ in self._steps}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    def run(self):
+        """Runs every step in order; a failing step is reported, not raised."""
+        self.started_at = self.started_at or time.monotonic()
+        for name, fn in self._steps:
+            with self._lock:
+                self._state[name]["state"] = "running"
+            start = time.perf_counter()
+            try:
+                detail, state = fn(), "done"
+            except Exception as e:
+                detail, state = str(e), "failed"
+                print(f"WARMUP {name} FAILED: {e}", flush=True)
+            seconds = time.perf_counter() - start
+            metrics.observe("neurochess_warmup_step_duration_seconds", seconds, step=name)
+            with self._lock:
+                self._state[name].update(state=state, seconds=round(seconds, 3))
+                if detail is not None:
+                    self._state[name]["detail"] = detail
+        self.finished_at = time.monotonic()
+
+    def start(self):
+        """run() on a background thread (once)."""
+        if self._thread is None:
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def warm(self):
+        return self.finished_at is not None
+
+    def progress(self):
+        with self._lock:
+            steps = [dict(self._state[name]) for name, _ in self._steps]
+        finished = sum(1 for s in steps if s["state"] in ("done", "failed"))
+        return {
+            "warm": self.warm,
+            "progress": round(finished / len(steps), 3) if steps else 1.0,
+            "uptime_s": round(time.monotonic() - self.created_at, 3),
+            "warmup_s": round(self.finished_at - self.started_at, 3) if self.warm else None,
+            "steps": steps,
+        }
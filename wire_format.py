@@ -0,0 +1,141 @@
+import gzip
+import time
+
+from flask import request, Response
+
+import metrics
+import puzzle_cache
+
+# Wire formats for puzzle batches plus negotiated response compression.
+#
+# Columnar format (?format=columnar or Accept: application/vnd.neurochess.columnar+json):
+# parallel arrays instead of one object per puzzle, bands and themes sent once
+# as per-response dictionaries and referenced by index, and Moves left as the
+# packed UCI string from the DB ("e2e4 e7e5 ...") instead of a JSON list.
+#
+# Compression: JSON responses of at least MIN_COMPRESS_BYTES are gzip- or
+# brotli-encoded per Accept-Encoding. Brotli needs the optional `brotli` package.
+
+try:
+    import brotli  # Optional, preferred over gzip when the client accepts it
+except ImportError:
+    brotli = None
+
+COLUMNAR_MIMETYPE = "application/vnd.neurochess.columnar+json"
+COLUMNAR_VERSION = 1
+MIN_COMPRESS_BYTES = 1024  # Below ~1 MTU the headers cost more than we save
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4  # Dynamic responses: high qualities cost far more CPU than they save bytes
+COMPRESSIBLE = {"application/json", COLUMNAR_MIMETYPE, "text/plain", "text/html"}
+
+metrics.describe("neurochess_response_bytes_total", "counter", "Response body bytes before/after compression.")
+metrics.describe("neurochess_compress_duration_seconds", "summary", "Time spent compressing responses.")
+
+# --- Columnar encoding ---
+
+def wants_columnar():
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt == 'columnar'
+    return request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+def encode_columnar(user_rating, rows):
+    """Columnar payload dict from puzzles rows."""
+    band_index, theme_index = {}, {}
+    ids, fens, moves, ratings, bands, themes = [], [], [], [], [], []
+    for row in rows:
+        ids.append(row['PuzzleId'])
+        fens.append(row['FEN'])
+        moves.append(row['Moves'] or "")
+        ratings.append(row['Rating'] or 0)
+        band = row['rating_band'] or 'Uncategorized'
+        bands.append(band_index.setdefault(band, len(band_index)))
+        themes.append([theme_index.setdefault(t, len(theme_index)) for t in (row['Themes'] or "").split()])
+    return {
+        "format": "columnar",
+        "version": COLUMNAR_VERSION,
+        "user_rating": round(user_rating),
+        "count": len(ids),
+        "band_names": list(band_index),
+        "theme_names": list(theme_index),
+        "ids": ids,
+        "fens": fens,
+        "moves": moves,
+        "ratings": ratings,
+        "bands": bands,
+        "themes": themes,
+    }
+
+def decode_columnar(payload):
+    """Inverse of encode_columnar, in the regular /get_puzzles puzzle shape (for tests/benchmarks)."""
+    band_names, theme_names = payload["band_names"], payload["theme_names"]
+    return [{
+        "PuzzleId": payload["ids"][i],
+        "FEN": payload["fens"][i],
+        "Moves": payload["moves"][i].split(),
+        "Rating": payload["ratings"][i],
+        "Band": band_names[payload["bands"][i]],
+        "Themes": " ".join(theme_names[t] for t in payload["themes"][i]),
+    } for i in range(payload["count"])]
+
+def puzzles_response(user_rating, rows):
+    """/get_puzzles body in the negotiated format (cached JSON fragments by default)."""
+    if wants_columnar():
+        body = puzzle_cache.dumps(encode_columnar(user_rating, rows))
+        response = Response(body, mimetype=COLUMNAR_MIMETYPE)
+    else:
+        return fragments_response(user_rating, puzzle_cache.cache.fragments_for_rows(rows))
+    response.vary.add("Accept")
+    return response
+
+def fragments_response(user_rating, fragments):
+    """Default-format /get_puzzles body from already serialized puzzles."""
+    response = puzzle_cache.batch_response(user_rating, fragments)
+    response.vary.add("Accept")
+    return response
+
+# --- Compression ---
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header (honours q=0)."""
+    if brotli is not None and accept_encoding.quality("br") > 0:
+        return "br"
+    if accept_encoding.quality("gzip") > 0:
+        return "gzip"
+    return None
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code != 200
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    start = time.perf_counter()
+    compressed = compress(data, encoding)
+    metrics.observe("neurochess_compress_duration_seconds", time.perf_counter() - start, encoding=encoding)
+    metrics.inc("neurochess_response_bytes_total", len(data), stage="raw")
+    metrics.inc("neurochess_response_bytes_total", len(compressed), stage=encoding)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # Same resource, different bytes
+    return response
+
+def init_app(app):
+    app.after_request(compress_response)